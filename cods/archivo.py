@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# archivo.py  (índice persistente de ../data y selección perezosa de meses con xarray, para notebooks y análisis)
+import argparse, os, re, sqlite3, sys, time
+from collections import namedtuple
+'''
+Uso desde un notebook (en cods/ o con cods/ en sys.path):
+    from archivo import Archive
+    arch = Archive("../data")
+    ds = arch.select(var="tas", model="TaiESM1", scenario="ssp126", time=slice("2015-01", "2020-12"),
+                     bbox=(-80, -70, -20, -10))
+    arch.files(var="pr", scenario="ssp245", time=slice(2050, 2060))      # solo rutas y metadatos, sin xarray
+    dsets = arch.open_groups(var="tas", scenario="ssp245", time=slice(2050, 2050))   # {Grupo: Dataset}
+El índice (SQLite, por defecto <root>/.archivo.sqlite; en NFS conviene index= en disco local) guardó por archivo
+variable, modelo, escenario, miembro, grilla, año-mes, versión, tamaño, mtime y la extensión lat/lon de la cabecera.
+Al abrir solo se compararon los mtime de <root> y de cada <MODELO>/: los directorios sin cambios no se listaron.
+ejemplo:
+python3 archivo.py ../data                                   # actualizó el índice e imprimió un resumen
+python3 archivo.py ../data --var tas --scenario ssp126 --time 2015-01:2020-12 --bbox -80 -70 -20 -10
+'''
+DEFAULT_INDEX = ".archivo.sqlite"
+# <var>_day_<MODELO>_<escenario>_<miembro>_<grilla>_<YYYYMM>[_vM.m].nc  (make_monthly_fname de p03; MONTHLY_RE
+# de p04 sin importar p04, que cargó xarray: el índice debió abrir en milisegundos)
+MONTHLY_RE = re.compile(
+    r'^(?P<var>[^_]+)_day_(?P<model>.+?)_(?P<scen>historical|ssp\d+)_(?P<member>r\d+i\d+p\d+f\d+)_'
+    r'(?P<grid>[^_]+)_(?P<ym>\d{6})(?:_v(?P<ver>\d+(?:\.\d+)?))?\.nc$')
+# un directorio modificado hace menos que esto pudo seguir cambiando en el mismo tick de mtime: se releyó la próxima vez
+SETTLE_S = 2.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS directorios (
+    path TEXT PRIMARY KEY, mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS archivos (
+    path TEXT PRIMARY KEY, dir TEXT, var TEXT, model TEXT, scenario TEXT, member TEXT, grid TEXT,
+    ym INTEGER, version TEXT, size INTEGER, mtime_ns INTEGER,
+    west REAL, east REAL, south REAL, north REAL
+);
+CREATE INDEX IF NOT EXISTS archivos_sel ON archivos(var, model, scenario, ym);
+CREATE INDEX IF NOT EXISTS archivos_dir ON archivos(dir);
+"""
+COLUMNS = "path var model scenario member grid ym version size west east south north"
+Entry = namedtuple("Entry", COLUMNS)
+Grupo = namedtuple("Grupo", "var model scenario member grid")
+
+def version_key(version):
+    """'2.0' > '1.10' > '1.9' > sin versión."""
+    return tuple(int(x) for x in version.split(".")) if version else ()
+
+def parse_time(value, end=False):
+    """'YYYY', 'YYYY-MM', 'YYYY-MM-DD' o un año entero → YYYYMM (primer o último mes si faltó el mes)."""
+    if value is None:
+        return None
+    text = str(value)
+    m = re.match(r"^(\d{4})(?:-(\d{1,2}))?", text)
+    if not m:
+        raise ValueError(f"tiempo inválido: {value!r} (YYYY, YYYY-MM o YYYY-MM-DD)")
+    month = int(m.group(2)) if m.group(2) else (12 if end else 1)
+    return int(m.group(1)) * 100 + month
+
+def _as_list(value):
+    if value is None:
+        return None
+    return [value] if isinstance(value, str) else list(value)
+
+class Archive:
+    """Índice de <root>/<MODELO>/*.nc con selección por metadatos y apertura perezosa.
+
+    Se actualizó al crearse (refresh) comparando mtimes de directorios; files() no importó numpy ni xarray.
+    """
+    def __init__(self, root="../data", index=None, refresh=True):
+        self.root = os.path.abspath(root)
+        self.index = index or os.path.join(self.root, DEFAULT_INDEX)
+        self.db = sqlite3.connect(self.index, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.scanned = self.added = self.removed = 0
+        if refresh:
+            self.refresh()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -------------------------------------------------------------- índice
+    def refresh(self, full=False):
+        """Releyó solo los directorios cuyo mtime cambió (todos con full). Devolvió (releídos, nuevos, borrados).
+
+        Crear, renombrar o borrar un archivo cambió el mtime de su directorio; p03 y recomprime.py escribieron
+        con temporal + rename, así que un mes reescrito también se detectó.
+        """
+        t0 = time.time()
+        known = dict(self.db.execute("SELECT path, mtime_ns FROM directorios"))
+        try:
+            models = [e for e in os.scandir(self.root) if e.is_dir() and not e.name.startswith(".")]
+        except FileNotFoundError:
+            models = []
+        seen = set()
+        scanned = added = removed = 0
+        for entry in models:
+            seen.add(entry.path)
+            mtime = entry.stat().st_mtime_ns
+            if not full and known.get(entry.path) == mtime:
+                continue
+            a, r = self._scan_dir(entry.path)
+            scanned += 1; added += a; removed += r
+            # si cambió hace muy poco, no se dio por visto: otro archivo pudo llegar con el mismo mtime
+            settled = mtime if t0 - mtime / 1e9 > SETTLE_S else -1
+            self.db.execute("INSERT OR REPLACE INTO directorios VALUES (?,?)", (entry.path, settled))
+        for path in set(known) - seen:
+            removed += self.db.execute("DELETE FROM archivos WHERE dir = ?", (path,)).rowcount
+            self.db.execute("DELETE FROM directorios WHERE path = ?", (path,))
+        self.db.commit()
+        self.scanned, self.added, self.removed = scanned, added, removed
+        return scanned, added, removed
+
+    def _scan_dir(self, d):
+        """Sincronizó las filas de un directorio con lo que había en disco; devolvió (nuevos o cambiados, borrados)."""
+        rows = {p: (size, mtime) for p, size, mtime in
+                self.db.execute("SELECT path, size, mtime_ns FROM archivos WHERE dir = ?", (d,))}
+        present, new = set(), []
+        for e in os.scandir(d):
+            m = MONTHLY_RE.match(e.name)
+            if not m or not e.is_file():
+                continue
+            st = e.stat()
+            present.add(e.path)
+            if rows.get(e.path) == (st.st_size, st.st_mtime_ns):
+                continue
+            new.append((e.path, m, st))
+        gone = [p for p in rows if p not in present]
+        self.db.executemany("DELETE FROM archivos WHERE path = ?", [(p,) for p in gone])
+        if new:
+            import verifica                                # solo al indexar: cabecera para la extensión lat/lon
+            batch = []
+            for path, m, st in new:
+                ext = verifica.file_extent(path) or (None, None, None, None)
+                batch.append((path, d, m.group("var"), m.group("model"), m.group("scen"), m.group("member"),
+                              m.group("grid"), int(m.group("ym")), m.group("ver") or "", st.st_size, st.st_mtime_ns)
+                             + tuple(ext))
+            self.db.executemany(f"INSERT OR REPLACE INTO archivos VALUES ({','.join('?' * 15)})", batch)
+        return len(new), len(gone)
+
+    # -------------------------------------------------------------- consultas
+    def files(self, var=None, model=None, scenario=None, member=None, grid=None, time=None, bbox=None,
+              version="latest"):
+        """Entradas que cumplieron los filtros, ordenadas por grupo y mes.
+
+        var/model/scenario/member/grid: texto o lista. time: slice de 'YYYY[-MM[-DD]]' o de años (extremos incluidos).
+        bbox: (oeste, este, sur, norte); se quedaron los archivos cuya extensión la intersectó.
+        version: 'latest' (una versión por mes, la mayor), 'all' o una versión concreta ('2.0').
+        """
+        where, params = [], []
+        for col, value in (("var", var), ("model", model), ("scenario", scenario), ("member", member), ("grid", grid)):
+            values = _as_list(value)
+            if values:
+                where.append(f"{col} IN ({','.join('?' * len(values))})"); params += values
+        if time is not None:
+            start, stop = (time.start, time.stop) if isinstance(time, slice) else (time, time)
+            if start is not None:
+                where.append("ym >= ?"); params.append(parse_time(start))
+            if stop is not None:
+                where.append("ym <= ?"); params.append(parse_time(stop, end=True))
+        if bbox is not None:
+            west, east, south, north = bbox
+            where.append("(north IS NULL OR (south <= ? AND north >= ?))"); params += [north, south]
+            # lon guardada tal como vino (-180..180 o 0..360): se comparó en ambas convenciones
+            where.append("(west IS NULL OR (west <= ? AND east >= ?) OR (west <= ? AND east >= ?))")
+            params += [east, west, east % 360, west % 360]
+        if version not in ("latest", "all"):
+            where.append("version = ?"); params.append(version)
+        sql = f"SELECT {', '.join(COLUMNS.split())} FROM archivos"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        entries = [Entry(*row) for row in self.db.execute(sql + " ORDER BY var, model, scenario, member, grid, ym", params)]
+        if version != "latest":
+            return entries
+        best = {}
+        for e in entries:
+            k = (e.var, e.model, e.scenario, e.member, e.grid, e.ym)
+            if k not in best or version_key(e.version) > version_key(best[k].version):
+                best[k] = e
+        return sorted(best.values(), key=lambda e: (e.var, e.model, e.scenario, e.member, e.grid, e.ym))
+
+    def groups(self, **filters):
+        """{Grupo: [Entry]} de files(**filters); un grupo = una serie continua en un solo calendario."""
+        out = {}
+        for e in self.files(**filters):
+            out.setdefault(Grupo(e.var, e.model, e.scenario, e.member, e.grid), []).append(e)
+        return out
+
+    def summary(self):
+        """[(var, modelo, escenario, archivos, primer YYYYMM, último YYYYMM, MB)] de todo el índice."""
+        return list(self.db.execute(
+            "SELECT var, model, scenario, COUNT(*), MIN(ym), MAX(ym), ROUND(SUM(size) / 1e6, 1) FROM archivos "
+            "GROUP BY var, model, scenario ORDER BY var, model, scenario"))
+
+    # -------------------------------------------------------------- apertura
+    def select(self, var=None, model=None, scenario=None, member=None, grid=None, time=None, bbox=None,
+               version="latest", chunks=None, **open_kwargs):
+        """xarray.Dataset perezoso (dask) con los meses seleccionados de un solo grupo, recortado a time y bbox.
+
+        Varios modelos/escenarios/miembros no se pudieron concatenar (calendarios distintos): ValueError con los
+        grupos encontrados; para eso, open_groups().
+        """
+        found = self.groups(var=var, model=model, scenario=scenario, member=member, grid=grid, time=time,
+                            bbox=bbox, version=version)
+        if not found:
+            raise ValueError("ningún archivo del índice cumplió la selección")
+        if len(found) > 1:
+            names = "; ".join(" ".join(g) for g in sorted(found)[:10])
+            raise ValueError(f"la selección abarcó {len(found)} grupos ({names}{' ...' if len(found) > 10 else ''}); "
+                             "filtrar más o usar open_groups()")
+        (entries,) = found.values()
+        return open_entries(entries, time, bbox, chunks, **open_kwargs)
+
+    def open_groups(self, time=None, bbox=None, chunks=None, version="latest", open_kwargs=None, **filters):
+        """{Grupo: Dataset perezoso} de cada grupo de la selección."""
+        return {g: open_entries(entries, time, bbox, chunks, **(open_kwargs or {}))
+                for g, entries in sorted(self.groups(time=time, bbox=bbox, version=version, **filters).items())}
+
+def _time_bounds(time):
+    if time is None:
+        return None
+    start, stop = (time.start, time.stop) if isinstance(time, slice) else (time, time)
+    return slice(None if start is None else str(start), None if stop is None else str(stop))
+
+def open_entries(entries, time=None, bbox=None, chunks=None, **open_kwargs):
+    """open_mfdataset de los meses (ya ordenados) concatenados en time, sin comparar coordenadas entre archivos.
+
+    chunks=None usó los chunks de cada archivo (los de recomprime.py --layout), así solo se leyó lo pedido.
+    """
+    import xarray as xr
+    kwargs = dict(combine="nested", concat_dim="time", data_vars="minimal", coords="minimal", compat="override",
+                  join="override", parallel=False, chunks={} if chunks is None else chunks)
+    kwargs.update(open_kwargs)
+    ds = xr.open_mfdataset([e.path for e in entries], **kwargs)
+    bounds = _time_bounds(time)
+    if bounds is not None:
+        ds = ds.sel(time=bounds)
+    if bbox is not None:
+        west, east, south, north = bbox
+        lat = "lat" if "lat" in ds.coords else "latitude"
+        lon = "lon" if "lon" in ds.coords else "longitude"
+        if float(ds[lon].max()) > 180 and west < 0:
+            west, east = west % 360, east % 360
+        ascending = bool(ds[lat][0] <= ds[lat][-1]) if ds.sizes[lat] > 1 else True
+        ds = ds.sel({lat: slice(south, north) if ascending else slice(north, south), lon: slice(west, east)})
+    return ds
+
+def main():
+    ap = argparse.ArgumentParser(description="Índice de ../data/<MODELO>/*.nc: actualización incremental y consultas")
+    ap.add_argument("root", nargs="?", default="../data", help="Directorio base (default: ../data)")
+    ap.add_argument("--index", default=None, help=f"Base SQLite del índice (default: <root>/{DEFAULT_INDEX})")
+    ap.add_argument("--full", action="store_true", help="Releyó todos los directorios (no solo los de mtime distinto)")
+    ap.add_argument("--var", default=None, help="Variables separadas por coma")
+    ap.add_argument("--model", default=None, help="Modelos separados por coma")
+    ap.add_argument("--scenario", default=None, help="Escenarios separados por coma")
+    ap.add_argument("--time", default=None, help="Rango YYYY[-MM]:YYYY[-MM] (extremos incluidos)")
+    ap.add_argument("--bbox", nargs=4, type=float, metavar=("WEST", "EAST", "SOUTH", "NORTH"), default=None)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    arch = Archive(args.root, args.index, refresh=False)
+    scanned, added, removed = arch.refresh(full=args.full)
+    print(f"# Índice {arch.index}: {scanned} directorio(s) releídos, {added} archivo(s) nuevos o cambiados, "
+          f"{removed} borrados en {(time.perf_counter() - t0) * 1000:.0f} ms", file=sys.stderr)
+    split = lambda v: v.split(",") if v else None
+    if not any((args.var, args.model, args.scenario, args.time, args.bbox)):
+        for var, model, scen, n, first, last, mb in arch.summary():
+            print(f"{var:8s} {model:20s} {scen:10s} {n:6d} archivos  {first}–{last}  {mb:9.1f} MB")
+        return
+    time_sel = None
+    if args.time:
+        start, _, stop = args.time.partition(":")
+        time_sel = slice(start or None, stop or start or None)
+    for g, entries in sorted(arch.groups(var=split(args.var), model=split(args.model), scenario=split(args.scenario),
+                                         time=time_sel, bbox=args.bbox).items()):
+        print(f"{' '.join(g)}: {len(entries)} archivo(s), {entries[0].ym}–{entries[-1].ym}")
+
+if __name__ == "__main__":
+    main()
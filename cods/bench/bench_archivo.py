@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# bench_archivo.py  (tiempos del índice de archivo.py con cientos de miles de meses: creación, apertura, consultas)
+import argparse, json, os, shutil, sys, tempfile, time
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+import numpy as np
+import thredds_local
+'''
+Se armó un árbol <MODELO>/<var>_day_..._<YYYYMM>_v2.0.nc con enlaces duros a un mes NetCDF clásico por modelo (pocos
+MB de disco para cientos de miles de nombres) y se midió: índice inicial (lee cada cabecera), apertura sin
+cambios (solo mtimes), apertura tras 12 meses nuevos, files() de una serie completa y select() perezoso + una
+lectura de serie. Cada apertura corrió en un subproceso nuevo (sin caché de Python ni módulos ya importados).
+ejemplo:
+python3 bench/bench_archivo.py --models 20 --vars tas,pr,tasmax,tasmin --out bench_archivo.json
+python3 bench/bench_archivo.py --models 35 --vars hurs,huss,pr,rlds,rsds,sfcWind,tas,tasmax,tasmin   # ~457k archivos
+'''
+PERIODS = {"historical": range(1980, 2015), "ssp245": range(2015, 2101)}
+
+def build_tree(root, models, variables):
+    """Árbol de enlaces duros a un mes sintético por modelo (30 días, 360_day, 20×24 celdas); devolvió cuántos archivos.
+
+    Un mes semilla por modelo: el sistema de archivos limitó los enlaces por inodo (~65 mil en ext4).
+    """
+    lat = (-10 + 0.25 * np.arange(20) + 0.125).tolist()
+    lon = (-80 + 0.25 * np.arange(24) + 0.125).tolist()
+    body = thredds_local.netcdf_bytes("tas", [d + 0.5 for d in range(30)], lat, lon, "360_day")
+    n = 0
+    for i in range(models):
+        model = f"BENCH-{i:02d}"
+        seed = os.path.join(root, f".semilla_{model}.nc")
+        with open(seed, "wb") as f:
+            f.write(body)
+        os.makedirs(os.path.join(root, model), exist_ok=True)
+        for var in variables:
+            for scen, years in PERIODS.items():
+                for y in years:
+                    for m in range(1, 13):
+                        name = f"{var}_day_{model}_{scen}_r1i1p1f1_gn_{y}{m:02d}_v2.0.nc"
+                        os.link(seed, os.path.join(root, model, name))
+                        n += 1
+    return n
+
+def timed(code, root):
+    """Corrió code en un intérprete nuevo (con archivo.Archive importado en el tiempo) y devolvió segundos y salida."""
+    prog = ("import sys, time; t = time.perf_counter(); sys.path.insert(0, %r)\n"
+            "from archivo import Archive\n%s\nprint(time.perf_counter() - t)") % (os.path.dirname(HERE), code)
+    import subprocess
+    out = subprocess.run([sys.executable, "-c", prog], capture_output=True, text=True, cwd=root, check=True).stdout.split()
+    return float(out[-1]), out[:-1]
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark del índice de archivo.py")
+    ap.add_argument("--models", type=int, default=20, help="Modelos (default: 20)")
+    ap.add_argument("--vars", default="tas,pr,tasmax,tasmin", help="Variables (default: tas,pr,tasmax,tasmin)")
+    ap.add_argument("--out", default=None, help="Resultado JSON")
+    args = ap.parse_args()
+    if args.models < 1:
+        raise SystemExit("--models debió ser al menos 1")
+    root = tempfile.mkdtemp(prefix="bench_archivo_")
+    try:
+        t0 = time.perf_counter()
+        n = build_tree(root, args.models, args.vars.split(","))
+        res = {"archivos": n, "arbol_s": round(time.perf_counter() - t0, 2)}
+        var = args.vars.split(",")[0]
+        model = f"BENCH-{args.models - 1:02d}"    # consultas sobre el último modelo generado
+        time.sleep(2.5)            # SETTLE_S: mtimes de directorio "asentados", como en un árbol ya descargado
+        res["indice_inicial_s"], _ = timed("a = Archive('.')", root)
+        res["apertura_sin_cambios_s"], _ = timed("a = Archive('.')", root)
+        model_dir = os.path.join(root, "BENCH-00")
+        seed = os.path.join(root, ".semilla_BENCH-00.nc")
+        for m in range(1, 13):
+            os.link(seed, os.path.join(model_dir, f"{var}_day_BENCH-00_ssp245_r1i1p1f1_gn_2101{m:02d}_v2.0.nc"))
+        time.sleep(2.5)
+        res["apertura_12_nuevos_s"], out = timed("a = Archive('.'); print(a.added)", root)
+        res["nuevos_detectados"] = int(out[0])
+        res["apertura_sin_cambios_2_s"], _ = timed("a = Archive('.')", root)
+        res["files_serie_s"], out = timed(
+            "a = Archive('.'); t1 = time.perf_counter(); f = a.files(var=%r, model=%r, scenario='ssp245');"
+            "print(len(f), time.perf_counter() - t1)" % (var, model), root)
+        res["files_serie_n"], res["files_serie_consulta_s"] = int(out[0]), round(float(out[1]), 4)
+        # todos los enlaces tuvieron los mismos tiempos: el recorte en time se hizo solo al elegir archivos
+        res["select_10_anios_s"], out = timed(
+            "import archivo; a = Archive('.'); e = a.files(var=%r, model=%r, scenario='ssp245',"
+            " time=slice('2050', '2059')); ds = archivo.open_entries(e, bbox=(-78, -77, -9, -8));"
+            " t1 = time.perf_counter(); ds['tas'].isel(lat=0, lon=0).values;"
+            "print(ds.sizes['time'], time.perf_counter() - t1)" % (var, model), root)
+        res["select_pasos"], res["select_lectura_s"] = int(out[0]), round(float(out[1]), 3)
+        for k, v in res.items():
+            print(f"{k:26s} {v}")
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump({"parametros": vars(args), "resultado": res}, f, indent=1, ensure_ascii=False)
+            print(f"Resultado: {args.out}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
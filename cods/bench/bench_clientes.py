@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# bench_clientes.py  (wget por subproceso vs. cliente nativo con keep-alive)
+import argparse, os, shutil, subprocess, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import servidor_local
+from cliente_http import ClienteHTTP
+'''
+ejemplo:
+python3 bench/bench_clientes.py --n 300 --size 32768 --jobs 4
+'''
+
+def run_wget(out_path, url):
+    subprocess.run(["wget", "-q", "--continue", "--tries=1", "-O", out_path, url], check=True)
+
+def bench(name, fetch, urls, outdir, jobs):
+    os.makedirs(outdir, exist_ok=True)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        list(ex.map(lambda iu: fetch(os.path.join(outdir, f"m{iu[0]:06d}.nc"), iu[1]), enumerate(urls)))
+    dt = time.perf_counter() - t0
+    total = sum(os.path.getsize(os.path.join(outdir, f)) for f in os.listdir(outdir))
+    print(f"{name:8s} {len(urls):6d} peticiones  {dt:7.2f} s  {len(urls)/dt:8.1f} pet/s  {total/1e6/dt:7.2f} MB/s")
+    return dt
+
+def main():
+    ap = argparse.ArgumentParser(description="Comparó wget y el cliente nativo con muchas descargas mensuales pequeñas")
+    ap.add_argument("--n", type=int, default=200, help="Número de peticiones (default: 200)")
+    ap.add_argument("--size", type=int, default=32768, help="Bytes por respuesta (default: 32768)")
+    ap.add_argument("--latency", type=float, default=0.0, help="Latencia del servidor (s)")
+    ap.add_argument("--jobs", type=int, default=1)
+    args = ap.parse_args()
+
+    srv, base = servidor_local.start(size=args.size, latency=args.latency)
+    urls = [f"{base}/thredds/ncss/grid/x_{i}.nc?var=pr&time_start={i}" for i in range(args.n)]
+    tmp = tempfile.mkdtemp(prefix="bench_clientes_")
+    try:
+        times = {}
+        if shutil.which("wget"):
+            times["wget"] = bench("wget", run_wget, urls, os.path.join(tmp, "wget"), args.jobs)
+        else:
+            print("# Aviso: wget no está en PATH; se midió solo el cliente nativo.", file=sys.stderr)
+        client = ClienteHTTP(tries=1)
+        times["native"] = bench("native", client.download, urls, os.path.join(tmp, "native"), args.jobs)
+        if "wget" in times:
+            print(f"Aceleración native/wget: {times['wget']/times['native']:.1f}x")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+        srv.shutdown()
+
+if __name__ == "__main__":
+    main()
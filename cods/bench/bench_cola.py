@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# bench_cola.py  (p03 --queue con N procesos sobre el mismo --base-dir: escalamiento, duplicados y reclamo tras caída)
+import argparse, glob, json, os, shlex, shutil, signal, subprocess, sys, tempfile, time
+import thredds_local
+from bench_pipeline import CODS, run_cmd
+sys.path.insert(0, CODS)
+import cola, verifica
+'''
+p00 y p02 corrieron una vez; luego, para cada N de --workers, N procesos p03 con la misma lista, el mismo
+--base-dir y la misma --queue. Se contaron las peticiones NCSS servidas (más que los meses = trabajo duplicado)
+y se verificó cada mes escrito. Con --kill se mató (SIGKILL) un trabajador a mitad de corrida: el resto debió
+reclamar sus arriendos tras --lease-ttl y terminar todo sin temporales huérfanos.
+Para que el tope fuera por cliente (como en el servidor real) convino --latency y pocos --jobs por proceso.
+ejemplo:
+python3 bench/bench_cola.py --models 4 --years 2 --latency 0.05 --jobs 2 --workers 1,2,4
+python3 bench/bench_cola.py --latency 0.05 --jobs 2 --workers 2 --kill --lease-ttl 3 --out bench_cola.json
+'''
+
+def p03_cmd(args, queue, data):
+    cmd = [sys.executable, os.path.join(CODS, "p03_thredds_ncss.py"), "enlaces/*.txt", "--base-dir", data,
+           "--queue", queue, "--lease-ttl", str(args.lease_ttl), "--jobs", str(args.jobs), "--bbox"]
+    return cmd + [str(v) for v in args.bbox] + shlex.split(args.p03_args)
+
+def check_tree(data, queue, expected, ttl):
+    """Meses escritos, malos según verifica, temporales y arriendos activos o fallidos que quedaron.
+
+    Uno vencido del trabajador matado pudo quedar si ya había escrito su tarea: nadie más lo necesitó.
+    """
+    files = glob.glob(os.path.join(data, "*", "*.nc"))
+    bad = [p for p in files if verifica.check_file(p)[0] != "ok"]
+    parts = glob.glob(os.path.join(data, "**", "*.part"), recursive=True) + \
+            glob.glob(os.path.join(data, "**", ".*.part"), recursive=True)
+    st = cola.status(queue, ttl)
+    leases = st["activo"] + st["fallido"]
+    return {"meses": len(files), "esperados": expected, "malos": len(bad), "temporales": len(parts),
+            "arriendos": len(leases)}
+
+def run_workers(n, workdir, args, srv, expected, base_ncss=None, kill_after=None):
+    """Corrió n procesos p03 en paralelo; con kill_after mató al primero cuando ya había escrito algo."""
+    tag = f"n{n}{'_kill' if kill_after else ''}"
+    data, queue = os.path.join(workdir, f"data_{tag}"), os.path.join(workdir, f"cola_{tag}")
+    srv.snapshot()
+    t0 = time.perf_counter()
+    procs = []
+    for i in range(n):
+        log = open(os.path.join(workdir, f"p03_{tag}_{i}.log"), "w")
+        procs.append((subprocess.Popen(p03_cmd(args, queue, data), cwd=workdir, stdout=log,
+                                       stderr=subprocess.STDOUT), log))
+    killed = None
+    if kill_after:
+        victim = procs[0][0]
+        while victim.poll() is None and len(glob.glob(os.path.join(data, "*", "*.nc"))) < kill_after:
+            time.sleep(0.02)
+        if victim.poll() is None:
+            victim.send_signal(signal.SIGKILL)
+            killed = victim.pid
+    codes = []
+    for p, log in procs:
+        codes.append(p.wait()); log.close()
+    wall = time.perf_counter() - t0
+    served, faults = srv.snapshot()
+    ncss = sum(1 for kind, _, _ in served if kind == "ncss")
+    # con --chunk una petición trajo varios meses: la referencia fue la primera corrida
+    res = {"trabajadores": n, "wall_s": round(wall, 3), "codigos": codes, "peticiones_ncss": ncss,
+           "duplicadas": max(0, ncss - (base_ncss or ncss)), "meses_s": round(expected / wall, 2), "fallas": faults}
+    if killed:
+        res["matado"] = killed
+    res.update(check_tree(data, queue, expected, args.lease_ttl))
+    return res
+
+def print_row(r, base_wall):
+    speed = base_wall / r["wall_s"] if base_wall else 1.0
+    print(f"N={r['trabajadores']:2d}{' (kill)' if 'matado' in r else '       '} {r['wall_s']:7.2f} s  "
+          f"{r['meses_s']:7.1f} meses/s  x{speed:4.2f} (efic. {speed / r['trabajadores'] * 100:5.1f}%)  "
+          f"NCSS {r['peticiones_ncss']} (+{r['duplicadas']} dup)  meses {r['meses']}/{r['esperados']}  "
+          f"malos {r['malos']}  temporales {r['temporales']}  arriendos {r['arriendos']}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Escalamiento de p03 --queue con varios procesos contra un THREDDS local")
+    thredds_local.add_server_args(ap)
+    ap.add_argument("--workers", default="1,2,4", help="Procesos p03 a probar, separados por coma (default: 1,2,4)")
+    ap.add_argument("--jobs", type=int, default=2, help="--jobs de cada proceso p03 (default: 2)")
+    ap.add_argument("--lease-ttl", type=float, default=5.0, help="--lease-ttl de p03 (default: 5)")
+    ap.add_argument("--kill", action="store_true", help="Además mató un trabajador a mitad de corrida (N = el mayor de --workers)")
+    ap.add_argument("--bbox", nargs=4, type=float, default=[-80, -74, -10, -5], metavar=("W", "E", "S", "N"),
+                    help="Caja de p03 (default: -80 -74 -10 -5)")
+    ap.add_argument("--p03-args", default="--client native", help="Opciones extra de p03 (default: '--client native')")
+    ap.add_argument("--out", default=None, help="Resultado JSON")
+    ap.add_argument("--keep", action="store_true", help="Conservó el directorio de trabajo (logs, datos, colas)")
+    args = ap.parse_args()
+
+    srv, base = thredds_local.start_from_args(args)
+    workdir = tempfile.mkdtemp(prefix="bench_cola_")
+    jobs = ["--jobs", "8"]
+    try:
+        with open(os.path.join(workdir, "preparacion.log"), "w") as log:
+            run_cmd("p00_make_url.py", ["--vars", args.vars, "--periods", args.periods,
+                                        "--root", thredds_local.root_xml(base)] + jobs, workdir, log)
+            for u in sorted(glob.glob(os.path.join(workdir, "urls_*.txt"))):
+                run_cmd("p02_catalogo_thredds.py", [os.path.basename(u)] + jobs, workdir, log)
+        links = sum(1 for p in glob.glob(os.path.join(workdir, "enlaces", "*.txt"))
+                    for ln in open(p) if ln.strip())
+        if not links:
+            raise SystemExit(f"p00/p02 no generaron enlaces (ver {workdir}/preparacion.log)")
+        expected = 12 * links
+        results, base_wall = [], None
+        for n in [int(x) for x in args.workers.split(",")]:
+            r = run_workers(n, workdir, args, srv, expected, results[0]["peticiones_ncss"] if results else None)
+            base_wall = base_wall or r["wall_s"] * r["trabajadores"]
+            print_row(r, base_wall); results.append(r)
+        if args.kill:
+            n = max(2, max(r["trabajadores"] for r in results))
+            r = run_workers(n, workdir, args, srv, expected, results[0]["peticiones_ncss"],
+                            kill_after=max(1, expected // (2 * n)))
+            print_row(r, base_wall); results.append(r)
+        problems = [r for r in results if r["meses"] != expected or r["malos"] or r["temporales"] or r["arriendos"]]
+        if problems:
+            print(f"# Aviso: {len(problems)} corrida(s) con meses faltantes, malos o restos (ver {workdir})", file=sys.stderr)
+            args.keep = True
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump({"parametros": {k: v for k, v in vars(args).items() if k not in ("out", "keep")},
+                           "corridas": results}, f, indent=1, ensure_ascii=False)
+            print(f"Resultado: {args.out}")
+    finally:
+        srv.shutdown()
+        if args.keep:
+            print(f"Directorio de trabajo: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
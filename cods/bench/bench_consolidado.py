@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# bench_consolidado.py  (apertura y serie en un punto: archivos mensuales vs. almacén consolidado)
+import argparse, os, shutil, sys, tempfile, time
+import numpy as np
+import xarray as xr
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import p04_consolidate as p04
+'''
+ejemplo:
+python3 bench/bench_consolidado.py --years 10 --nlat 120 --nlon 160
+'''
+
+def make_monthly_files(base_dir, years, nlat, nlon, model="BENCH-MODEL", var="tas"):
+    """Escribió archivos mensuales sintéticos con el nombre de make_monthly_fname."""
+    out_dir = os.path.join(base_dir, model)
+    os.makedirs(out_dir, exist_ok=True)
+    lat = -60 + 0.25 * np.arange(nlat) + 0.125
+    lon = -90 + 0.25 * np.arange(nlon) + 0.125
+    rng = np.random.default_rng(0)
+    for y in range(2015, 2015 + years):
+        for m in range(1, 13):
+            times = xr.date_range(f"{y}-{m:02d}-01T12", periods=28 if m == 2 else 30 + (m in (1, 3, 5, 7, 8, 10, 12)),
+                                  freq="D", calendar="noleap", use_cftime=True)
+            data = (280 + rng.standard_normal((len(times), nlat, nlon))).astype("f4")
+            ds = xr.Dataset({var: (("time", "lat", "lon"), data)},
+                            coords={"time": times, "lat": lat, "lon": lon})
+            ds.to_netcdf(os.path.join(out_dir, f"{var}_day_{model}_ssp245_r1i1p1f1_gn_{y}{m:02d}_v2.0.nc"),
+                         encoding={"time": {"units": "days since 1850-01-01", "calendar": "noleap"}})
+    return (var, model, "ssp245", "r1i1p1f1", "gn")
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+def point_series_monthly(files, var, lat, lon):
+    with xr.open_mfdataset(files, combine="by_coords") as ds:
+        return ds[var].sel(lat=lat, lon=lon, method="nearest").values
+
+def point_series_store(store, fmt, var, lat, lon):
+    opener = (lambda: xr.open_zarr(store)) if fmt == "zarr" else (lambda: xr.open_dataset(store))
+    with opener() as ds:
+        return ds[var].sel(lat=lat, lon=lon, method="nearest").values
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de consolidación (p04)")
+    ap.add_argument("--years", type=int, default=5)
+    ap.add_argument("--nlat", type=int, default=100)
+    ap.add_argument("--nlon", type=int, default=120)
+    ap.add_argument("--format", choices=["zarr", "nc"], default="zarr")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_consolidado_")
+    try:
+        base, out = os.path.join(tmp, "data"), os.path.join(tmp, "consolidado")
+        key = make_monthly_files(base, args.years, args.nlat, args.nlon)
+        months = p04.scan_groups(base)[key]
+        files = [months[k] for k in sorted(months)]
+        lat, lon = -50.0, -80.0
+
+        dt_build, _ = timed(lambda: p04.consolidate_group(key, months, out, args.format, "series"))
+        store = p04.store_path(out, key, args.format)
+        dt_a, ser_a = timed(lambda: point_series_monthly(files, key[0], lat, lon))
+        dt_b, ser_b = timed(lambda: point_series_store(store, args.format, key[0], lat, lon))
+        assert np.allclose(ser_a, ser_b), "las series no coincidieron"
+        print(f"Archivos mensuales: {len(files)}; consolidación ({args.format}, series): {dt_build:.2f} s")
+        print(f"Serie en un punto  mensuales: {dt_a:7.3f} s   consolidado: {dt_b:7.3f} s   "
+              f"({dt_a/dt_b:.1f}x)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# bench_pipeline.py  (p00 → p02 → p03 de punta a punta contra el THREDDS local; métricas a JSON)
+import argparse, datetime, glob, json, os, platform, pstats, shlex, shutil, subprocess, sys, tempfile, time
+import thredds_local
+'''
+Cada etapa corrió en subprocesos (bench/perfil.py: cProfile en todos los hilos) contra bench/thredds_local.py;
+el servidor registró cada petición (tipo, duración hasta el último byte, bytes) y os.wait4 dio CPU y RSS máximo.
+ejemplo:
+python3 bench/bench_pipeline.py --models 6 --years 2 --jobs 8 --out bench_pipeline.json
+python3 bench/bench_pipeline.py --latency 0.05 --mbps 200 --error-rate 0.02 --compare bench_pipeline.json
+python3 bench/bench_pipeline.py --p03-args "--client wget --chunk year" --history bench_historial.jsonl
+'''
+HERE = os.path.dirname(os.path.abspath(__file__))
+CODS = os.path.dirname(HERE)
+PERFIL = os.path.join(HERE, "perfil.py")
+# métricas comparadas con --compare (True: más es mejor)
+TRACKED = {"wall_s": False, "cpu_s": False, "peak_rss_mb": False, "req_s": True,
+           "catalogos_s": True, "mb_s": True, "lat_p50_ms": False, "lat_p95_ms": False}
+
+def percentile(values, q):
+    if not values:
+        return None
+    s = sorted(values)
+    return s[min(len(s) - 1, int(q / 100 * len(s)))]
+
+def run_cmd(script, argv, cwd, log, prof_path=None):
+    """Corrió un script de cods/ como subproceso; devolvió (código, rusage) del hijo vía os.wait4."""
+    cmd = [sys.executable, PERFIL, prof_path] if prof_path else [sys.executable]
+    cmd += [os.path.join(CODS, script)] + list(argv)
+    log.write(f"$ {shlex.join(cmd)}\n"); log.flush()
+    p = subprocess.Popen(cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+    _, status, ru = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+    return p.returncode, ru
+
+def profile_summary(prof_paths, top):
+    """Funciones con más tiempo propio y tiempo propio por módulo (todos los hilos sumados)."""
+    prof_paths = [p for p in prof_paths if os.path.exists(p)]
+    if not prof_paths:
+        return None
+    st = pstats.Stats(*prof_paths)
+    by_module, rows = {}, []
+    for (fname, line, func), (_, nc, tt, ct, _) in st.stats.items():
+        where = func if fname == "~" else os.path.basename(fname)
+        by_module[where] = by_module.get(where, 0.0) + tt
+        rows.append((tt, ct, nc, f"{os.path.basename(fname)}:{line}({func})"))
+    rows.sort(reverse=True)
+    return {
+        "funciones": [{"funcion": f, "llamadas": nc, "tottime_s": round(tt, 4), "cumtime_s": round(ct, 4)}
+                      for tt, ct, nc, f in rows[:top]],
+        "por_modulo": [{"modulo": m, "tottime_s": round(t, 4)}
+                       for m, t in sorted(by_module.items(), key=lambda kv: -kv[1])[:top]],
+    }
+
+def run_stage(name, commands, srv, workdir, args):
+    """Corrió los comandos de una etapa en serie y resumió tiempos, recursos y lo que vio el servidor."""
+    srv.snapshot()
+    log_path = os.path.join(workdir, f"{name}.log")
+    codes, profs, utime, stime, rss = [], [], 0.0, 0.0, 0
+    t0 = time.perf_counter()
+    with open(log_path, "a") as log:
+        for i, (script, argv) in enumerate(commands):
+            prof = None if args.no_profile else os.path.join(workdir, f"{name}_{i}.prof")
+            code, ru = run_cmd(script, argv, workdir, log, prof)
+            codes.append(code)
+            profs.append(prof)
+            utime, stime = utime + ru.ru_utime, stime + ru.ru_stime
+            rss = max(rss, ru.ru_maxrss)          # KiB en Linux
+    wall = time.perf_counter() - t0
+    served, faults = srv.snapshot()
+    if any(codes):
+        print(f"# Aviso: {name} terminó con código {codes} (ver {log_path})", file=sys.stderr)
+    kinds = {}
+    for kind, dt, nbytes in served:
+        kinds.setdefault(kind, []).append((dt, nbytes))
+    lat_ms = [dt * 1000 for _, dt, _ in served]
+    nbytes = sum(b for _, _, b in served)
+    n_cat = len(kinds.get("catalogo", []))
+    return {
+        "comandos": len(commands), "codigos": codes,
+        "wall_s": round(wall, 3), "cpu_user_s": round(utime, 3), "cpu_sys_s": round(stime, 3),
+        "cpu_s": round(utime + stime, 3), "peak_rss_mb": round(rss / 1024, 1),
+        "peticiones": len(served), "req_s": round(len(served) / wall, 2),
+        "catalogos": n_cat, "catalogos_s": round(n_cat / wall, 2),
+        "mb": round(nbytes / 1e6, 3), "mb_s": round(nbytes / 1e6 / wall, 3),
+        "lat_p50_ms": percentile(lat_ms, 50), "lat_p95_ms": percentile(lat_ms, 95),
+        "por_tipo": {k: {"n": len(v), "mb": round(sum(b for _, b in v) / 1e6, 3),
+                         "p50_ms": percentile([d * 1000 for d, _ in v], 50),
+                         "p95_ms": percentile([d * 1000 for d, _ in v], 95)} for k, v in sorted(kinds.items())},
+        "fallas": faults,
+        "perfil": None if args.no_profile else profile_summary(profs, args.top),
+    }
+
+def git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=CODS, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(prev_path, result):
+    """Imprimió el cambio de cada métrica seguida respecto a una corrida anterior (JSON de --out)."""
+    with open(prev_path) as f:
+        prev = json.load(f)
+    print(f"\nComparación con {prev_path} ({prev.get('fecha')}, git {prev.get('git')}):")
+    changed = sorted(k for k, v in result["parametros"].items() if prev.get("parametros", {}).get(k) != v)
+    if changed:
+        print(f"# Aviso: parámetros distintos ({', '.join(changed)}); la comparación no fue directa.")
+    for stage, cur in result["etapas"].items():
+        old = prev.get("etapas", {}).get(stage)
+        if not old:
+            continue
+        for key, higher_better in TRACKED.items():
+            a, b = old.get(key), cur.get(key)
+            if not a or b is None:
+                continue
+            delta = (b - a) / a * 100
+            worse = delta < -5 if higher_better else delta > 5
+            print(f"  {stage:4s} {key:12s} {a:10.3f} → {b:10.3f}  {delta:+6.1f}%{'  ← peor' if worse else ''}")
+
+def print_stage(name, m):
+    lat = f"p50 {m['lat_p50_ms']:.1f} / p95 {m['lat_p95_ms']:.1f} ms" if m["peticiones"] else "sin peticiones"
+    print(f"{name:4s} {m['wall_s']:7.2f} s  CPU {m['cpu_s']:6.2f} s  RSS {m['peak_rss_mb']:6.1f} MB  "
+          f"{m['peticiones']:5d} pet ({m['req_s']:7.1f}/s)  catálogos {m['catalogos_s']:7.1f}/s  "
+          f"{m['mb_s']:7.2f} MB/s  {lat}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de punta a punta p00 → p02 → p03 contra un THREDDS local")
+    thredds_local.add_server_args(ap)
+    ap.add_argument("--jobs", type=int, default=8, help="--jobs de p00, p02 y p03 (default: 8)")
+    ap.add_argument("--bbox", nargs=4, type=float, default=[-80, -74, -10, -5], metavar=("W", "E", "S", "N"),
+                    help="Caja de p03 (default: -80 -74 -10 -5)")
+    ap.add_argument("--p03-args", default="--client native", help="Opciones extra de p03 (default: '--client native')")
+    ap.add_argument("--out", default="bench_pipeline.json", help="Resultado JSON (default: bench_pipeline.json)")
+    ap.add_argument("--history", default=None, help="JSON-lines al que se agregó una línea por corrida")
+    ap.add_argument("--compare", default=None, help="JSON de una corrida anterior para comparar")
+    ap.add_argument("--top", type=int, default=15, help="Funciones/módulos del perfil guardados (default: 15)")
+    ap.add_argument("--no-profile", action="store_true", help="Sin cProfile (mide sin su sobrecosto)")
+    ap.add_argument("--keep", action="store_true", help="Conservó el directorio de trabajo (logs, .prof, datos)")
+    args = ap.parse_args()
+
+    prev = None
+    if args.compare:
+        prev = args.compare + ".prev"
+        shutil.copyfile(args.compare, prev)   # --out puede ser el mismo archivo
+    srv, base = thredds_local.start_from_args(args)
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    jobs = ["--jobs", str(args.jobs)]
+    result = {"fecha": datetime.datetime.now().isoformat(timespec="seconds"), "git": git_rev(),
+              "python": platform.python_version(), "maquina": platform.machine(), "cpus": os.cpu_count(),
+              "parametros": {k: v for k, v in vars(args).items() if k not in ("out", "history", "compare", "keep", "top")},
+              "etapas": {}}
+    try:
+        stages = result["etapas"]
+        stages["p00"] = run_stage("p00", [("p00_make_url.py", ["--vars", args.vars, "--periods", args.periods,
+                                                               "--root", thredds_local.root_xml(base)] + jobs)],
+                                  srv, workdir, args)
+        urls = sorted(glob.glob(os.path.join(workdir, "urls_*.txt")))
+        stages["p02"] = run_stage("p02", [("p02_catalogo_thredds.py", [os.path.basename(u)] + jobs) for u in urls],
+                                  srv, workdir, args)
+        p03 = ["enlaces/*.txt", "--base-dir", "data", "--bbox"] + [str(v) for v in args.bbox] + jobs
+        stages["p03"] = run_stage("p03", [("p03_thredds_ncss.py", p03 + shlex.split(args.p03_args))],
+                                  srv, workdir, args)
+        stages["p03"]["archivos"] = len(glob.glob(os.path.join(workdir, "data", "*", "*.nc")))
+        for name, m in stages.items():
+            print_stage(name, m)
+        result["total"] = {"wall_s": round(sum(m["wall_s"] for m in stages.values()), 3),
+                           "cpu_s": round(sum(m["cpu_s"] for m in stages.values()), 3)}
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=1, ensure_ascii=False)
+        print(f"Resultado: {args.out}")
+        if args.history:
+            with open(args.history, "a") as f:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        if prev:
+            compare(prev, result)
+    finally:
+        srv.shutdown()
+        if prev:
+            os.remove(prev)
+        if args.keep:
+            print(f"Directorio de trabajo: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# bench_recomprime.py  (tamaño, tiempo de reescritura, lectura y error de cada perfil de recomprime.py)
+import argparse, glob, json, os, re, shutil, sys, tempfile, time
+import numpy as np
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+import recomprime
+'''
+Sin --base-dir se generaron meses sintéticos con estructura de GDDP-CMIP6 (NetCDF clásico float32, como lo
+entregó NCSS): tas con gradiente latitudinal y ruido espacialmente correlacionado, pr con ~60 % de días secos
+y colas gamma. Con --base-dir se copiaron hasta --files meses reales. Para cada perfil se midió el tamaño, la
+reescritura (un proceso), tres lecturas en frío de caché de Python (todo, la serie de una celda, el mapa de un
+día) y el error máximo respecto del original.
+Perfil: <códec>[<nivel>][+pack][/series|/mapas], p.ej. zlib4+pack, zstd3/mapas, none.
+ejemplo:
+python3 bench/bench_recomprime.py --vars tas,pr --months 12 --grid 160x200
+python3 bench/bench_recomprime.py --base-dir ../data --files 24 --profiles zlib1,zlib4+pack,zstd3+pack --out bench_recomprime.json
+'''
+PROFILE_RE = re.compile(r"^(?P<codec>zlib|zstd|none)(?P<level>\d*)(?P<pack>\+pack)?(?:/(?P<layout>series|mapas))?$")
+DEFAULT_PROFILES = "zlib1,zlib4,zlib4+pack,zstd3,zstd3+pack,zlib4+pack/mapas"
+
+def parse_profile(text):
+    m = PROFILE_RE.match(text)
+    if not m:
+        raise SystemExit(f"Perfil inválido: {text} (<códec>[<nivel>][+pack][/series|/mapas])")
+    return recomprime.Perfil(m.group("codec"), int(m.group("level") or 4), True, bool(m.group("pack")),
+                             m.group("layout") or "series")
+
+def smooth_noise(rng, shape, passes=6):
+    """Ruido con correlación espacial (promedios móviles sucesivos), escala ~1."""
+    a = rng.standard_normal(shape).astype(np.float32)
+    for _ in range(passes):
+        a = (a + np.roll(a, 1, -1) + np.roll(a, -1, -1) + np.roll(a, 1, -2) + np.roll(a, -1, -2)) / 5
+    return a / a.std()
+
+def synthetic_field(var, rng, nt, lat, lon):
+    shape = (nt, len(lat), len(lon))
+    if var == "pr":
+        wet = smooth_noise(rng, shape) > 0.25
+        amount = rng.gamma(0.7, 8.0, shape).astype(np.float32) / 86400     # mm/día → kg m-2 s-1
+        return np.where(wet, amount, 0).astype(np.float32)
+    base = 300 - 30 * np.abs(np.sin(np.radians(lat)))[:, None] + np.zeros(len(lon))
+    daily = 3 * smooth_noise(rng, shape) + 2 * smooth_noise(rng, (nt, 1, 1), passes=0)
+    return (base[None] + daily + {"tasmax": 5, "tasmin": -5}.get(var, 0)).astype(np.float32)
+
+def write_synthetic(out_dir, variables, months, grid):
+    """Meses sintéticos <var>_day_BENCH_historical_r1i1p1f1_gn_<YYYYMM>.nc; devolvió las rutas."""
+    import netCDF4
+    ny, nx = grid
+    lat = -10 + 0.25 * np.arange(ny) + 0.125
+    lon = -80 + 0.25 * np.arange(nx) + 0.125
+    rng = np.random.default_rng(0)
+    paths, day0 = [], 0
+    for i in range(months):
+        year, month = 2000 + i // 12, i % 12 + 1
+        nt = 30
+        for var in variables:
+            path = os.path.join(out_dir, "BENCH", f"{var}_day_BENCH_historical_r1i1p1f1_gn_{year}{month:02d}.nc")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with netCDF4.Dataset(path, "w", format="NETCDF3_64BIT_OFFSET") as nc:
+                nc.Conventions = "CF-1.7"
+                for name, n in (("time", nt), ("lat", ny), ("lon", nx)):
+                    nc.createDimension(name, n)
+                t = nc.createVariable("time", "f8", ("time",))
+                t.units, t.calendar = "days since 2000-01-01 00:00:00", "360_day"
+                t[:] = day0 + np.arange(nt) + 0.5
+                for name, vals, units in (("lat", lat, "degrees_north"), ("lon", lon, "degrees_east")):
+                    v = nc.createVariable(name, "f4", (name,))
+                    v.units = units
+                    v[:] = vals
+                v = nc.createVariable(var, "f4", ("time", "lat", "lon"), fill_value=np.float32(1e20))
+                v.units = "kg m-2 s-1" if var == "pr" else "K"
+                v[:] = synthetic_field(var, rng, nt, lat, lon)
+            paths.append(path)
+        day0 += nt
+    return paths
+
+def data_var(nc):
+    return next(n for n, v in nc.variables.items() if v.ndim == 3)
+
+def read_times(paths):
+    """Segundos de tres patrones de lectura: todo, serie de una celda (todos los meses) y mapa de un día."""
+    import netCDF4
+    out = {}
+    for name, index in (("todo_s", lambda v: v[:]),
+                        ("serie_s", lambda v: v[:, v.shape[1] // 2, v.shape[2] // 2]),
+                        ("mapa_s", lambda v: v[0])):
+        t0 = time.perf_counter()
+        for p in paths:
+            with netCDF4.Dataset(p) as nc:
+                index(nc.variables[data_var(nc)])
+        out[name] = round(time.perf_counter() - t0, 4)
+    return out
+
+def max_error(orig, paths):
+    import netCDF4
+    err = {}
+    for a, b in zip(orig, paths):
+        with netCDF4.Dataset(a) as x, netCDF4.Dataset(b) as y:
+            var = data_var(x)
+            d = np.abs(np.ma.filled(x[var][:], np.nan).astype(np.float64) - np.ma.filled(y[var][:], np.nan))
+            err[var] = max(err.get(var, 0.0), float(np.nanmax(d)) if np.isfinite(d).any() else 0.0)
+    return err
+
+def size_of(paths):
+    return sum(os.path.getsize(p) for p in paths)
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de los perfiles de recomprime.py (tamaño, escritura, lectura, error)")
+    ap.add_argument("--base-dir", default=None, help="Meses reales (../data); si se omite, sintéticos")
+    ap.add_argument("--files", type=int, default=24, help="Máximo de archivos reales copiados (default: 24)")
+    ap.add_argument("--vars", default="tas,pr", help="Variables sintéticas (default: tas,pr)")
+    ap.add_argument("--months", type=int, default=6, help="Meses sintéticos por variable (default: 6)")
+    ap.add_argument("--grid", default="120x160", help="Celdas lat×lon sintéticas (default: 120x160, 0.25°)")
+    ap.add_argument("--profiles", default=DEFAULT_PROFILES, help=f"Perfiles separados por coma (default: {DEFAULT_PROFILES})")
+    ap.add_argument("--out", default=None, help="Resultado JSON")
+    args = ap.parse_args()
+
+    profiles = [(p, parse_profile(p)) for p in args.profiles.split(",")]
+    workdir = tempfile.mkdtemp(prefix="bench_recomprime_")
+    try:
+        src_dir = os.path.join(workdir, "original")
+        if args.base_dir:
+            real = sorted(glob.glob(os.path.join(args.base_dir, "*", "*.nc")))[:args.files]
+            if not real:
+                raise SystemExit(f"No hubo archivos .nc en {args.base_dir}/<MODELO>/")
+            orig = []
+            for p in real:
+                dst = os.path.join(src_dir, os.path.basename(os.path.dirname(p)), os.path.basename(p))
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copyfile(p, dst); orig.append(dst)
+        else:
+            ny, nx = (int(v) for v in args.grid.lower().split("x"))
+            orig = write_synthetic(src_dir, args.vars.split(","), args.months, (ny, nx))
+        base_size = size_of(orig)
+        rows = [dict({"perfil": "original", "mb": round(base_size / 1e6, 3), "ratio": 1.0, "escritura_s": 0.0},
+                     **read_times(orig))]
+        for name, perfil in profiles:
+            out_dir = os.path.join(workdir, re.sub(r"\W", "_", name))
+            paths = [os.path.join(out_dir, os.path.relpath(p, src_dir)) for p in orig]
+            for a, b in zip(orig, paths):
+                os.makedirs(os.path.dirname(b), exist_ok=True)
+                shutil.copyfile(a, b)
+            t0 = time.perf_counter()
+            packed = set()
+            for p in paths:
+                packed.update(recomprime.recompress_file(p, perfil)[2])
+            write_s = time.perf_counter() - t0
+            size = size_of(paths)
+            rows.append(dict({"perfil": name, "mb": round(size / 1e6, 3), "ratio": round(size / base_size, 4),
+                              "escritura_s": round(write_s, 3), "int16": sorted(packed),
+                              "error_max": max_error(orig, paths)}, **read_times(paths)))
+        print(f"{len(orig)} archivos, {base_size / 1e6:.1f} MB originales")
+        print(f"{'perfil':20s} {'MB':>9s} {'tamaño':>7s} {'escr. s':>8s} {'todo s':>8s} {'serie s':>8s} {'mapa s':>8s}  error máx.")
+        for r in rows:
+            err = ", ".join(f"{k} {v:.2g}" for k, v in sorted(r.get("error_max", {}).items()))
+            print(f"{r['perfil']:20s} {r['mb']:9.2f} {r['ratio']:7.1%} {r['escritura_s']:8.2f} "
+                  f"{r['todo_s']:8.3f} {r['serie_s']:8.3f} {r['mapa_s']:8.3f}  {err}")
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump({"parametros": vars(args), "archivos": len(orig), "perfiles": rows}, f, indent=1, ensure_ascii=False)
+            print(f"Resultado: {args.out}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# bench_regulador.py  (concurrencia fija vs. regulador AIMD contra un servidor local saturable y con fallas)
+import argparse, os, shutil, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import servidor_local
+from cliente_http import ClienteHTTP, DescargaError
+from regulador import Regulador
+'''
+ejemplo:
+python3 bench/bench_regulador.py --n 400 --jobs 32 --capacity 4 --error-rate 0.02 --rate-429 0.01
+'''
+
+def bench(name, client, srv, urls, outdir, jobs):
+    os.makedirs(outdir, exist_ok=True)
+    with srv.lock:
+        srv.requests = srv.s503 = srv.s5xx = srv.s429 = 0
+
+    def one(iu):
+        try:
+            client.download(os.path.join(outdir, f"m{iu[0]:06d}.nc"), iu[1])
+            return True
+        except (DescargaError, OSError):
+            return False
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        ok = sum(ex.map(one, enumerate(urls)))
+    dt = time.perf_counter() - t0
+    rejected = srv.s503 + srv.s5xx + srv.s429
+    print(f"{name:9s} ok {ok:5d}/{len(urls):<5d} {dt:7.2f} s  {ok/dt:7.1f} arch/s  "
+          f"peticiones {srv.requests:6d}  rechazadas {rejected:5d} (503 por carga {srv.s503}, 5xx {srv.s5xx}, 429 {srv.s429})")
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark del regulador (regulador.py) con inyección de fallas")
+    ap.add_argument("--n", type=int, default=300, help="Descargas (default: 300)")
+    ap.add_argument("--size", type=int, default=32768)
+    ap.add_argument("--latency", type=float, default=0.02, help="Latencia base del servidor (s)")
+    ap.add_argument("--capacity", type=int, default=4, help="Peticiones simultáneas que aguantó el servidor")
+    ap.add_argument("--error-rate", type=float, default=0.02)
+    ap.add_argument("--rate-429", type=float, default=0.01)
+    ap.add_argument("--jobs", type=int, default=32)
+    ap.add_argument("--tries", type=int, default=5)
+    args = ap.parse_args()
+
+    srv, base = servidor_local.start(size=args.size, latency=args.latency, capacity=args.capacity,
+                                     error_rate=args.error_rate, rate_429=args.rate_429)
+    urls = [f"{base}/thredds/ncss/grid/x_{i}.nc?var=pr&time_start={i}" for i in range(args.n)]
+    tmp = tempfile.mkdtemp(prefix="bench_regulador_")
+    try:
+        fixed = ClienteHTTP(tries=args.tries, waitretry=2)
+        bench("fijo", fixed, srv, urls, os.path.join(tmp, "fijo"), args.jobs)
+        reg = Regulador(max_per_host=args.jobs)
+        governed = ClienteHTTP(tries=args.tries, waitretry=2, regulador=reg)
+        bench("regulado", governed, srv, urls, os.path.join(tmp, "regulado"), args.jobs)
+        print(reg.summary())
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+        srv.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# perfil.py  (corrió un script con cProfile en todos sus hilos y guardó un solo perfil combinado)
+import cProfile, os, pstats, runpy, sys, threading
+'''
+cProfile -m solo midió el hilo principal; p00/p02/p03 trabajaron en ThreadPoolExecutor, así que
+cada hilo nuevo arrancó su propio Profile y al final se sumaron todos.
+ejemplo:
+python3 bench/perfil.py /tmp/p03.prof p03_thredds_ncss.py 'enlaces/pr_*.txt' --jobs 8 --client native
+python3 -c "import pstats; pstats.Stats('/tmp/p03.prof').sort_stats('tottime').print_stats(20)"
+'''
+
+def run(out_path, script, argv):
+    """Ejecutó script como __main__ con argv; guardó el perfil de todos los hilos en out_path y devolvió el código de salida."""
+    profiles, lock = [], threading.Lock()
+
+    def hook(frame, event, arg):
+        # primer evento de cada hilo nuevo: Profile.enable reemplazó a este gancho solo en ese hilo
+        prof = cProfile.Profile()
+        with lock:
+            profiles.append(prof)
+        prof.enable()
+
+    sys.argv = [script] + list(argv)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    main_prof = cProfile.Profile()
+    threading.setprofile(hook)
+    code = 0
+    main_prof.enable()
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            print(e.code, file=sys.stderr)
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    finally:
+        main_prof.disable()
+        threading.setprofile(None)
+        stats = pstats.Stats(main_prof)
+        with lock:
+            for prof in profiles:
+                stats.add(prof)
+        stats.dump_stats(out_path)
+    return code
+
+def main():
+    if len(sys.argv) < 3:
+        print("Uso: python3 bench/perfil.py <salida.prof> <script.py> [argumentos...]", file=sys.stderr)
+        sys.exit(2)
+    sys.exit(run(sys.argv[1], sys.argv[2], sys.argv[3:]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# servidor_local.py  (servidor HTTP local que imitó las respuestas NCSS para benchmarks)
+import argparse, calendar as calmod, random, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+'''
+ejemplo:
+python3 bench/servidor_local.py --port 8080 --size 65536 --latency 0.02
+python3 bench/servidor_local.py --capacity 4 --error-rate 0.02 --rate-429 0.01   # servidor saturable con fallas
+python3 bench/servidor_local.py --calendar 360_day      # 400 ante días fuera del calendario y …/dataset.xml
+'''
+
+DATASET_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<gridDataset location="synthetic">
+  <axis name="time" shape="{steps}" type="double" axisType="Time">
+    <attribute name="units" value="days since 1850-01-01 00:00:00"/>
+    <attribute name="calendar" value="{calendar}"/>
+  </axis>
+  <TimeSpan><begin>{year}-01-01T12:00:00Z</begin><end>{year}-12-{last}T12:00:00Z</end></TimeSpan>
+</gridDataset>
+"""
+
+def valid_day(stamp, cal):
+    """¿Existió el día de 'YYYY-MM-DDT...' en el calendario? (lo que THREDDS validó con 400)."""
+    y, m, d = int(stamp[:4]), int(stamp[5:7]), int(stamp[8:10])
+    if cal == "360_day":
+        return d <= 30
+    last = calmod.monthrange(y, m)[1]
+    return d <= (28 if cal == "noleap" and m == 2 else last)
+
+class NCSSHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 para permitir keep-alive (Content-Length siempre presente)
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *a):
+        pass
+
+    def payload_size(self):
+        qs = parse_qs(urlparse(self.path).query)
+        return int(qs.get("size", [self.server.size])[0])
+
+    def _fail(self, status, retry_after=None):
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _xml(self, cal):
+        steps, last = {"360_day": (360, 30), "noleap": (365, 31)}.get(cal, (366, 31))
+        body = DATASET_XML.format(steps=steps, calendar=cal, year=2000, last=last if cal != "360_day" else 30).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        srv = self.server
+        with srv.lock:
+            srv.in_flight += 1
+            srv.requests += 1
+            busy = srv.in_flight
+        try:
+            self._serve(srv, busy)
+        finally:
+            with srv.lock:
+                srv.in_flight -= 1
+
+    def _faults(self, srv, busy):
+        """Latencia y fallas inyectadas; devolvió True si ya se respondió con error."""
+        # saturación simulada: sobre la capacidad la latencia creció con el cuadrado de la carga
+        # (el servidor rindió menos cuanto más se lo saturó) y sobre 2×capacidad se respondió 503
+        if srv.capacity and busy > 2 * srv.capacity:
+            srv.count("s503")
+            self._fail(503, retry_after=1)
+            return True
+        latency = srv.latency * (max(1.0, busy / srv.capacity) ** 2 if srv.capacity else 1.0)
+        if latency:
+            time.sleep(latency)
+        r = random.random()
+        if r < srv.error_rate:
+            srv.count("s5xx")
+            self._fail(random.choice((500, 502, 503, 504)))
+            return True
+        if r < srv.error_rate + srv.rate_429:
+            srv.count("s429")
+            self._fail(429, retry_after=1)
+            return True
+        return False
+
+    def _serve(self, srv, busy):
+        if self._faults(srv, busy):
+            return
+        if srv.calendar:
+            u = urlparse(self.path)
+            if u.path.endswith("/dataset.xml"):
+                srv.count("meta")
+                return self._xml(srv.calendar)
+            qs = parse_qs(u.query)
+            if any(not valid_day(qs[k][0], srv.calendar) for k in ("time_start", "time_end") if k in qs):
+                srv.count("s400")
+                return self._fail(400)
+        size = self.payload_size()
+        start = 0
+        rng = self.headers.get("Range")
+        if rng and rng.startswith("bytes="):
+            start = int(rng[6:].split("-")[0] or 0)
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        self.send_response(206 if start else 200)
+        self.send_header("Content-Type", "application/x-netcdf")
+        self.send_header("Content-Length", str(size - start))
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{size-1}/{size}")
+        self.end_headers()
+        block = self.server.block
+        left = size - start
+        while left > 0:
+            n = min(left, len(block))
+            self.wfile.write(block[:n]); left -= n
+
+class Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+def start(port=0, size=65536, latency=0.0, capacity=0, error_rate=0.0, rate_429=0.0, calendar=None):
+    """Levantó el servidor en un hilo daemon; devolvió (server, base_url).
+
+    capacity: peticiones simultáneas antes de degradarse (0 = sin límite); error_rate/rate_429: fracción de 5xx/429;
+    calendar: 360_day|noleap|gregorian para responder 400 como THREDDS y servir …/dataset.xml (None = sin validar).
+    """
+    srv = Servidor(("127.0.0.1", port), NCSSHandler)
+    srv.size, srv.latency = size, latency
+    srv.capacity, srv.error_rate, srv.rate_429 = capacity, error_rate, rate_429
+    srv.calendar = calendar
+    srv.lock = threading.Lock()
+    srv.in_flight = srv.requests = srv.s503 = srv.s5xx = srv.s429 = srv.s400 = srv.meta = 0
+    srv.block = bytes(range(256)) * 4096
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}"
+
+def main():
+    ap = argparse.ArgumentParser(description="Servidor local de prueba (respuestas sintéticas tipo NCSS)")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--size", type=int, default=65536, help="Bytes por respuesta (o ?size=N)")
+    ap.add_argument("--latency", type=float, default=0.0, help="Latencia artificial por petición (s)")
+    ap.add_argument("--capacity", type=int, default=0, help="Peticiones simultáneas antes de saturarse (0 = sin límite)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 5xx")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="Fracción de respuestas 429 con Retry-After")
+    ap.add_argument("--calendar", choices=["360_day", "noleap", "gregorian"], default=None,
+                    help="Validó los días pedidos (400 como THREDDS) y sirvió …/dataset.xml con ese calendario")
+    args = ap.parse_args()
+    srv, base = start(args.port, args.size, args.latency, args.capacity, args.error_rate, args.rate_429, args.calendar)
+    print(f"Sirviendo en {base} (Ctrl+C para terminar)", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+if __name__ == "__main__":
+    main()
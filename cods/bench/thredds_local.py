@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# thredds_local.py  (THREDDS de prueba: árbol de catálogos GDDP-CMIP6 sintético + NCSS con NetCDF sintético)
+import argparse, calendar as calmod, datetime, hashlib, math, os, struct, sys, threading, time
+from urllib.parse import urlparse, parse_qs, unquote
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import servidor_local
+'''
+Rutas servidas (las mismas que recorrieron p00, p02 y p03):
+    /thredds/catalog/AMES/NEX/GDDP-CMIP6/[<MODELO>/[<PERIODO>/[<MIEMBRO>/[<VAR>/]]]]catalog.xml|catalog.html
+    /thredds/ncss/grid/AMES/NEX/GDDP-CMIP6/<MODELO>/<PERIODO>/<MIEMBRO>/<VAR>/<archivo>.nc?var=…&north=…&time_start=…
+    /thredds/ncss/grid/…/<archivo>.nc/dataset.xml
+ejemplo:
+python3 bench/thredds_local.py --port 8765 --models 4 --vars pr,tas --periods historical,ssp245 --years 2
+python3 p00_make_url.py pr historical --root http://127.0.0.1:8765/thredds/catalog/AMES/NEX/GDDP-CMIP6/catalog.xml
+'''
+PREFIX = "AMES/NEX/GDDP-CMIP6"
+CATALOG = "/thredds/catalog/"
+NCSS = "/thredds/ncss/grid/"
+CALENDARS = ("360_day", "noleap", "gregorian")
+FIRST_YEAR = {"historical": 1980}            # ssp*: 2015
+UNITS = {"pr": "kg m-2 s-1", "tas": "K", "tasmax": "K", "tasmin": "K"}
+LAT0, LON0 = -59.875, -179.875              # centros de la grilla de 0.25° de NEX
+NLAT, NLON = 600, 1440
+
+CATALOG_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<catalog xmlns="http://www.unidata.ucar.edu/namespaces/thredds/InvCatalog/v1.0" xmlns:xlink="http://www.w3.org/1999/xlink" name="{name}" version="1.0.1">
+  <service name="all" serviceType="Compound" base="">
+    <service name="ncss" serviceType="NetcdfSubset" base="/thredds/ncss/grid/"/>
+  </service>
+  <dataset name="{name}" ID="{path}">
+{items}
+  </dataset>
+</catalog>
+"""
+REF_XML = '    <catalogRef xlink:href="{0}/catalog.xml" xlink:title="{0}" ID="{1}/{0}" name=""/>'
+DS_XML = ('    <dataset name="{0}" ID="{1}/{0}" urlPath="{1}/{0}"><serviceName>all</serviceName>'
+          '<dataSize units="Mbytes">250.0</dataSize></dataset>')
+CATALOG_HTML = "<html><head><title>{name}</title></head><body><h2>{name}</h2><table>\n{items}\n</table></body></html>\n"
+REF_HTML = '<tr><td><a href="{0}/catalog.html"><tt>{0}/</tt></a></td></tr>'
+DS_HTML = '<tr><td><a href="catalog.html?dataset={1}/{0}"><tt>{0}</tt></a></td></tr>'
+
+# ------------------------------------------------------------------- árbol
+class Arbol:
+    """Árbol sintético: modelos BENCH-00.. con calendarios alternados (360_day, noleap, gregorian)."""
+    def __init__(self, models=4, variables=("pr",), periods=("historical",), years=2, member="r1i1p1f1", grid="gn"):
+        self.models = {f"BENCH-{i:02d}": CALENDARS[i % len(CALENDARS)] for i in range(models)}
+        self.variables, self.periods, self.years = list(variables), list(periods), years
+        self.member, self.grid = member, grid
+
+    def fnames(self, model, period, var):
+        y0 = FIRST_YEAR.get(period, 2015)
+        return [f"{var}_day_{model}_{period}_{self.member}_{self.grid}_{y}_v2.0.nc" for y in range(y0, y0 + self.years)]
+
+    def children(self, parts):
+        """(subcatálogos, datasets) del nivel parts = [modelo, periodo, miembro, var][:n]; None si no existió."""
+        levels = (self.models, self.periods, [self.member], self.variables)
+        for i, p in enumerate(parts):
+            if i >= len(levels) or p not in levels[i]:
+                return None
+        if len(parts) < 4:
+            return list(levels[len(parts)]), []
+        return [], self.fnames(parts[0], parts[1], parts[3])
+
+    def catalog(self, parts, html):
+        found = self.children(parts)
+        if found is None:
+            return None
+        refs, datasets = found
+        path = "/".join([PREFIX] + parts)
+        name = parts[-1] if parts else "GDDP-CMIP6"
+        if html:
+            items = [REF_HTML.format(r) for r in refs] + [DS_HTML.format(d, path) for d in datasets]
+            return CATALOG_HTML.format(name=name, items="\n".join(items)).encode()
+        items = [REF_XML.format(r, path) for r in refs] + [DS_XML.format(d, path) for d in datasets]
+        return CATALOG_XML.format(name=name, path=path, items="\n".join(items)).encode()
+
+    def dataset(self, rel):
+        """(modelo, var, año, calendario) de <MODELO>/<PERIODO>/<MIEMBRO>/<VAR>/<archivo>; None si no existió."""
+        parts = rel.split("/")
+        if len(parts) != 5 or self.children(parts[:4]) is None or parts[4] not in self.fnames(parts[0], parts[1], parts[3]):
+            return None
+        year = int(parts[4].rsplit("_", 2)[-2])
+        return parts[0], parts[3], year, self.models[parts[0]]
+
+# ----------------------------------------------------------- NetCDF clásico
+def days_since_1850(y, m, d, cal):
+    if cal == "360_day":
+        return (y - 1850) * 360 + (m - 1) * 30 + d - 1
+    if cal == "noleap":
+        return (y - 1850) * 365 + sum(calmod.mdays[1:m]) + d - 1
+    return (datetime.date(y, m, d) - datetime.date(1850, 1, 1)).days
+
+def last_day(y, m, cal):
+    if cal == "360_day":
+        return 30
+    return 28 if cal == "noleap" and m == 2 else calmod.monthrange(y, m)[1]
+
+def iter_days(t0, t1, cal):
+    """Días (y, m, d) entre dos sellos 'YYYY-MM-DD…' inclusive, en el calendario del modelo."""
+    y, m, d = int(t0[:4]), int(t0[5:7]), int(t0[8:10])
+    end = (int(t1[:4]), int(t1[5:7]), int(t1[8:10]))
+    while (y, m, d) <= end:
+        yield y, m, d
+        d += 1
+        if d > last_day(y, m, cal):
+            y, m, d = (y + 1, 1, 1) if m == 12 else (y, m + 1, 1)
+
+def grid_index(lo, hi, first, n, stride):
+    """Índices de los centros de celda dentro de [lo, hi] (como el recorte de NCSS)."""
+    i0 = max(0, math.ceil((lo - first) / 0.25 - 1e-9))
+    i1 = min(n - 1, math.floor((hi - first) / 0.25 + 1e-9))
+    return np.arange(i0, i1 + 1, max(1, stride))
+
+def _name(s):
+    b = s.encode()
+    return struct.pack(">i", len(b)) + b + b"\0" * (-len(b) % 4)
+
+def _attrs(attrs):
+    if not attrs:
+        return b"\0" * 8
+    out = struct.pack(">ii", 0x0C, len(attrs))
+    for k, v in attrs.items():
+        b = v.encode()
+        out += _name(k) + struct.pack(">ii", 2, len(b)) + b + b"\0" * (-len(b) % 4)
+    return out
+
+def netcdf_bytes(var, times, lat, lon, cal):
+    """NetCDF clásico (64-bit offset) con time/lat/lon y var(time, lat, lon) float32; sin dependencias."""
+    nt, ny, nx = len(times), len(lat), len(lon)
+    dims = [("time", nt), ("lat", ny), ("lon", nx)]
+    # (nombre, dimids, atributos, tipo, arreglo big-endian)
+    block = ((np.add.outer(np.arange(ny), np.arange(nx)) % 97) * 1e-6).astype(">f4")
+    variables = [
+        ("time", [0], {"units": "days since 1850-01-01 00:00:00", "calendar": cal, "axis": "T"}, 6,
+         np.asarray(times, ">f8")),
+        ("lat", [1], {"units": "degrees_north", "axis": "Y"}, 5, np.asarray(lat, ">f4")),
+        ("lon", [2], {"units": "degrees_east", "axis": "X"}, 5, np.asarray(lon, ">f4")),
+        (var, [0, 1, 2], {"units": UNITS.get(var, "1")}, 5, None),
+    ]
+    sizes = [a.nbytes if a is not None else nt * block.nbytes for *_, a in variables]
+    vsizes = [s + (-s % 4) for s in sizes]
+
+    def header(offset):
+        h = b"CDF\x02" + struct.pack(">i", 0)
+        h += struct.pack(">ii", 0x0A, len(dims)) + b"".join(_name(n) + struct.pack(">i", size) for n, size in dims)
+        h += _attrs({"Conventions": "CF-1.7", "title": "sintético (bench/thredds_local.py)"})
+        h += struct.pack(">ii", 0x0B, len(variables))
+        for (name, dimids, attrs, nctype, _), vsize in zip(variables, vsizes):
+            h += _name(name) + struct.pack(">i", len(dimids)) + b"".join(struct.pack(">i", d) for d in dimids)
+            h += _attrs(attrs) + struct.pack(">iiq", nctype, min(vsize, 2**31 - 1), offset)
+            offset += vsize
+        return h
+
+    hlen = len(header(0))
+    parts = [header(hlen)]
+    for (*_, a), size, vsize in zip(variables, sizes, vsizes):
+        parts.append(a.tobytes() if a is not None else block.tobytes() * nt)
+        parts.append(b"\0" * (vsize - size))
+    return b"".join(parts)
+
+# ------------------------------------------------------------------ servidor
+class Handler(servidor_local.NCSSHandler):
+    def _send(self, status, body, ctype, headers=None):
+        start = 0
+        rng = self.headers.get("Range")
+        if status == 200 and rng and rng.startswith("bytes="):
+            start = min(int(rng[6:].split("-")[0] or 0), len(body))
+        self.send_response(206 if start else status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body) - start))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(body)-1}/{len(body)}")
+        self.end_headers()
+        self._write(memoryview(body)[start:])
+        return len(body) - start
+
+    def _write(self, view):
+        # ancho de banda por conexión: se pausó lo necesario para no superar --mbps
+        rate = self.server.mbps * 1e6 / 8 if self.server.mbps else 0
+        t0, sent = time.perf_counter(), 0
+        for i in range(0, len(view), 1 << 16):
+            chunk = view[i:i + (1 << 16)]
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            if rate:
+                wait = sent / rate - (time.perf_counter() - t0)
+                if wait > 0:
+                    time.sleep(wait)
+
+    def _serve(self, srv, busy):
+        t0 = time.perf_counter()
+        kind, nbytes = "error", 0
+        try:
+            if self._faults(srv, busy):
+                return
+            kind, nbytes = self._route(srv)
+        finally:
+            srv.record(kind, time.perf_counter() - t0, nbytes)
+
+    def _route(self, srv):
+        u = urlparse(self.path)
+        path = unquote(u.path)
+        if path.startswith(CATALOG + PREFIX + "/"):
+            rel = path[len(CATALOG + PREFIX) + 1:]
+            folder, leaf = rel.rpartition("/")[0], rel.rpartition("/")[2]
+            body = None
+            if leaf in ("catalog.xml", "catalog.html"):
+                body = srv.arbol.catalog([p for p in folder.split("/") if p], leaf.endswith(".html"))
+            if body is None:
+                self._fail(404)
+                return "error", 0
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return "catalogo", 0
+            ctype = "text/html" if leaf.endswith(".html") else "application/xml"
+            return "catalogo", self._send(200, body, ctype, {"ETag": etag})
+        if path.startswith(NCSS + PREFIX + "/"):
+            rel = path[len(NCSS + PREFIX) + 1:]
+            meta = rel.endswith("/dataset.xml")
+            info = srv.arbol.dataset(rel[:-len("/dataset.xml")] if meta else rel)
+            if info is None:
+                self._fail(404)
+                return "error", 0
+            if meta:
+                return "meta", self._dataset_xml(info)
+            return self._subset(info, {k: v[0] for k, v in parse_qs(u.query).items()})
+        self._fail(404)
+        return "error", 0
+
+    def _dataset_xml(self, info):
+        _, _, year, cal = info
+        steps = 360 if cal == "360_day" else (366 if cal == "gregorian" and calmod.isleap(year) else 365)
+        last = 30 if cal == "360_day" else 31
+        body = servidor_local.DATASET_XML.format(steps=steps, calendar=cal, year=year, last=last).encode()
+        return self._send(200, body, "application/xml")
+
+    def _subset(self, info, qs):
+        model, var, year, cal = info
+        if qs.get("var", var) != var:
+            self._fail(400)
+            return "error", 0
+        t0 = qs.get("time_start", f"{year}-01-01T12:00:00Z")
+        t1 = qs.get("time_end", f"{year}-12-{30 if cal == '360_day' else 31}T12:00:00Z")
+        if not (servidor_local.valid_day(t0, cal) and servidor_local.valid_day(t1, cal)):
+            self.server.count("s400")
+            self._fail(400)
+            return "error", 0
+        times = [days_since_1850(y, m, d, cal) + 0.5 for y, m, d in iter_days(t0, t1, cal)]
+        if "latitude" in qs and "longitude" in qs:
+            return "csv", self._point_csv(var, float(qs["latitude"]), float(qs["longitude"]), t0, t1, cal)
+        stride = int(qs.get("horizStride", 1))
+        iy = grid_index(float(qs.get("south", -90)), float(qs.get("north", 90)), LAT0, NLAT, stride)
+        ix = grid_index(float(qs.get("west", -180)), float(qs.get("east", 180)), LON0, NLON, stride)
+        body = netcdf_bytes(var, times, LAT0 + 0.25 * iy, LON0 + 0.25 * ix, cal)
+        return "ncss", self._send(200, body, "application/x-netcdf")
+
+    def _point_csv(self, var, lat, lon, t0, t1, cal):
+        rows = [f'time,latitude[unit="degrees_north"],longitude[unit="degrees_east"],{var}[unit="{UNITS.get(var, "1")}"]']
+        rows += [f"{y:04d}-{m:02d}-{d:02d}T12:00:00Z,{lat},{lon},{(d % 97) * 1e-6:.7g}" for y, m, d in iter_days(t0, t1, cal)]
+        return self._send(200, ("\n".join(rows) + "\n").encode(), "text/csv")
+
+class Servidor(servidor_local.Servidor):
+    def record(self, kind, dt, nbytes):
+        with self.lock:
+            self.log.append((kind, dt, nbytes))
+
+    def snapshot(self):
+        """Peticiones registradas hasta ahora (kind, segundos, bytes) y contadores de fallas; vació el registro."""
+        with self.lock:
+            log, self.log = self.log, []
+            counts = {k: getattr(self, k) for k in ("s503", "s5xx", "s429", "s400")}
+            for k in counts:
+                setattr(self, k, 0)
+        return log, counts
+
+def start(port=0, arbol=None, latency=0.0, mbps=0.0, capacity=0, error_rate=0.0, rate_429=0.0):
+    """Levantó el THREDDS de prueba en un hilo daemon; devolvió (server, base_url).
+
+    mbps: tope por conexión en megabits/s (0 = sin tope); el resto como en servidor_local.start.
+    """
+    srv = Servidor(("127.0.0.1", port), Handler)
+    srv.arbol = arbol or Arbol()
+    srv.latency, srv.mbps = latency, mbps
+    srv.capacity, srv.error_rate, srv.rate_429 = capacity, error_rate, rate_429
+    srv.calendar = None
+    srv.lock = threading.Lock()
+    srv.log = []
+    srv.in_flight = srv.requests = srv.s503 = srv.s5xx = srv.s429 = srv.s400 = srv.meta = 0
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}"
+
+def root_xml(base):
+    return f"{base}{CATALOG}{PREFIX}/catalog.xml"
+
+def add_server_args(ap):
+    """Opciones del árbol y de las fallas, compartidas con bench_pipeline.py."""
+    ap.add_argument("--models", type=int, default=4, help="Modelos sintéticos (default: 4)")
+    ap.add_argument("--vars", default="pr", help="Variables separadas por coma (default: pr)")
+    ap.add_argument("--periods", default="historical", help="Periodos separados por coma (default: historical)")
+    ap.add_argument("--years", type=int, default=2, help="Años (datasets) por periodo (default: 2)")
+    ap.add_argument("--latency", type=float, default=0.0, help="Latencia artificial por petición (s)")
+    ap.add_argument("--mbps", type=float, default=0.0, help="Ancho de banda por conexión en Mbit/s (0 = sin tope)")
+    ap.add_argument("--capacity", type=int, default=0, help="Peticiones simultáneas antes de saturarse (0 = sin límite)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 5xx")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="Fracción de respuestas 429 con Retry-After")
+
+def start_from_args(args, port=0):
+    arbol = Arbol(args.models, args.vars.split(","), args.periods.split(","), args.years)
+    return start(port, arbol, args.latency, args.mbps, args.capacity, args.error_rate, args.rate_429)
+
+def main():
+    ap = argparse.ArgumentParser(description="THREDDS local de prueba (catálogos GDDP-CMIP6 y NCSS sintéticos)")
+    ap.add_argument("--port", type=int, default=8765)
+    add_server_args(ap)
+    args = ap.parse_args()
+    srv, base = start_from_args(args, args.port)
+    print(f"Sirviendo en {base}; raíz: {root_xml(base)} (Ctrl+C para terminar)", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# cache_catalogo.py  (caché en disco de catálogos THREDDS con revalidación ETag/Last-Modified)
+import hashlib, json, os, threading, time
+from cliente_http import ClienteHTTP, DescargaError
+'''
+Uso desde p00/p02:
+    cache = CacheCatalogo(".cache_catalogos", ttl=86400)
+    data = cache.fetch("https://.../catalog.xml")
+'''
+DEFAULT_DIR = ".cache_catalogos"
+DEFAULT_TTL = 24 * 3600
+
+class CacheCatalogo:
+    """Caché clave=URL. Dentro del TTL no tocó la red; vencido el TTL revalidó con
+    If-None-Match / If-Modified-Since y, ante 304, reutilizó el cuerpo guardado."""
+    def __init__(self, cache_dir=DEFAULT_DIR, ttl=DEFAULT_TTL, client=None, enabled=True, timeout=60, regulador=None,
+                 metricas=None):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.enabled = enabled
+        self.client = client or ClienteHTTP(tries=3, timeout=timeout, waitretry=5, regulador=regulador, metricas=metricas)
+        self.metricas = metricas
+        self.lock = threading.Lock()
+        self.hits = self.revalidated = self.downloaded = 0
+        if enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        sub = os.path.join(self.cache_dir, key[:2])
+        return os.path.join(sub, key + ".body"), os.path.join(sub, key + ".json")
+
+    def _count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+        if self.metricas is not None:
+            self.metricas.count(f"cache_{name}")
+
+    def _store(self, url, body, headers):
+        body_p, meta_p = self._paths(url)
+        os.makedirs(os.path.dirname(body_p), exist_ok=True)
+        meta = {"url": url, "fetched_at": time.time(),
+                "etag": headers.get("ETag") or headers.get("Etag"),
+                "last_modified": headers.get("Last-Modified"),
+                "sha1": hashlib.sha1(body).hexdigest()}
+        # escritura atómica: otro hilo/proceso nunca vio un cuerpo a medias
+        tmp = f"{body_p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, body_p)
+        self._write_meta(meta_p, meta)
+        return meta
+
+    def _write_meta(self, meta_p, meta):
+        tmp = f"{meta_p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_p)
+
+    def _load(self, url):
+        body_p, meta_p = self._paths(url)
+        try:
+            with open(meta_p) as f:
+                meta = json.load(f)
+            with open(body_p, "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def get(self, url):
+        """Devolvió (cuerpo, cambió). cambió=False si vino de caché o de un 304."""
+        if not self.enabled:
+            return self._download(url, {})[0], True
+        meta, body = self._load(url)
+        if meta is not None and time.time() - meta.get("fetched_at", 0) < self.ttl:
+            self._count("hits")
+            return body, False
+        cond = {}
+        if meta is not None:
+            if meta.get("etag"):
+                cond["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                cond["If-Modified-Since"] = meta["last_modified"]
+        new_body, status, headers = self._download(url, cond)
+        if status == 304 and body is not None:
+            self._count("revalidated")
+            meta["fetched_at"] = time.time()
+            self._write_meta(self._paths(url)[1], meta)
+            return body, False
+        self._count("downloaded")
+        old_sha1 = meta.get("sha1") if meta else None
+        meta = self._store(url, new_body, headers)
+        return new_body, meta["sha1"] != old_sha1
+
+    def fetch(self, url):
+        return self.get(url)[0]
+
+    def _download(self, url, headers):
+        status, hdrs, body = self.client.get(url, headers=headers)
+        if status >= 400:
+            raise DescargaError(f"HTTP {status} en {url}", status=status)
+        return body, status, hdrs
+
+    def summary(self):
+        return (f"# Caché: {self.hits} aciertos, {self.revalidated} revalidados (304), "
+                f"{self.downloaded} descargados")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# calendario.py  (planificador del eje de tiempo: calendario de cada modelo leído una vez de dataset.xml de NCSS)
+import argparse, calendar as calmod, glob, json, os, sys, threading
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from urllib.parse import urlparse
+'''
+Usado por p03 con --calendar auto (por defecto):
+    plan = Planificador(".cache_catalogos/calendarios.json", fetch_fn)
+    cal = plan.lookup(base_ncss)          # Calendario('360_day', exact=True)
+    month_last_day(year, m, cal.calendar) # ventanas exactas: sin 400 ni segundo intento
+ejemplo:
+python3 calendario.py "https://ds.nccs.nasa.gov/thredds/ncss/grid/AMES/NEX/GDDP-CMIP6/ACCESS-CM2/historical/r1i1p1f1/pr/pr_day_ACCESS-CM2_historical_r1i1p1f1_gn_1980_v2.0.nc"
+python3 calendario.py --list
+'''
+DEFAULT_PATH = os.path.join(".cache_catalogos", "calendarios.json")
+# atributo calendar de CF -> nombres de month_last_day (p03)
+CF_CALENDARS = {"360_day": "360_day", "noleap": "noleap", "365_day": "noleap",
+                "standard": "gregorian", "gregorian": "gregorian", "proleptic_gregorian": "gregorian"}
+
+# calendar: nombre de month_last_day; exact: leído del servidor (True) o supuesto por --calendar (False)
+Calendario = namedtuple("Calendario", "calendar exact")
+
+def model_of(url):
+    parts = urlparse(url).path.strip("/").split("/")
+    try:
+        return parts[parts.index("GDDP-CMIP6") + 1]
+    except (ValueError, IndexError):
+        return None
+
+def parse_dataset_xml(body):
+    """(calendar CF, inicio, fin, pasos) del eje de tiempo en el dataset.xml de NCSS (None si faltó)."""
+    root = ET.fromstring(body)
+    cf = steps = None
+    for axis in root.iter("axis"):
+        if axis.get("axisType") == "Time" or axis.get("name") == "time":
+            shape = axis.get("shape") or ""
+            steps = int(shape) if shape.isdigit() else None
+            for attr in axis.iter("attribute"):
+                if attr.get("name") == "calendar":
+                    cf = attr.get("value")
+            break
+    return cf, root.findtext(".//TimeSpan/begin"), root.findtext(".//TimeSpan/end"), steps
+
+def infer_calendar(cf, begin, end, steps):
+    """Calendario exacto desde el atributo CF o, si faltó, desde el fin y el número de pasos del año; None si fue ambiguo."""
+    if cf and cf.lower() in CF_CALENDARS:
+        return CF_CALENDARS[cf.lower()]
+    if end and end[5:10] == "12-30" or steps == 360:
+        return "360_day"
+    if begin and steps in (365, 366) and calmod.isleap(int(begin[:4])):
+        # solo un año bisiesto distinguió noleap de gregoriano
+        return "gregorian" if steps == 366 else "noleap"
+    return None
+
+def local_calendar(root, model):
+    """(calendar CF, archivo) desde la cabecera de un NetCDF del modelo en un espejo local (p03 --source local:)."""
+    import verifica
+    for path in sorted(glob.glob(os.path.join(root, model, "*.nc")))[:3]:
+        cf = verifica.file_calendar(path)
+        if cf:
+            return cf, os.path.basename(path)
+    return None, None
+
+class Planificador:
+    """Calendario por modelo, pedido una sola vez (dataset.xml del primer dataset visto) y guardado en JSON.
+
+    Con local_root se leyó primero la cabecera de un archivo del modelo en el espejo local (sin red).
+    Si no se pudo leer, lookup devolvió el calendario de respaldo con exact=False (p03 reintentó como antes).
+    """
+    def __init__(self, path=DEFAULT_PATH, fetch_fn=None, fallback="auto", local_root=None):
+        self.path, self.fetch_fn, self.fallback = path, fetch_fn, fallback
+        self.local_root = local_root
+        self.lock = threading.Lock()           # protegió models/failed/fetched, nunca un pedido de red
+        self.pending = {}                      # modelo -> candado del único pedido en curso
+        self.failed = set()
+        self.fetched = 0
+        try:
+            with open(path) as f:
+                self.models = json.load(f)
+        except (OSError, ValueError):
+            self.models = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # temporal propio: varios procesos (--queue) compartieron el mismo calendarios.json
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.models, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def lookup(self, base):
+        """Calendario del modelo del dataset base (URL NCSS sin consulta)."""
+        model = model_of(base)
+        with self.lock:
+            known = self._known(model)
+            if known is not None:
+                return known
+            model_lock = self.pending.setdefault(model, threading.Lock())
+        # un solo pedido por modelo: los hilos del mismo modelo esperaron al primero; los demás siguieron
+        with model_lock:
+            with self.lock:
+                known = self._known(model)
+                if known is not None:
+                    return known
+            info = self._resolve(model, base)
+            with self.lock:
+                if info is None:
+                    self.failed.add(model)
+                    return Calendario(self.fallback, False)
+                self.models[model] = info
+                self.save()
+                return Calendario(info["calendar"], True)
+
+    def _known(self, model):
+        """Calendario ya resuelto (o el de respaldo si no hubo forma de leerlo); None si faltó pedirlo."""
+        if model in self.models:
+            return Calendario(self.models[model]["calendar"], True)
+        if model is None or model in self.failed or (self.fetch_fn is None and not self.local_root):
+            return Calendario(self.fallback, False)
+        return None
+
+    def _resolve(self, model, base):
+        """Entrada de la caché JSON desde el espejo local o dataset.xml (fuera del candado); None si no se pudo."""
+        if self.local_root:
+            cf, fname = local_calendar(self.local_root, model)
+            if cf and cf.lower() in CF_CALENDARS:
+                return {"calendar": CF_CALENDARS[cf.lower()], "cf": cf, "dataset": fname}
+        if self.fetch_fn is None:
+            return None
+        with self.lock:
+            self.fetched += 1
+        try:
+            cf, begin, end, steps = parse_dataset_xml(self.fetch_fn(base + "/dataset.xml"))
+            cal = infer_calendar(cf, begin, end, steps)
+        except (OSError, ValueError, ET.ParseError) as e:
+            print(f"# Aviso: no se leyó el calendario de {model} ({e}); se usó --calendar {self.fallback} con reintento.",
+                  file=sys.stderr, flush=True)
+            return None
+        if cal is None:
+            return None
+        return {"calendar": cal, "cf": cf, "begin": begin, "end": end, "dataset": base.rsplit("/", 1)[-1]}
+
+    def summary(self):
+        return (f"# Calendarios: {len(self.models)} modelo(s) conocidos, {self.fetched} dataset.xml pedidos, "
+                f"{len(self.failed)} sin calendario (reintento a la antigua)")
+
+def client_fetch(client):
+    """fetch_fn sobre ClienteHTTP.get: cuerpo si 200; si no, error."""
+    def fetch(url):
+        status, _, body = client.get(url)
+        if status != 200:
+            raise OSError(f"HTTP {status}")
+        return body
+    return fetch
+
+def main():
+    from cliente_http import ClienteHTTP
+    ap = argparse.ArgumentParser(description="Calendario por modelo desde dataset.xml de NCSS (caché JSON)")
+    ap.add_argument("base", nargs="*", help="URL NCSS de un dataset (…/thredds/ncss/grid/…/archivo.nc)")
+    ap.add_argument("--cache", default=DEFAULT_PATH, help=f"Caché JSON (default: {DEFAULT_PATH})")
+    ap.add_argument("--list", action="store_true", help="Listó los calendarios en caché.")
+    args = ap.parse_args()
+
+    plan = Planificador(args.cache, client_fetch(ClienteHTTP(tries=3, timeout=30)))
+    for base in args.base:
+        cal = plan.lookup(base.split("?", 1)[0])
+        print(f"{model_of(base)}\t{cal.calendar}\t{'exacto' if cal.exact else 'supuesto'}")
+    if args.list or not args.base:
+        for model, info in sorted(plan.models.items()):
+            print(f"{model}\t{info['calendar']}\t{info.get('begin')} .. {info.get('end')}")
+
+if __name__ == "__main__":
+    main()
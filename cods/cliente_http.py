@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# cliente_http.py  (cliente HTTP nativo con conexiones persistentes; reemplazo de wget)
+import http.client, os, random, sys, threading, time
+from urllib.parse import urlparse, urljoin
+'''
+Uso desde p03:
+python3 p03_thredds_ncss.py enlaces/pr_ACCESS-CM2_historical.txt --client native --jobs 8
+'''
+CHUNK = 1 << 20          # 1 MiB por lectura/escritura
+MAX_REDIRECTS = 5
+# Estados que ameritaron reintento (igual que wget: errores de servidor y saturación)
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+class DescargaError(Exception):
+    """Error definitivo de descarga (tras agotar reintentos o por un 4xx no reintentable)."""
+    def __init__(self, msg, status=None, retry_after=None):
+        super().__init__(msg)
+        self.status = status
+        self.retry_after = retry_after
+
+class ClienteHTTP:
+    """Cliente HTTP(S) con un pool de conexiones keep-alive por hilo y host.
+
+    tries/timeout/waitretry siguieron la semántica de wget: tries intentos en total,
+    y espera lineal 1, 2, ... hasta waitretry segundos entre reintentos.
+    Con regulador (regulador.Regulador) cada intento pidió turno al host, se respetó Retry-After
+    y la espera fue exponencial con jitter.
+    Con metricas (metricas.Metricas) se registró cada intento: latencia, bytes, estado HTTP y número de intento.
+    """
+    def __init__(self, tries=5, timeout=60, waitretry=10, chunk=CHUNK, user_agent="dolo_CMIP6", regulador=None,
+                 metricas=None):
+        self.tries = max(1, tries)
+        self.timeout = timeout
+        self.waitretry = waitretry
+        self.chunk = chunk
+        self.user_agent = user_agent
+        self.regulador = regulador
+        self.metricas = metricas
+        self._local = threading.local()
+
+    # ---------------------------------------------------------------- pool
+    def _pool(self):
+        pool = getattr(self._local, "pool", None)
+        if pool is None:
+            pool = self._local.pool = {}
+        return pool
+
+    def _conn(self, scheme, netloc):
+        pool = self._pool()
+        key = (scheme, netloc)
+        conn = pool.get(key)
+        if conn is None:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = pool[key] = cls(netloc, timeout=self.timeout)
+        return conn
+
+    def _drop(self, scheme, netloc):
+        conn = self._pool().pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        for conn in self._pool().values():
+            conn.close()
+        self._pool().clear()
+
+    def _request(self, url, headers=None):
+        """Abrió la respuesta de un GET siguiendo redirecciones; reutilizó la conexión del pool."""
+        for _ in range(MAX_REDIRECTS + 1):
+            u = urlparse(url)
+            path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+            hdrs = {"User-Agent": self.user_agent, "Accept-Encoding": "identity"}
+            hdrs.update(headers or {})
+            conn = self._conn(u.scheme, u.netloc)
+            try:
+                conn.request("GET", path, headers=hdrs)
+                resp = conn.getresponse()
+            except (http.client.HTTPException, OSError):
+                # conexión persistente cerrada por el servidor: se reabrió una vez
+                self._drop(u.scheme, u.netloc)
+                conn = self._conn(u.scheme, u.netloc)
+                conn.request("GET", path, headers=hdrs)
+                resp = conn.getresponse()
+            if resp.status in (301, 302, 303, 307, 308) and resp.getheader("Location"):
+                resp.read()
+                url = urljoin(url, resp.getheader("Location"))
+                continue
+            return url, resp
+        raise DescargaError(f"demasiadas redirecciones: {url}")
+
+    def _attempt(self, url, attempt):
+        if self.regulador is None:
+            return attempt(None)
+        # red caída o timeout dentro del turno: contó como fallo del host en el regulador; un circuito
+        # abierto se esperó sin contar como intento
+        with self.regulador.slot(url, wait_open=True) as ticket:
+            return attempt(ticket)
+
+    def _error(self, resp, url):
+        retry_after = None
+        if self.regulador is not None and resp.status in (429, 503):
+            retry_after = self.regulador.retry_after(resp.getheader("Retry-After"))
+            if retry_after is not None:
+                self.regulador.throttled(url)
+        return DescargaError(f"HTTP {resp.status} en {url}", status=resp.status, retry_after=retry_after)
+
+    def _retrying(self, url, attempt):
+        """Ejecutó attempt(ticket) con la política de reintentos; re-lanzó el último error."""
+        last = None
+        metr = self.metricas
+        for i in range(1, self.tries + 1):
+            t0 = time.perf_counter()
+            try:
+                out = self._attempt(url, attempt)
+                if metr is not None:
+                    # attempt dejó (estado, bytes) del intento en el hilo
+                    status, n = self._local.last
+                    metr.request(url, status, time.perf_counter() - t0, n, i)
+                return out
+            except DescargaError as e:
+                if metr is not None:
+                    metr.request(url, e.status, time.perf_counter() - t0, 0, i, error=str(e))
+                if e.status is not None and e.status not in RETRY_STATUS:
+                    raise
+                last = e
+            except (http.client.HTTPException, OSError) as e:
+                if metr is not None:
+                    metr.request(url, None, time.perf_counter() - t0, 0, i, error=f"{type(e).__name__}: {e}")
+                u = urlparse(url); self._drop(u.scheme, u.netloc)
+                last = DescargaError(f"{url}: {e}")
+            if i < self.tries:
+                if self.regulador is not None:
+                    time.sleep(self.regulador.wait(i, last.retry_after, cap=max(1, self.waitretry)))
+                else:
+                    time.sleep(min(i, self.waitretry) + random.uniform(0, 0.1))
+        raise last
+
+    # ---------------------------------------------------------------- API
+    def get(self, url, headers=None):
+        """GET completo en memoria (catálogos, metadatos). Devolvió (status, headers, body)."""
+        def attempt(ticket):
+            _, resp = self._request(url, headers)
+            if ticket is not None:
+                ticket.first_byte()
+            body = resp.read()
+            if resp.status in RETRY_STATUS:
+                raise self._error(resp, url)
+            if ticket is not None:
+                ticket.consume(len(body))
+            self._local.last = (resp.status, len(body))
+            return resp.status, dict(resp.getheaders()), body
+        return self._retrying(url, attempt)
+
+    def download(self, out_path, url, resume=True):
+        """Escribió la respuesta en out_path por bloques; con resume usó Range para continuar.
+
+        Devolvió los bytes escritos en esta llamada. Lanzó DescargaError ante 4xx/5xx.
+        """
+        def attempt(ticket):
+            have = os.path.getsize(out_path) if resume and os.path.exists(out_path) else 0
+            headers = {"Range": f"bytes={have}-"} if have else {}
+            _, resp = self._request(url, headers)
+            if ticket is not None:
+                ticket.first_byte()
+            if resp.status == 416 and have:
+                # el servidor indicó que el archivo ya estaba completo
+                resp.read()
+                self._local.last = (416, 0)
+                return 0
+            if resp.status not in (200, 206):
+                resp.read()
+                raise self._error(resp, url)
+            mode = "ab" if resp.status == 206 else "wb"
+            expected = resp.getheader("Content-Length")
+            n = 0
+            with open(out_path, mode) as f:
+                while True:
+                    buf = resp.read(self.chunk)
+                    if not buf:
+                        break
+                    f.write(buf); n += len(buf)
+                    if ticket is not None:
+                        ticket.consume(len(buf))
+            if expected is not None and n != int(expected):
+                # cuerpo truncado: el siguiente intento continuó desde lo ya escrito
+                raise DescargaError(f"respuesta truncada ({n}/{expected} bytes) en {url}")
+            self._local.last = (resp.status, n)
+            return n
+        return self._retrying(url, attempt)
+
+def main():
+    # Uso mínimo: python3 cliente_http.py URL SALIDA
+    if len(sys.argv) != 3:
+        print("Uso: python3 cliente_http.py <url> <salida>", file=sys.stderr)
+        sys.exit(2)
+    n = ClienteHTTP().download(sys.argv[2], sys.argv[1])
+    print(f"Se escribieron {n} bytes en {sys.argv[2]}")
+
+if __name__ == "__main__":
+    main()
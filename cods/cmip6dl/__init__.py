@@ -0,0 +1,22 @@
+# cmip6dl  (API importable del pipeline: descubrir → elegir → descargar, en memoria y en paralelo)
+import os, sys
+'''
+ejemplo (desde cods/):
+python3 -m cmip6dl run --vars pr,tas --periods historical,ssp245 --models ACCESS-CM2 --bbox -90 -30 -60 15 --jobs 8
+
+from cmip6dl import run, parse_dataset_url
+stats, failed = run(["pr"], ["ssp245"], ["ACCESS-CM2"], bbox=(-90, -30, -60, 15))
+'''
+# Los módulos del pipeline (p00/p02/p03, cliente_http, ...) vivieron en cods/, junto al paquete
+_CODS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _CODS not in sys.path:
+    sys.path.insert(0, _CODS)
+
+from .records import ANCHOR, Catalogo, Dataset, parse_catalog_url, parse_dataset_url
+
+def run(variables, periods, models=None, **options):
+    """Corrió el pipeline completo; options fueron las opciones de `cmip6dl run` (bbox=..., jobs=...)."""
+    from .pipeline import run as _run
+    return _run(variables, periods, models, **options)
+
+__all__ = ["ANCHOR", "Catalogo", "Dataset", "parse_catalog_url", "parse_dataset_url", "run"]
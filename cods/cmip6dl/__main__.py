@@ -0,0 +1,31 @@
+# __main__.py  (python3 -m cmip6dl run ...)
+import argparse, sys
+from . import pipeline
+'''
+ejemplo (desde cods/):
+python3 -m cmip6dl run --vars pr,tas --periods historical,ssp245 --models ACCESS-CM2,TaiESM1 --bbox -90 -30 -60 15 --jobs 8
+python3 -m cmip6dl run --vars pr --periods ssp585 --no-download > datasets_pr_ssp585.txt
+'''
+
+def split_list(s):
+    return [x.strip() for x in s.split(",") if x.strip()] if s else []
+
+def main():
+    ap = argparse.ArgumentParser(prog="cmip6dl", description="Pipeline NEX-GDDP-CMIP6 en un solo proceso")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="Descubrió catálogos, eligió datasets y descargó meses en flujo")
+    pipeline.add_run_args(r)
+    args = ap.parse_args()
+
+    try:
+        stats, failed = pipeline.execute(split_list(args.vars), split_list(args.periods),
+                                         split_list(args.models), args)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if stats is not None:
+        print(stats.summary(), flush=True)
+    if failed:
+        raise SystemExit(f"Fallaron {len(failed)} mes(es); se reintentarán en la próxima ejecución.")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# pipeline.py  (descubrir → elegir → descargar en flujo: las descargas empezaron mientras seguía el recorrido)
+import argparse, queue, sys, threading
+from concurrent.futures import ThreadPoolExecutor
+import xml.etree.ElementTree as ET
+from cache_catalogo import CacheCatalogo, DEFAULT_DIR, DEFAULT_TTL
+from estado import Estado
+import p00_make_url as p00
+import p02_catalogo_thredds as p02
+import p03_thredds_ncss as p03
+import regulador
+from . import records
+'''
+Etapas (hilos unidos por colas; cada etapa consumió registros apenas estuvieron):
+    discover: raíz → modelo → periodo → miembro → variable, cada catálogo en cuanto se conoció su padre
+    select:   catalog.xml de cada variable → años del periodo y última versión → records.Dataset
+    download: p03.iter_tasks/run_tasks sobre el flujo de Dataset (sin volver a URLs)
+'''
+FETCH_ERRORS = p00.FETCH_ERRORS
+DONE = None                                   # fin de flujo en las colas
+
+class Pipeline:
+    def __init__(self, variables, periods, models, args, fetch_fn, state=None):
+        self.variables, self.periods = set(variables), set(periods)
+        self.models = set(models or ())
+        self.args, self.fetch_fn, self.state = args, fetch_fn, state
+        self.catalogs = queue.Queue()
+        # cola acotada: si la descarga fue más lenta, el recorrido esperó en vez de acumular memoria
+        self.datasets = queue.Queue(maxsize=10000)
+        self.lock = threading.Lock()
+        self.n_catalogs = self.n_datasets = 0
+
+    # ------------------------------------------------------------ descubrir
+    def _wanted(self, level, name):
+        if level == 1:
+            return not self.models or name in self.models
+        if level == 2:
+            return name in self.periods
+        if level == 4:
+            return name in self.variables
+        return True
+
+    def discover(self, root_xml, jobs):
+        """Recorrió el árbol sin barreras por nivel; los catálogos de variable fueron a self.catalogs."""
+        pending = [0]
+        finished = threading.Event()
+        ex = ThreadPoolExecutor(max_workers=max(1, jobs))
+
+        def submit(url):
+            with self.lock:
+                pending[0] += 1
+            ex.submit(visit, url)
+
+        def visit(url):
+            try:
+                level = len(records.segments(url) or ())
+                for _, ref in p00.catalog_refs(url, self.fetch_fn):
+                    segs = records.segments(ref)
+                    # solo un nivel más abajo y solo lo pedido (--models/--periods/--vars) antes de leerlo
+                    if segs is None or len(segs) != level + 1 or not self._wanted(level + 1, segs[-1]):
+                        continue
+                    if level + 1 == 4:
+                        cat = records.parse_catalog_url(ref.replace("/catalog.xml", "/catalog.html"))
+                        with self.lock:
+                            self.n_catalogs += 1
+                        self.catalogs.put(cat)
+                    else:
+                        submit(ref)
+            except (FETCH_ERRORS + (ET.ParseError,)) as e:
+                print(f"# Aviso: no se leyó {url} ({e})", file=sys.stderr)
+            finally:
+                with self.lock:
+                    pending[0] -= 1
+                    if pending[0] == 0:
+                        finished.set()
+
+        submit(root_xml)
+        finished.wait()
+        ex.shutdown()
+
+    # --------------------------------------------------------------- elegir
+    def select_worker(self):
+        """Eligió los datasets de cada catálogo de la cola; siempre terminó con DONE (si no, stream() esperaba para siempre)."""
+        try:
+            while True:
+                cat = self.catalogs.get()
+                if cat is DONE:
+                    break
+                try:
+                    chosen = self._select(cat)
+                except (FETCH_ERRORS + (ET.ParseError,)) as e:
+                    print(f"# Aviso: no se leyó {cat.url} ({e})", file=sys.stderr)
+                    continue
+                except Exception as e:
+                    # un catálogo raro (o la base de estado) no detuvo el resto del recorrido
+                    print(f"# Error: no se eligieron datasets de {cat.url} ({type(e).__name__}: {e})",
+                          file=sys.stderr, flush=True)
+                    continue
+                for r in chosen:
+                    self.datasets.put(r)
+        finally:
+            self.datasets.put(DONE)
+
+    def _select(self, cat):
+        """Datasets elegidos (años del periodo, última versión) de un catálogo de variable; registrados en el estado."""
+        args = self.args
+        y_min, y_max = p02.period_years(cat.period, args)
+        found = p02.crawl_catalog_xml(cat.url, recursive=not args.no_recursive, fetch_fn=self.fetch_fn)
+        chosen = [r for r in map(records.parse_dataset_url, p02.select_latest(found, y_min, y_max)) if r]
+        if self.state is not None:
+            self.state.record_datasets(cat.url, [(r.url, r.year, r.version) for r in chosen])
+        with self.lock:
+            self.n_datasets += len(chosen)
+        return chosen
+
+    def stream(self, n_workers):
+        """Generó los Dataset a medida que los workers de select los produjeron."""
+        left = n_workers
+        while left:
+            r = self.datasets.get()
+            if r is DONE:
+                left -= 1
+                continue
+            yield r
+
+    # -------------------------------------------------------------- corrida
+    def start(self):
+        """Arrancó discover + select en segundo plano; devolvió el generador de Dataset."""
+        jobs = self.args.catalog_jobs
+
+        def producer():
+            try:
+                self.discover(self.args.root, jobs)
+            finally:
+                for _ in range(jobs):
+                    self.catalogs.put(DONE)
+
+        threading.Thread(target=producer, daemon=True).start()
+        for _ in range(jobs):
+            threading.Thread(target=self.select_worker, daemon=True).start()
+        return self.stream(jobs)
+
+def add_run_args(ap):
+    ap.add_argument("--vars", default="", help="Variables separadas por coma (p.ej. pr,tas,tasmax)")
+    ap.add_argument("--periods", default="", help="Periodos separados por coma (p.ej. historical,ssp245)")
+    ap.add_argument("--models", default="", help="Modelos separados por coma (por defecto todos)")
+    ap.add_argument("--root", default=p00.ROOT_XML, help="catalog.xml raíz de GDDP-CMIP6")
+    ap.add_argument("--catalog-jobs", type=int, default=16, help="Catálogos leídos en paralelo (default: 16)")
+    ap.add_argument("--no-recursive", action="store_true")
+    ap.add_argument("--year-min", type=int, default=1980)
+    ap.add_argument("--year-max", type=int, default=2014)
+    ap.add_argument("--cache-dir", default=DEFAULT_DIR, help=f"Caché de catálogos (default: {DEFAULT_DIR})")
+    ap.add_argument("--ttl", type=float, default=DEFAULT_TTL, help="TTL de la caché en segundos (default: 86400)")
+    ap.add_argument("--no-cache", action="store_true", help="No usar la caché en disco.")
+    ap.add_argument("--no-download", action="store_true", help="Solo listó los datasets elegidos (URL por línea).")
+    p03.add_download_args(ap)
+
+def default_args(**options):
+    """Namespace con los valores por defecto de `cmip6dl run` y las opciones dadas (nombres con _)."""
+    ap = argparse.ArgumentParser()
+    add_run_args(ap)
+    args = ap.parse_args([])
+    for k, v in options.items():
+        if not hasattr(args, k):
+            raise TypeError(f"opción desconocida: {k}")
+        setattr(args, k, v)
+    return args
+
+def execute(variables, periods, models, args):
+    """Corrió el pipeline con un Namespace de add_run_args. Devolvió (stats, fallidos) o (None, []) con --no-download."""
+    if not variables or not periods:
+        raise ValueError("Faltaron --vars y/o --periods.")
+    p03.prepare_download_args(args)
+    cache = CacheCatalogo(args.cache_dir, ttl=args.ttl, enabled=not args.no_cache, timeout=args.timeout,
+                          regulador=regulador.from_args(args, max_per_host=args.catalog_jobs))
+    state = Estado(args.state) if args.state else None
+    fetch_fn = cache.fetch
+    if state is not None:
+        def fetch_fn(url):
+            body = cache.fetch(url)
+            state.record_catalog(url, body)
+            return body
+    pipe = Pipeline(variables, periods, models, args, fetch_fn, state)
+    found = pipe.start()
+    if args.no_download:
+        for r in found:
+            print(r.url, flush=True)
+        result = None, []
+    else:
+        if args.dry_run:
+            p03.print_dry_run(p03.iter_tasks(found, args), args)
+            result = None, []
+        else:
+            # el total se conoció recién al terminar el recorrido: cada Dataset elegido sumó sus meses al plan
+            per_dataset = p03.units_per_dataset(args)
+
+            def planned(found):
+                for r in found:
+                    p03.plan_units(args, per_dataset)
+                    yield r
+            result = p03.run_tasks(p03.iter_tasks(planned(found), args), args, state)
+    print(f"# Catálogos de variable: {pipe.n_catalogs}, datasets elegidos: {pipe.n_datasets}", file=sys.stderr)
+    print(cache.summary(), file=sys.stderr)
+    return result
+
+def run(variables, periods, models=None, **options):
+    return execute(list(variables), list(periods), list(models or ()), default_args(**options))
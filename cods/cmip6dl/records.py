@@ -0,0 +1,53 @@
+# records.py  (registros compactos del pipeline; rutas GDDP-CMIP6 interpretadas desde el ancla, sin índices fijos)
+import os, re
+from collections import namedtuple
+from urllib.parse import urlparse, parse_qs, unquote
+'''
+Uso:
+    cat = parse_catalog_url(".../GDDP-CMIP6/ACCESS-CM2/historical/r1i1p1f1/pr/catalog.html")
+    ds = parse_dataset_url(".../pr/catalog.html?dataset=AMES/NEX/GDDP-CMIP6/.../pr_day_..._1980_v2.0.nc")
+'''
+ANCHOR = "GDDP-CMIP6"
+# <var>_day_<MODELO>_<periodo>_<miembro>_<grilla>_<YYYY>[_vM.m].nc
+DS_FNAME_RE = re.compile(r'^(?P<var>[^_]+)_day_(?P<model>.+?)_(?P<period>historical|ssp\d+)_(?P<member>r\d+i\d+p\d+f\d+)_'
+                         r'(?P<grid>[^_]+)_(?P<year>\d{4})(?:_v(?P<maj>\d+)(?:\.(?P<min>\d+))?)?\.nc$')
+
+# Catálogo de variable: .../GDDP-CMIP6/<MODELO>/<PERIODO>/<MIEMBRO>/<VAR>/catalog.html
+Catalogo = namedtuple("Catalogo", "url model period member variable")
+# Dataset anual elegido (url = catalog.html?dataset=...; path = ruta del dataset; version = (maj, min))
+Dataset = namedtuple("Dataset", "url path model period member variable grid year version")
+
+def segments(path):
+    """Segmentos de la ruta después de GDDP-CMIP6 (sin catalog.xml/.html); None si no estuvo el ancla."""
+    parts = [p for p in path.split("/") if p]
+    try:
+        i = parts.index(ANCHOR)
+    except ValueError:
+        return None
+    out = parts[i + 1:]
+    if out and out[-1] in ("catalog.xml", "catalog.html"):
+        out = out[:-1]
+    return out
+
+def parse_catalog_url(url):
+    """Catalogo de una URL de catálogo de variable; None si la ruta no tuvo los 4 niveles."""
+    segs = segments(urlparse(url.strip()).path)
+    if not segs or len(segs) < 4:
+        return None
+    model, period, member, variable = segs[:4]
+    return Catalogo(url.strip(), model, period, member, variable)
+
+def dataset_path(url):
+    qs = parse_qs(urlparse(url).query)
+    return unquote(qs.get("dataset", [""])[0]).lstrip("/")
+
+def parse_dataset_url(url):
+    """Dataset de una URL catalog.html?dataset=...; None si la ruta o el nombre no siguieron GDDP-CMIP6."""
+    path = dataset_path(url)
+    segs = segments(path)
+    m = DS_FNAME_RE.match(os.path.basename(path))
+    if not segs or len(segs) < 5 or not m:
+        return None
+    model, period, member, variable = segs[:4]
+    version = (int(m.group("maj") or 0), int(m.group("min") or 0))
+    return Dataset(url, path, model, period, member, variable, m.group("grid"), int(m.group("year")), version)
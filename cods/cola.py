@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# cola.py  (cola de trabajo compartida entre procesos/nodos: arriendos con O_EXCL en un directorio común)
+import argparse, fcntl, glob, hashlib, json, os, socket, sys, threading, time
+from contextlib import contextmanager
+'''
+Uso desde p03 (mismo --queue y --base-dir en todos los nodos; el sistema de archivos fue compartido):
+    python3 p03_thredds_ncss.py 'enlaces/pr_*.txt' --queue ../cola --jobs 8 --client native   # nodo 1
+    python3 p03_thredds_ncss.py 'enlaces/pr_*.txt' --queue ../cola --jobs 8 --client native   # nodo 2, ...
+Cada unidad (un mes, o la ventana/celda de --chunk/--points) tuvo un arriendo <cola>/<sha1>.lease creado con
+O_CREAT|O_EXCL: solo un trabajador lo obtuvo. El dueño lo renovó (mtime) cada ttl/3; uno vencido (nodo caído)
+se reclamó. La salida se escribió en un temporal propio y se renombró, así que ni una doble descarga rara
+(dos reclamos simultáneos) dejó un archivo corrupto.
+ejemplo:
+python3 cola.py ../cola            # estado de la cola (activos, vencidos, fallidos)
+python3 cola.py ../cola --purge    # borró arriendos vencidos y fallidos
+'''
+DEFAULT_TTL = 600.0
+HOST = socket.gethostname()
+
+def worker_id():
+    return f"{HOST}.{os.getpid()}"
+
+def partial_path(path, worker=None):
+    """Temporal de este proceso junto a path: dos nodos con el mismo destino nunca escribieron el mismo archivo."""
+    return f"{path}.{worker or worker_id()}.part"
+
+def resume_path(path):
+    """Parcial estable de path (sin host ni pid): otra corrida o intento lo continuó con Range/--continue."""
+    return f"{path}.part"
+
+@contextmanager
+def resumable(path):
+    """Parcial donde escribir path: (ruta, True) el estable si se pudo bloquear, si no (temporal propio, False).
+
+    El candado (flock sobre el mismo parcial) duró lo que el bloque with y lo soltó solo un proceso caído;
+    así dos procesos sin --queue sobre el mismo mes nunca anexaron al mismo archivo.
+    """
+    part = resume_path(path)
+    fd = os.open(part, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # el dueño anterior pudo renombrarlo a path entre open y flock: entonces el candado fue de otro inodo
+            mine = os.fstat(fd).st_ino == os.stat(part).st_ino
+        except (BlockingIOError, FileNotFoundError):
+            mine = False
+        yield (part, True) if mine else (partial_path(path), False)
+    finally:
+        os.close(fd)
+
+class Cola:
+    """Arriendos por unidad en un directorio compartido.
+
+    claim(key) -> True si esta unidad quedó para este proceso; release(key, ok) la liberó (ok) o la dejó
+    marcada como fallida (otro trabajador pudo reclamarla de inmediato; cola.py la mostró).
+    on_reclaim(key, info) se llamó al tomar un arriendo vencido, con los datos del dueño anterior.
+    """
+    def __init__(self, root, ttl=DEFAULT_TTL, worker=None, on_reclaim=None):
+        self.root, self.ttl, self.on_reclaim = root, ttl, on_reclaim
+        self.worker = worker or worker_id()
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.held = set()
+        self.claimed = self.reclaimed = self.busy = 0
+        self.stop = threading.Event()
+        self.heartbeat = threading.Thread(target=self._beat, daemon=True)
+        self.heartbeat.start()
+
+    def path(self, key):
+        return os.path.join(self.root, hashlib.sha1(key.encode("utf-8")).hexdigest()[:24] + ".lease")
+
+    def _create(self, path, key):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump({"key": key, "worker": self.worker, "t": time.time(), "estado": "activo"}, f)
+        with self.lock:
+            self.held.add(path)
+        return True
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # recién creado y aún vacío, o borrado entre medio
+            return {}
+
+    def _stale(self, path):
+        """Arriendo vencido (sin latido en ttl) o marcado como fallido: se pudo reclamar."""
+        try:
+            if time.time() - os.stat(path).st_mtime > self.ttl:
+                return True
+        except FileNotFoundError:
+            return True
+        return self._read(path).get("estado") == "fallido"
+
+    def claim(self, key):
+        path = self.path(key)
+        if self._create(path, key):
+            with self.lock:
+                self.claimed += 1
+            return True
+        if not self._stale(path):
+            with self.lock:
+                self.busy += 1
+            return False
+        # arriendo vencido o fallido: solo el que logró renombrarlo lo reclamó (rename fue atómico)
+        stale = f"{path}.{self.worker}.{threading.get_ident()}.vencido"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return self.claim(key) if not os.path.exists(path) else False
+        if not self._stale(stale):
+            # otro lo reclamó justo antes y este era su arriendo nuevo: se devolvió sin pisar nada
+            try:
+                os.link(stale, path)
+            except FileExistsError:
+                pass
+            os.remove(stale)
+            return False
+        prev = self._read(stale)
+        os.remove(stale)
+        if not self._create(path, key):
+            return False
+        with self.lock:
+            self.claimed += 1; self.reclaimed += 1
+        if self.on_reclaim is not None and prev.get("worker") not in (None, self.worker):
+            self.on_reclaim(key, prev)
+        return True
+
+    def release(self, key, ok=True):
+        path = self.path(key)
+        with self.lock:
+            self.held.discard(path)
+        if self._read(path).get("worker") != self.worker:
+            return                                     # el arriendo venció y lo tomó otro
+        if ok:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        tmp = f"{path}.{self.worker}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"key": key, "worker": self.worker, "t": time.time(), "estado": "fallido"}, f)
+        os.replace(tmp, path)
+
+    def _beat(self):
+        while not self.stop.wait(self.ttl / 3):
+            with self.lock:
+                held = list(self.held)
+            for path in held:
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        self.stop.set()
+        self.heartbeat.join()
+
+    def summary(self):
+        return (f"# Cola {self.root}: {self.claimed} unidades tomadas por {self.worker} "
+                f"({self.reclaimed} reclamadas de arriendos vencidos), {self.busy} en manos de otros")
+
+def iter_claimed(cola, tasks, key, done, poll=5.0):
+    """Generó solo las tareas que este proceso arrendó.
+
+    key(tarea) -> clave estable entre nodos; done(tarea) -> True si ya estaba completa en disco.
+    Tras la primera pasada se volvió sobre las que tenían otros hasta que terminaron, fallaron o su arriendo
+    venció; cada tarea se entregó a lo más una vez por proceso, así que una falla se reintentó en otro nodo.
+    """
+    waiting = []
+    for task in tasks:
+        if done(task):
+            continue
+        if cola.claim(key(task)):
+            yield task
+        else:
+            waiting.append(task)
+    delay = 0.05
+    while waiting:
+        # espera corta al principio: al final de un barrido los otros nodos terminaron en segundos
+        time.sleep(delay)
+        delay = min(delay * 2, poll, cola.ttl / 3)
+        still = []
+        for task in waiting:
+            if done(task):
+                continue
+            if cola.claim(key(task)):
+                yield task
+            else:
+                still.append(task)
+        waiting = still
+
+def status(root, ttl=DEFAULT_TTL):
+    """(activos, vencidos, fallidos) con sus datos."""
+    out = {"activo": [], "vencido": [], "fallido": []}
+    now = time.time()
+    for path in glob.glob(os.path.join(root, "*.lease")):
+        try:
+            age = now - os.stat(path).st_mtime
+            with open(path) as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            continue
+        info["path"], info["edad_s"] = path, round(age)
+        state = "fallido" if info.get("estado") == "fallido" else ("vencido" if age > ttl else "activo")
+        out[state].append(info)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Estado de una cola de p03 --queue (arriendos en un directorio compartido)")
+    ap.add_argument("root", help="Directorio de la cola")
+    ap.add_argument("--ttl", type=float, default=DEFAULT_TTL, help=f"Vencimiento de un arriendo en s (default: {DEFAULT_TTL:g})")
+    ap.add_argument("--purge", action="store_true", help="Borró arriendos vencidos y fallidos (igual se reclamaban solos).")
+    args = ap.parse_args()
+    st = status(args.root, args.ttl)
+    for state, items in st.items():
+        print(f"{state}: {len(items)}")
+        for info in sorted(items, key=lambda i: i["key"])[:20]:
+            print(f"  {info['key']}  {info['worker']}  {info['edad_s']} s")
+    if args.purge:
+        n = 0
+        for info in st["vencido"] + st["fallido"]:
+            try:
+                os.remove(info["path"]); n += 1
+            except FileNotFoundError:
+                pass
+        print(f"Se borraron {n} arriendo(s).", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
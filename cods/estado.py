@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# estado.py  (estado local compartido por p00/p02/p03/sync en SQLite)
+import hashlib, sqlite3, threading, time
+from urllib.parse import urlparse, parse_qs, unquote
+'''
+Uso:
+    st = Estado("estado.sqlite")
+    st.record_catalog(url, body)                 # p00/p02
+    st.record_datasets(catalog_url, registros)   # p02
+    st.record_month(out_path, dataset_url, 1980, 1, "ok", size, sha256)  # p03
+    st.record_verifications([(path, mtime, size, "ok", "")])              # verifica
+'''
+DEFAULT_DB = "estado.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalogos (
+    url TEXT PRIMARY KEY, sha1 TEXT, fetched_at REAL, changed_at REAL
+);
+CREATE TABLE IF NOT EXISTS datasets (
+    url TEXT PRIMARY KEY, catalog TEXT, variable TEXT, modelo TEXT, periodo TEXT,
+    miembro TEXT, year INTEGER, version TEXT, seen_at REAL
+);
+CREATE INDEX IF NOT EXISTS datasets_catalog ON datasets(catalog);
+CREATE TABLE IF NOT EXISTS meses (
+    out_path TEXT PRIMARY KEY, dataset_url TEXT, year INTEGER, month INTEGER,
+    status TEXT, size INTEGER, sha256 TEXT, updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS meses_dataset ON meses(dataset_url);
+CREATE TABLE IF NOT EXISTS verificaciones (
+    path TEXT PRIMARY KEY, mtime REAL, size INTEGER, status TEXT, detail TEXT, checked_at REAL
+);
+"""
+
+def split_dataset_path(url):
+    """Devolvió (variable, modelo, periodo, miembro) desde ?dataset=.../GDDP-CMIP6/<M>/<P>/<R>/<V>/f.nc."""
+    qs = parse_qs(urlparse(url).query)
+    ds = unquote(qs.get("dataset", [""])[0]) or urlparse(url).path
+    parts = ds.strip("/").split("/")
+    try:
+        i = parts.index("GDDP-CMIP6")
+        modelo, periodo, miembro, variable = parts[i + 1:i + 5]
+    except ValueError:
+        return None, None, None, None
+    return variable, modelo, periodo, miembro
+
+def file_sha256(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(chunk), b""):
+            h.update(buf)
+    return h.hexdigest()
+
+class Estado:
+    """Base SQLite segura entre hilos (una conexión + candado; WAL para lectores concurrentes)."""
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.commit(); self.db.close()
+
+    def _write(self, sql, rows, many=False):
+        with self.lock:
+            (self.db.executemany if many else self.db.execute)(sql, rows)
+            self.db.commit()
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    # ------------------------------------------------------------ catálogos
+    def catalog_changed(self, url, body):
+        """Devolvió True si el sha1 de body difiere del guardado (sin registrar nada)."""
+        row = self._query("SELECT sha1 FROM catalogos WHERE url=?", (url,))
+        return not row or row[0][0] != hashlib.sha1(body).hexdigest()
+
+    def record_catalog(self, url, body):
+        """Guardó el sha1 del catálogo; devolvió True si cambió respecto de la última lectura."""
+        sha1 = hashlib.sha1(body).hexdigest()
+        now = time.time()
+        changed = self.catalog_changed(url, body)
+        self._write("INSERT INTO catalogos(url, sha1, fetched_at, changed_at) VALUES (?,?,?,?) "
+                    "ON CONFLICT(url) DO UPDATE SET sha1=excluded.sha1, fetched_at=excluded.fetched_at, "
+                    "changed_at=CASE WHEN catalogos.sha1=excluded.sha1 THEN catalogos.changed_at "
+                    "ELSE excluded.changed_at END",
+                    (url, sha1, now, now))
+        return changed
+
+    # ------------------------------------------------------------- datasets
+    def record_datasets(self, catalog_url, records):
+        """Reemplazó los datasets vigentes de un catálogo. records: [(url, year, (maj, min))]."""
+        now = time.time()
+        rows = []
+        for url, year, version in records:
+            variable, modelo, periodo, miembro = split_dataset_path(url)
+            rows.append((url, catalog_url, variable, modelo, periodo, miembro, year,
+                         f"{version[0]}.{version[1]}", now))
+        with self.lock:
+            self.db.execute("DELETE FROM datasets WHERE catalog=?", (catalog_url,))
+            self.db.executemany("INSERT OR REPLACE INTO datasets VALUES (?,?,?,?,?,?,?,?,?)", rows)
+            self.db.commit()
+
+    def has_datasets(self, catalog_url):
+        return bool(self._query("SELECT 1 FROM datasets WHERE catalog=? LIMIT 1", (catalog_url,)))
+
+    def datasets(self, variables=None, periods=None, models=None):
+        """Devolvió las URLs de datasets vigentes filtradas por variable/periodo/modelo."""
+        sql, params = "SELECT url FROM datasets WHERE 1=1", []
+        for col, vals in (("variable", variables), ("periodo", periods), ("modelo", models)):
+            if vals:
+                sql += f" AND {col} IN ({','.join('?' * len(vals))})"
+                params += list(vals)
+        return [r[0] for r in self._query(sql + " ORDER BY url", params)]
+
+    # ---------------------------------------------------------------- meses
+    def record_month(self, out_path, dataset_url, year, month, status, size=None, sha256=None):
+        self._write("INSERT OR REPLACE INTO meses VALUES (?,?,?,?,?,?,?,?)",
+                    (out_path, dataset_url, year, month, status, size, sha256, time.time()))
+
+    def month_status(self, dataset_urls=None):
+        """Devolvió {out_path: status} (de todos los meses o de los datasets indicados)."""
+        if dataset_urls is None:
+            rows = self._query("SELECT out_path, status FROM meses")
+        else:
+            rows = []
+            urls = list(dataset_urls)
+            for i in range(0, len(urls), 500):
+                part = urls[i:i + 500]
+                rows += self._query(f"SELECT out_path, status FROM meses WHERE dataset_url IN "
+                                    f"({','.join('?' * len(part))})", part)
+        return dict(rows)
+
+    def mark_failed(self, out_path):
+        self._write("UPDATE meses SET status='fallido', updated_at=? WHERE out_path=?",
+                    (time.time(), out_path))
+
+    # ------------------------------------------------------- verificaciones
+    def verifications(self):
+        """Devolvió {path: (mtime, size, status)} del manifiesto de verifica.py."""
+        return {r[0]: r[1:] for r in self._query("SELECT path, mtime, size, status FROM verificaciones")}
+
+    def record_verifications(self, rows):
+        """rows: [(path, mtime, size, status, detalle)]."""
+        now = time.time()
+        self._write("INSERT OR REPLACE INTO verificaciones VALUES (?,?,?,?,?,?)",
+                    [r + (now,) for r in rows], many=True)
+
+    def forget_verifications(self, paths):
+        self._write("DELETE FROM verificaciones WHERE path=?", [(p,) for p in paths], many=True)
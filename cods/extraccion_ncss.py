@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# extraccion_ncss.py  (series por punto y media areal por polígono: lo que p03 guardó en vez de la grilla)
+import csv, glob, io, json, math, os, re
+from collections import namedtuple
+import particion_ncss as part
+from cola import partial_path
+'''
+Usado por p03 (--points / --points-file / --polygon):
+    puntos:   NCSS grid-as-point (latitude/longitude, accept=csv), un pedido por celda y año
+    polígono: caja mínima que lo cubrió → media ponderada por cos(lat) de las celdas con centro dentro
+Fragmentos: <base-dir>/<MODELO>/series/<nombre>/<archivo>.csv; unidos en <base-dir>/<MODELO>/<stem>_<nombre>.csv
+'''
+Punto = namedtuple("Punto", "name lat lon")
+SERIES_DIR = "series"
+FRAG_RE = re.compile(r'^(?P<stem>.+)_(?P<period>\d{4}(?:\d{2})?)(?:_v(?P<ver>\d+(?:\.\d+)?))?\.csv$')
+
+# ----------------------------------------------------------------- puntos
+def _clean_name(name):
+    return re.sub(r"[^\w.-]+", "_", name.strip()) or "punto"
+
+def parse_point(s, i=0):
+    """'lat,lon[,nombre]' -> Punto; sin nombre se llamó p<i>."""
+    parts = [x.strip() for x in s.split(",")]
+    if len(parts) < 2:
+        raise ValueError(f"punto inválido: {s!r} (se esperó lat,lon[,nombre])")
+    lat, lon = float(parts[0]), float(parts[1])
+    if not -90 <= lat <= 90:
+        raise ValueError(f"latitud fuera de rango en {s!r}")
+    lon = (lon + 180) % 360 - 180
+    name = ",".join(parts[2:]) if len(parts) > 2 else f"p{i}"
+    return Punto(_clean_name(name), lat, lon)
+
+def read_points_file(path):
+    """Puntos de un CSV/texto (lat,lon[,nombre] por línea); saltó encabezado, vacías y comentarios."""
+    out = []
+    with open(path, newline="") as f:
+        for row in csv.reader(ln for ln in f if ln.strip() and not ln.lstrip().startswith("#")):
+            try:
+                out.append(parse_point(",".join(row), len(out)))
+            except ValueError:
+                if out:
+                    raise
+                # primera línea no numérica: encabezado
+    return out
+
+def cell_center(x, res=part.GRID_RES):
+    return (math.floor(x / res) + 0.5) * res
+
+def group_by_cell(points, res=part.GRID_RES):
+    """{(lat, lon) del centro de celda: [Punto]}: los puntos de una misma celda compartieron pedido."""
+    cells = {}
+    for p in points:
+        cells.setdefault((cell_center(p.lat, res), cell_center(p.lon, res)), []).append(p)
+    return cells
+
+def point_url(base, var, lat, lon, t0, t1):
+    return (f"{base}?var={var}&latitude={lat}&longitude={lon}"
+            f"&time_start={t0}&time_end={t1}&accept=csv")
+
+def parse_point_csv(text, var):
+    """Filas (tiempo, valor) de la respuesta CSV de NCSS (columna de tiempo primero; la de var por nombre)."""
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+    header = [h.split("[", 1)[0].strip().strip('"') for h in rows[0]]
+    if var not in header:
+        raise ValueError(f"la respuesta CSV no trajo la columna {var} ({', '.join(header)})")
+    j = header.index(var)
+    return [(r[0], r[j]) for r in rows[1:] if len(r) > j]
+
+# --------------------------------------------------------------- polígono
+def _rings(geom):
+    if geom["type"] == "Polygon":
+        return geom["coordinates"]
+    if geom["type"] == "MultiPolygon":
+        return [ring for poly in geom["coordinates"] for ring in poly]
+    raise ValueError(f"geometría no soportada: {geom['type']}")
+
+def read_polygon(spec):
+    """Devolvió (nombre, anillos [[(lon, lat), ...]]) desde GeoJSON, texto 'lon lat' por línea o 'lon,lat;lon,lat;...'.
+
+    Los anillos se combinaron con la regla par-impar: los huecos y los multipolígonos funcionaron igual.
+    """
+    if not os.path.isfile(spec):
+        ring = [tuple(float(v) for v in pair.split(",")) for pair in spec.split(";") if pair.strip()]
+        if len(ring) < 3:
+            raise ValueError(f"--polygon: no existió el archivo ni fue una lista lon,lat;... válida: {spec}")
+        return "poligono", [ring]
+    name = _clean_name(os.path.splitext(os.path.basename(spec))[0])
+    with open(spec) as f:
+        text = f.read()
+    if text.lstrip().startswith("{"):
+        gj = json.loads(text)
+        if gj.get("type") == "FeatureCollection":
+            geoms = [ft["geometry"] for ft in gj["features"]]
+        elif gj.get("type") == "Feature":
+            geoms = [gj["geometry"]]
+        else:
+            geoms = [gj]
+        rings = [ring for g in geoms for ring in _rings(g)]
+    else:
+        rings = [[tuple(float(v) for v in ln.replace(",", " ").split()[:2])
+                  for ln in text.splitlines() if ln.strip() and not ln.lstrip().startswith("#")]]
+    rings = [[(float(x), float(y)) for x, y, *_ in r] for r in rings if len(r) >= 3]
+    if not rings:
+        raise ValueError(f"--polygon: {spec} no tuvo anillos con 3 o más vértices")
+    return name, rings
+
+def polygon_bbox(rings, res=part.GRID_RES):
+    """Caja (W, E, S, N) mínima alineada a los bordes de celda que contuvo todo el polígono."""
+    xs = [x for r in rings for x, _ in r]
+    ys = [y for r in rings for _, y in r]
+    lo = lambda v: math.floor(v / res) * res
+    hi = lambda v: math.ceil(v / res) * res
+    return lo(min(xs)), hi(max(xs)), max(-90.0, lo(min(ys))), min(90.0, hi(max(ys)))
+
+def inside(x, y, rings):
+    """Máscara de puntos (x=lon, y=lat, arreglos) dentro del polígono (par-impar, vectorizado)."""
+    import numpy as np
+    x, y = np.asarray(x, float), np.asarray(y, float)
+    out = np.zeros(x.shape, bool)
+    for ring in rings:
+        for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+            if y0 == y1:
+                continue
+            cross = (y0 > y) != (y1 > y)
+            xi = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+            out ^= cross & (x < xi)
+    return out
+
+def iso_times(values):
+    # cftime ('1980-01-01 12:00:00') y datetime64 ('1980-01-01T12:00:00.000000000') al mismo formato NCSS
+    return [str(t).replace(" ", "T")[:19] + "Z" for t in values]
+
+def area_mean(path, var, rings):
+    """Filas (tiempo, media) de un NetCDF recortado: media ponderada por cos(lat) de las celdas con centro dentro.
+
+    Si el polígono fue más chico que una celda y no contuvo ningún centro, se usó la celda más cercana a su centroide.
+    """
+    import numpy as np
+    import xarray as xr
+    with part.NC_LOCK:
+        with xr.open_dataset(path) as ds:
+            lat, lon = ds["lat"].values, ds["lon"].values
+            LON, LAT = np.meshgrid(np.where(lon > 180, lon - 360, lon), lat)
+            mask = inside(LON, LAT, rings)
+            if not mask.any():
+                cx = np.mean([x for r in rings for x, _ in r])
+                cy = np.mean([y for r in rings for _, y in r])
+                mask.flat[np.argmin((LON - cx) ** 2 + (LAT - cy) ** 2)] = True
+            w = np.cos(np.deg2rad(LAT)) * mask
+            data = ds[var].transpose("time", "lat", "lon").values
+            times = iso_times(ds["time"].values)
+    valid = np.isfinite(data) & (w > 0)
+    den = (valid * w).sum(axis=(1, 2))
+    num = (np.where(valid, data, 0.0) * w).sum(axis=(1, 2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(den > 0, num / den, np.nan)
+    return [(t, f"{v:.7g}") for t, v in zip(times, mean)]
+
+# ---------------------------------------------------------------- salidas
+def fragment_path(nc_path, name):
+    """<MODELO>/series/<nombre>/<archivo sin .nc>.csv junto al NetCDF (anual o mensual) que reemplazó."""
+    d, fname = os.path.split(nc_path)
+    stem = fname[:-3] if fname.endswith(".nc") else fname
+    return os.path.join(d, SERIES_DIR, name, stem + ".csv")
+
+def write_series(out_path, var, rows):
+    """Escribió (tiempo, valor) en out_path vía temporal + rename; devolvió bytes."""
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp = partial_path(out_path)
+    with open(tmp, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["time", var])
+        w.writerows(rows)
+    os.replace(tmp, out_path)
+    return os.path.getsize(out_path)
+
+def series_path(frag):
+    """<MODELO>/<stem>_<nombre>.csv donde se unió un fragmento; None si el nombre no fue de fragmento."""
+    m = FRAG_RE.match(os.path.basename(frag))
+    if not m:
+        return None
+    name_dir = os.path.dirname(frag)
+    model_dir = os.path.dirname(os.path.dirname(name_dir))
+    return os.path.join(model_dir, f"{m.group('stem')}_{os.path.basename(name_dir)}.csv")
+
+def merge_series(base_dir, fragments=None):
+    """Unió los fragmentos de cada <MODELO>/series/<nombre>/ en <MODELO>/<stem>_<nombre>.csv; devolvió las rutas.
+
+    Con fragments (los escritos en esta corrida) solo se rehicieron las series que tocaron; sin él, todas.
+    """
+    if fragments is None:
+        fragments = glob.glob(os.path.join(base_dir, "*", SERIES_DIR, "*", "*.csv"))
+    groups = {}
+    for frag in fragments:
+        out_path = series_path(frag)
+        if out_path:
+            groups.setdefault(out_path, os.path.dirname(frag))
+    for out_path, name_dir in sorted(groups.items()):
+        _merge_group(out_path, name_dir)
+    return sorted(groups)
+
+def _merge_group(out_path, name_dir):
+    # por año (o mes) solo el fragmento de la versión más nueva: _v1.x y _v2.0 del mismo año no se sumaron
+    latest = {}
+    for frag in glob.glob(os.path.join(name_dir, "*.csv")):
+        m = FRAG_RE.match(os.path.basename(frag))
+        if not m or series_path(frag) != out_path:
+            continue
+        ver = tuple(int(x) for x in (m.group("ver") or "0").split("."))
+        if m.group("period") not in latest or ver > latest[m.group("period")][0]:
+            latest[m.group("period")] = (ver, frag)
+    # con --queue cada nodo unió lo mismo al terminar: temporal propio y rename
+    tmp = partial_path(out_path)
+    seen = set()
+    with open(tmp, "w") as out:
+        for i, period in enumerate(sorted(latest)):
+            with open(latest[period][1]) as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                for line in f:
+                    # último resguardo: un paso de tiempo repetido se escribió una sola vez
+                    t = line.split(",", 1)[0]
+                    if t not in seen:
+                        seen.add(t)
+                        out.write(line)
+    os.replace(tmp, out_path)
+
+def summary(paths):
+    if not paths:
+        return "# Series: ninguna"
+    mb = sum(os.path.getsize(p) for p in paths) / 1e6
+    return f"# Series: {len(paths)} archivo(s), {mb:.2f} MB (p.ej. {paths[0]})"
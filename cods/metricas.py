@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# metricas.py  (instrumentación común a p00/p02/p03: eventos JSON-lines, contadores, ETA, Prometheus y archivo de estado)
+import bisect, collections, datetime, json, os, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from calendario import model_of
+'''
+Uso desde p00/p02/p03 (sin ninguna de estas opciones no se creó nada: costo cero):
+    python3 p03_thredds_ncss.py 'enlaces/pr_*.txt' --jobs 8 --progress --events eventos.jsonl \\
+        --stats-file estado_descarga.json --metrics-port 9108
+    curl -s localhost:9108/metrics
+    metr = from_args(args, "p03"); metr.plan(n_meses)
+    metr.request(url, status, segundos, bytes, intento)   # ClienteHTTP, wget
+    metr.unit("ok", nbytes) / metr.unit("omitido") / metr.unit("fallido"); metr.close()
+'''
+DEFAULT_INTERVAL = 10.0
+WINDOW = 300.0                  # segundos del ritmo reciente (tasas y ETA)
+# límites superiores (s) del histograma de latencia (también los buckets de Prometheus)
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+UNIT_STATES = ("ok", "omitido", "fallido")
+
+def fmt_duration(seconds):
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    d, rem = divmod(seconds, 86400)
+    h, rem = divmod(rem, 3600)
+    m, s = divmod(rem, 60)
+    if d:
+        return f"{d}d {h}h"
+    return f"{h}h {m:02d}m" if h else f"{m}m {s:02d}s"
+
+class Metricas:
+    """Contadores de una etapa (peticiones, bytes, reintentos, estados HTTP, unidades) con ritmo reciente y ETA.
+
+    Todo se actualizó bajo un solo lock con operaciones O(1); los eventos se escribieron a un archivo con búfer
+    que el hilo de fondo vació cada interval segundos junto con el archivo de estado y la línea de progreso.
+    """
+    def __init__(self, stage, events=None, stats_file=None, interval=DEFAULT_INTERVAL, port=None,
+                 addr="127.0.0.1", progress=False, unit_name="meses"):
+        self.stage, self.stats_file, self.interval = stage, stats_file, max(0.5, interval)
+        self.progress, self.unit_name = progress, unit_name
+        self.lock = threading.Lock()
+        self.t0, self.started = time.monotonic(), time.time()
+        self.requests = self.bytes = self.retries = self.errors = 0
+        self.seconds = 0.0
+        self.status = collections.Counter()
+        self.hist = [0] * (len(BUCKETS) + 1)
+        self.models = {}                          # modelo -> [peticiones, segundos, bytes]
+        self.units = dict.fromkeys(UNIT_STATES, 0)
+        self.unit_bytes = 0
+        self.planned = 0
+        self.counters = collections.Counter()
+        # (t, peticiones, bytes, unidades ok+fallidas) cada interval: ritmo de los últimos WINDOW s
+        self.ring = collections.deque([(self.t0, 0, 0, 0)], maxlen=int(WINDOW / self.interval) + 1)
+        self.events = open(events, "a", buffering=1 << 16) if events else None
+        self.stop = threading.Event()
+        self.server = None
+        if port is not None:
+            self.server = ThreadingHTTPServer((addr, port), _handler(self))
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.emit("inicio", pid=os.getpid())
+        self.ticker = threading.Thread(target=self._tick, daemon=True)
+        self.ticker.start()
+
+    # ------------------------------------------------------------ registro
+    def emit(self, ev, **fields):
+        if self.events is None:
+            return
+        line = json.dumps({"t": round(time.time(), 3), "etapa": self.stage, "ev": ev, **fields},
+                          separators=(",", ":"), ensure_ascii=False)
+        with self.lock:
+            self.events.write(line + "\n")
+
+    def request(self, url, status, seconds, nbytes=0, attempt=1, error=None):
+        """Un intento HTTP (status None: error de red o wget sin código HTTP)."""
+        model = model_of(url) or "-"
+        with self.lock:
+            self.requests += 1
+            self.bytes += nbytes
+            self.seconds += seconds
+            self.status[status or "red"] += 1
+            if attempt > 1:
+                self.retries += 1
+            if error is not None:
+                self.errors += 1
+            self.hist[bisect.bisect_left(BUCKETS, seconds)] += 1
+            m = self.models.get(model)
+            if m is None:
+                m = self.models[model] = [0, 0.0, 0]
+            m[0] += 1; m[1] += seconds; m[2] += nbytes
+        if self.events is not None:
+            fields = {"url": url, "status": status, "s": round(seconds, 4), "bytes": nbytes, "intento": attempt}
+            if error is not None:
+                fields["error"] = error
+            self.emit("peticion", **fields)
+
+    def plan(self, n):
+        with self.lock:
+            self.planned += n
+
+    def unit(self, state, nbytes=0, n=1):
+        """n unidades (meses en p03, catálogos en p02) terminadas como ok/omitido/fallido."""
+        with self.lock:
+            self.units[state] += n
+            self.unit_bytes += nbytes
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    # ------------------------------------------------------------- lectura
+    def _quantile(self, q):
+        total = sum(self.hist)
+        if not total:
+            return None
+        acc = 0
+        for i, n in enumerate(self.hist):
+            acc += n
+            if acc >= q * total:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+
+    def snapshot(self):
+        """Estado actual como dict (archivo de estado y base de la línea de progreso)."""
+        now = time.monotonic()
+        with self.lock:
+            elapsed = max(now - self.t0, 1e-9)
+            done = self.units["ok"] + self.units["fallido"]
+            processed = done + self.units["omitido"]
+            ref = self.ring[0]
+            dt = max(now - ref[0], 1e-9)
+            rate_req, rate_bytes, rate_units = ((self.requests - ref[1]) / dt, (self.bytes - ref[2]) / dt,
+                                                (done - ref[3]) / dt)
+            remaining = max(0, self.planned - processed) if self.planned else None
+            eta = remaining / rate_units if remaining is not None and rate_units > 0 else None
+            snap = {
+                "etapa": self.stage, "pid": os.getpid(),
+                "inicio": datetime.datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "transcurrido_s": round(elapsed, 1),
+                "peticiones": {"total": self.requests, "reintentos": self.retries, "errores": self.errors,
+                               "por_estado": {str(k): v for k, v in sorted(self.status.items(), key=str)}},
+                "mb": round(self.bytes / 1e6, 3),
+                "reciente": {"ventana_s": round(dt, 1), "pet_s": round(rate_req, 2), "mb_s": round(rate_bytes / 1e6, 3),
+                             f"{self.unit_name}_s": round(rate_units, 3)},
+                "promedio": {"pet_s": round(self.requests / elapsed, 2), "mb_s": round(self.bytes / 1e6 / elapsed, 3)},
+                "latencia_s": {"media": round(self.seconds / self.requests, 4) if self.requests else None,
+                               "p50": self._quantile(0.5), "p95": self._quantile(0.95)},
+                self.unit_name: {"planificados": self.planned or None, **self.units, "restantes": remaining},
+                "eta_s": round(eta) if eta is not None else None,
+                "eta": (datetime.datetime.now() + datetime.timedelta(seconds=eta)).isoformat(timespec="minutes")
+                       if eta is not None else None,
+                # los más lentos primero (segundos medios por petición)
+                "modelos": {k: {"peticiones": n, "s_medio": round(s / n, 3), "mb": round(b / 1e6, 3),
+                                "mb_s": round(b / 1e6 / s, 3) if s else None}
+                            for k, (n, s, b) in sorted(self.models.items(), key=lambda kv: -kv[1][1] / kv[1][0])},
+                "contadores": dict(self.counters),
+            }
+        return snap
+
+    def progress_line(self, snap=None):
+        s = snap or self.snapshot()
+        u = s[self.unit_name]
+        processed = u["ok"] + u["omitido"] + u["fallido"]
+        total = f"/{u['planificados']} ({processed / u['planificados']:.1%})" if u["planificados"] else ""
+        r = s["reciente"]
+        p95 = s["latencia_s"]["p95"]
+        return (f"# Progreso {self.stage}: {processed}{total} {self.unit_name} (fallidos {u['fallido']}), "
+                f"{r[f'{self.unit_name}_s']:.2f} {self.unit_name}/s, {r['pet_s']:.1f} pet/s, {r['mb_s']:.2f} MB/s, "
+                f"p95 ≤{p95 if p95 is not None else '?'} s, reintentos {s['peticiones']['reintentos']}, "
+                f"ETA {fmt_duration(s['eta_s']) if u['planificados'] else '?'}")
+
+    def prometheus(self):
+        """Exposición en formato de texto de Prometheus."""
+        lb = f'etapa="{self.stage}"'
+        with self.lock:
+            out = ["# TYPE dolo_requests_total counter"]
+            out += [f'dolo_requests_total{{{lb},status="{k}"}} {v}' for k, v in sorted(self.status.items(), key=str)]
+            out += ["# TYPE dolo_retries_total counter", f"dolo_retries_total{{{lb}}} {self.retries}",
+                    "# TYPE dolo_bytes_total counter", f"dolo_bytes_total{{{lb}}} {self.bytes}",
+                    "# TYPE dolo_request_seconds histogram"]
+            acc = 0
+            for le, n in zip(BUCKETS + ("+Inf",), self.hist):
+                acc += n
+                out.append(f'dolo_request_seconds_bucket{{{lb},le="{le}"}} {acc}')
+            out += [f"dolo_request_seconds_sum{{{lb}}} {self.seconds:.6f}",
+                    f"dolo_request_seconds_count{{{lb}}} {self.requests}",
+                    "# TYPE dolo_units_total counter"]
+            out += [f'dolo_units_total{{{lb},estado="{k}"}} {v}' for k, v in self.units.items()]
+            out += ["# TYPE dolo_units_planned gauge", f"dolo_units_planned{{{lb}}} {self.planned}",
+                    "# TYPE dolo_model_requests_total counter"]
+            out += [f'dolo_model_requests_total{{{lb},modelo="{k}"}} {n}' for k, (n, _, _) in sorted(self.models.items())]
+            out.append("# TYPE dolo_model_request_seconds_total counter")
+            out += [f'dolo_model_request_seconds_total{{{lb},modelo="{k}"}} {s:.6f}'
+                    for k, (_, s, _) in sorted(self.models.items())]
+            out.append("# TYPE dolo_model_bytes_total counter")
+            out += [f'dolo_model_bytes_total{{{lb},modelo="{k}"}} {b}' for k, (_, _, b) in sorted(self.models.items())]
+        eta = self.snapshot()["eta_s"]
+        if eta is not None:
+            out += ["# TYPE dolo_eta_seconds gauge", f"dolo_eta_seconds{{{lb}}} {eta}"]
+        return "\n".join(out) + "\n"
+
+    # ------------------------------------------------------------ salidas
+    def _tick(self):
+        while not self.stop.wait(self.interval):
+            self._sample()
+            self._flush()
+
+    def _sample(self):
+        with self.lock:
+            self.ring.append((time.monotonic(), self.requests, self.bytes, self.units["ok"] + self.units["fallido"]))
+
+    def _flush(self):
+        snap = self.snapshot()
+        with self.lock:
+            if self.events is not None:
+                self.events.flush()
+        if self.stats_file:
+            tmp = self.stats_file + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(snap, f, indent=1, ensure_ascii=False)
+            os.replace(tmp, self.stats_file)
+        if self.progress:
+            print(self.progress_line(snap), file=sys.stderr, flush=True)
+
+    def close(self):
+        """Detuvo el hilo y el servidor; escribió el estado final y el evento 'fin'."""
+        self.stop.set()
+        self.ticker.join()
+        snap = self.snapshot()
+        self.emit("fin", peticiones=snap["peticiones"], mb=snap["mb"], unidades=snap[self.unit_name],
+                  transcurrido_s=snap["transcurrido_s"])
+        self._flush()
+        if self.events is not None:
+            self.events.close()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+def _handler(metr):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *a):
+            pass
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/metrics":
+                body, ctype = metr.prometheus().encode(), "text/plain; version=0.0.4"
+            elif path == "/stats":
+                body, ctype = json.dumps(metr.snapshot(), ensure_ascii=False).encode(), "application/json"
+            else:
+                self.send_response(404); self.send_header("Content-Length", "0"); self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    return Handler
+
+def add_metricas_args(ap):
+    """Opciones comunes a p00/p02/p03 (y sync/cmip6dl vía p03.add_download_args)."""
+    ap.add_argument("--progress", action="store_true",
+                    help="Línea de progreso periódica en stderr (ritmo reciente, latencia p95, reintentos, ETA)")
+    ap.add_argument("--events", default=None, help="JSON-lines con un evento por petición (latencia, bytes, estado, intento)")
+    ap.add_argument("--stats-file", default=None, help="JSON reescrito cada --stats-interval s con contadores y ETA")
+    ap.add_argument("--stats-interval", type=float, default=DEFAULT_INTERVAL,
+                    help=f"Segundos entre actualizaciones (default: {DEFAULT_INTERVAL:g})")
+    ap.add_argument("--metrics-port", type=int, default=None, help="Puerto HTTP con /metrics (Prometheus) y /stats (JSON)")
+    ap.add_argument("--metrics-addr", default="127.0.0.1", help="Interfaz del puerto de métricas (default: 127.0.0.1)")
+
+def from_args(args, stage, unit_name="meses"):
+    """Metricas si se pidió alguna salida; None si no (los llamadores solo comprobaron `is not None`)."""
+    if not (args.progress or args.events or args.stats_file or args.metrics_port is not None):
+        return None
+    return Metricas(stage, events=args.events, stats_file=args.stats_file, interval=args.stats_interval,
+                    port=args.metrics_port, addr=args.metrics_addr, progress=args.progress, unit_name=unit_name)
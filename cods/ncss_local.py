@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# ncss_local.py  (emulador NCSS sobre un espejo local: mensuales de p03 o almacenes de p04)
+import argparse, os, re, sys, tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+import particion_ncss as part
+'''
+ejemplos:
+python3 ncss_local.py serve --root ../data --port 8081
+python3 ncss_local.py subset --root ../data "https://ds.nccs.nasa.gov/thredds/ncss/grid/AMES/...?var=pr&north=..." -o out.nc
+python3 p03_thredds_ncss.py enlaces/pr_ACCESS-CM2_historical.txt --bbox -80 -70 -20 -10 --source local:../data --base-dir ../data_region
+'''
+NCSS_PREFIX = "/thredds/ncss/grid/"
+HALF_CELL = part.GRID_RES / 2
+GLOBAL_LAT, GLOBAL_LON = (-60.0, 90.0), (0.0, 360.0)   # extensión de la rejilla GDDP
+
+def parse_ncss_url(url):
+    """Devolvió (ruta_dataset, parámetros) de una URL NCSS como las que arma p03."""
+    u = urlparse(url)
+    path = unquote(u.path)
+    i = path.find(NCSS_PREFIX)
+    dataset_path = path[i + len(NCSS_PREFIX):] if i >= 0 else path.lstrip("/")
+    params = {k: v[0] for k, v in parse_qs(u.query).items()}
+    return dataset_path, params
+
+def _time_key(s):
+    # '1980-01-31T12:00:00Z' -> '1980-01-31T12:00:00' (comparable con CFTimeIndex y datetime64)
+    return s.rstrip("Z")
+
+def _stamp(s):
+    # 'YYYY-MM-DDTHH...' -> YYYYMMDDHH entero; válido aunque el día no exista en el calendario (31 en 360_day)
+    return int(s[0:4]) * 1000000 + int(s[5:7]) * 10000 + int(s[8:10]) * 100 + int(s[11:13] or 0)
+
+def time_mask(time, t0, t1):
+    """Máscara booleana t0 <= time <= t1 comparando componentes (cualquier calendario CF)."""
+    t = time.dt
+    stamp = t.year * 1000000 + t.month * 10000 + t.day * 100 + t.hour
+    return ((stamp >= _stamp(t0)) & (stamp <= _stamp(t1))).values
+
+def _has_scipy():
+    try:
+        import scipy.io  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _full_res(coord):
+    """True si la coordenada tuvo el paso nativo GRID_RES (espejo no submuestreado)."""
+    v = coord.values
+    return v.size < 2 or abs(abs(float(v[1] - v[0])) - part.GRID_RES) < 1e-6
+
+def _covers_globe(lat, lon):
+    """True si lat/lon cubrieron la rejilla GDDP completa (-60..90, 0..360)."""
+    eps = 1e-6
+    return (lat.min() - HALF_CELL <= GLOBAL_LAT[0] + eps and lat.max() + HALF_CELL >= GLOBAL_LAT[1] - eps and
+            lon.min() - HALF_CELL <= GLOBAL_LON[0] + eps and lon.max() + HALF_CELL >= GLOBAL_LON[1] - eps)
+
+def _plain_encoding(ds):
+    """Dejó solo la codificación CF (tipo, relleno, empaquetado, unidades): scipy rechazó chunks y compresión HDF5."""
+    keep = ("dtype", "_FillValue", "missing_value", "scale_factor", "add_offset", "units", "calendar")
+    for v in ds.variables.values():
+        v.encoding = {k: v.encoding[k] for k in keep if k in v.encoding}
+
+class LocalMirror:
+    """Respondió consultas NCSS (var, north/south/east/west o latitude/longitude, horizStride, time_start/time_end, accept)
+    desde archivos locales, abriéndolos de forma perezosa y leyendo solo el recorte pedido."""
+    def __init__(self, root):
+        self.root = root
+
+    # ------------------------------------------------------------ búsqueda
+    def _monthly_files(self, dataset_path, t0, t1):
+        from p03_thredds_ncss import make_monthly_fname
+        parts = dataset_path.strip("/").split("/")
+        try:
+            model = parts[parts.index("GDDP-CMIP6") + 1]
+        except (ValueError, IndexError):
+            return None
+        fname = parts[-1]
+        y0, m0 = int(t0[:4]), int(t0[5:7])
+        y1, m1 = int(t1[:4]), int(t1[5:7])
+        files = []
+        for ym in range(y0 * 12 + m0 - 1, y1 * 12 + m1):
+            y, m = divmod(ym, 12)
+            # el dataset anual solo contuvo su año: el nombre mensual se armó con ese año
+            p = os.path.join(self.root, model, make_monthly_fname(fname, y, m + 1))
+            if not os.path.exists(p):
+                return None
+            files.append(p)
+        return files
+
+    def _store(self, dataset_path):
+        parts = dataset_path.strip("/").split("/")
+        m = re.match(r'^(?P<stem>.+)_\d{4}(?:_v\d+(?:\.\d+)?)?\.nc$', parts[-1])
+        try:
+            model = parts[parts.index("GDDP-CMIP6") + 1]
+        except (ValueError, IndexError):
+            return None
+        if not m:
+            return None
+        for ext in ("zarr", "nc"):
+            p = os.path.join(self.root, model, f"{m.group('stem')}.{ext}")
+            if os.path.exists(p):
+                return p
+        return None
+
+    def open(self, dataset_path, params):
+        """Devolvió el xr.Dataset recortado (perezoso) o None si el espejo no cubrió la consulta."""
+        import xarray as xr
+        t0, t1 = _time_key(params["time_start"]), _time_key(params["time_end"])
+        files = self._monthly_files(dataset_path, t0, t1)
+        if files:
+            ds = xr.open_dataset(files[0]) if len(files) == 1 else \
+                xr.open_mfdataset(files, combine="by_coords", data_vars="minimal", coords="minimal")
+        else:
+            store = self._store(dataset_path)
+            if store is None:
+                return None
+            ds = xr.open_zarr(store) if store.endswith(".zarr") else xr.open_dataset(store)
+            if _time_key(str(ds["time"].values[0]))[:10] > t0[:10] or \
+                    _time_key(str(ds["time"].values[-1]))[:10] < t1[:10]:
+                ds.close(); return None
+        sub = self._subset(ds, params, t0, t1)
+        if sub is None:
+            ds.close()
+        return sub
+
+    # ------------------------------------------------------------- recorte
+    def _subset(self, ds, params, t0, t1):
+        var = params.get("var")
+        if var:
+            names = [v for v in var.split(",") if v in ds.data_vars]
+            if not names:
+                return None
+            ds = ds[names]
+        ds = ds.isel(time=time_mask(ds["time"], t0, t1))
+        if ds.sizes.get("time", 0) == 0:
+            return None
+        if not (_full_res(ds["lat"]) and _full_res(ds["lon"])):
+            # espejo ya submuestreado: no reprodujo la rejilla ni el stride que pidió NCSS
+            return None
+        stride = int(params.get("horizStride", 1))
+        if "north" in params:
+            west, east = float(params["west"]), float(params["east"])
+            south, north = float(params["south"]), float(params["north"])
+            lat, lon = ds["lat"].values, ds["lon"].values
+            if lon.max() > 180 and west < 0:
+                # espejo en 0..360 y consulta en -180..180
+                west, east = west % 360, east % 360
+                if west > east:
+                    return None
+            if lat.min() - HALF_CELL > south or lat.max() + HALF_CELL < north or \
+                    lon.min() - HALF_CELL > west or lon.max() + HALF_CELL < east:
+                # la caja pedida salió del espejo: que la descargue la red
+                return None
+            ds = ds.sel(lat=slice(south, north) if lat[0] < lat[-1] else slice(north, south),
+                        lon=slice(west, east))
+            if stride > 1:
+                ds = ds.isel(lat=slice(None, None, stride), lon=slice(None, None, stride))
+        elif "latitude" in params:
+            # grid-as-point: la celda más cercana, si el punto cayó dentro del espejo
+            lat, lon = float(params["latitude"]), float(params["longitude"])
+            lats, lons = ds["lat"].values, ds["lon"].values
+            if lons.max() > 180 and lon < 0:
+                lon %= 360
+            if not (lats.min() - HALF_CELL <= lat <= lats.max() + HALF_CELL and
+                    lons.min() - HALF_CELL <= lon <= lons.max() + HALF_CELL):
+                return None
+            ds = ds.sel(lat=lat, lon=lon, method="nearest")
+        else:
+            # sin caja NCSS devolvió la rejilla global: un espejo regional no la sirvió
+            if not _covers_globe(ds["lat"].values, ds["lon"].values):
+                return None
+            if stride > 1:
+                ds = ds.isel(lat=slice(None, None, stride), lon=slice(None, None, stride))
+        return ds
+
+    @staticmethod
+    def _write_point_csv(ds, path):
+        """CSV con las columnas de NCSS: time, latitude[unit=...], longitude[unit=...], <var>[unit=...]."""
+        from extraccion_ncss import iso_times
+        names = list(ds.data_vars)
+        cols = [ds[n].values for n in names]
+        units = [ds[n].attrs.get("units", "") for n in names]
+        lat, lon = float(ds["lat"]), float(ds["lon"])
+        with open(path, "w") as f:
+            f.write(",".join(['time', 'latitude[unit="degrees_north"]', 'longitude[unit="degrees_east"]'] +
+                             [f'{n}[unit="{u}"]' for n, u in zip(names, units)]) + "\n")
+            for i, t in enumerate(iso_times(ds["time"].values)):
+                f.write(",".join([t, f"{lat}", f"{lon}"] + [f"{c[i]:.7g}" for c in cols]) + "\n")
+
+    # ------------------------------------------------------------ escritura
+    def fetch(self, url, out_path):
+        """Escribió en out_path la respuesta local de la URL NCSS; devolvió False si no hubo cobertura.
+
+        El candado de HDF5 se tomó solo para abrir, recortar y leer el recorte a memoria (y para escribir NetCDF4);
+        el CSV y el NetCDF clásico (scipy, Python puro) se escribieron fuera, en paralelo entre hilos.
+        """
+        dataset_path, params = parse_ncss_url(url)
+        if "time_start" not in params or "time_end" not in params:
+            return False
+        with part.NC_LOCK:
+            ds = self.open(dataset_path, params)
+            if ds is None:
+                return False
+            try:
+                sub = ds.load()
+            finally:
+                ds.close()
+        tmp = out_path + ".local"
+        accept = params.get("accept")
+        if accept == "csv":
+            self._write_point_csv(sub, tmp)
+        elif accept != "netcdf4" and _has_scipy():
+            _plain_encoding(sub)
+            sub.to_netcdf(tmp, format="NETCDF3_64BIT", engine="scipy")
+        else:
+            with part.NC_LOCK:
+                sub.to_netcdf(tmp, format="NETCDF4" if accept == "netcdf4" else "NETCDF3_64BIT")
+        os.replace(tmp, out_path)
+        return True
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if not urlparse(self.path).path.startswith(NCSS_PREFIX):
+            return self._empty(404)
+        fd, tmp = tempfile.mkstemp(suffix=".nc"); os.close(fd)
+        try:
+            if not self.server.mirror.fetch(self.path, tmp):
+                return self._empty(404)
+            self.send_response(200)
+            csv_out = parse_ncss_url(self.path)[1].get("accept") == "csv"
+            self.send_header("Content-Type", "text/csv" if csv_out else "application/x-netcdf")
+            self.send_header("Content-Length", str(os.path.getsize(tmp)))
+            self.end_headers()
+            with open(tmp, "rb") as f:
+                while True:
+                    buf = f.read(1 << 20)
+                    if not buf:
+                        break
+                    self.wfile.write(buf)
+        finally:
+            os.remove(tmp)
+
+    def _empty(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+def main():
+    ap = argparse.ArgumentParser(description="Emulador NCSS sobre archivos locales (mensuales o consolidados)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s1 = sub.add_parser("serve", help="Servidor HTTP con la misma ruta /thredds/ncss/grid/... de THREDDS")
+    s1.add_argument("--root", default="../data")
+    s1.add_argument("--host", default="127.0.0.1")
+    s1.add_argument("--port", type=int, default=8081)
+    s2 = sub.add_parser("subset", help="Resolvió una URL NCSS a un archivo local")
+    s2.add_argument("--root", default="../data")
+    s2.add_argument("url")
+    s2.add_argument("-o", "--output", required=True)
+    args = ap.parse_args()
+
+    mirror = LocalMirror(args.root)
+    if args.cmd == "subset":
+        if not mirror.fetch(args.url, args.output):
+            raise SystemExit("El espejo local no cubrió la consulta (tiempo, caja o variable).")
+        print(f"Se escribió {args.output}")
+        return
+    srv = ThreadingHTTPServer((args.host, args.port), Handler)
+    srv.daemon_threads = True
+    srv.mirror = mirror
+    print(f"Sirviendo {args.root} en http://{args.host}:{args.port}{NCSS_PREFIX}", file=sys.stderr)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,27 @@
 #!/usr/bin/env python3
-import sys, urllib.request, urllib.error
+import argparse, sys, urllib.request, urllib.error
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
 import xml.etree.ElementTree as ET
+from cache_catalogo import CacheCatalogo, DEFAULT_DIR, DEFAULT_TTL
+from cliente_http import DescargaError
+from estado import Estado
+import metricas, regulador
 '''
 ejemplo:
-python3 p01_make_url.py pr historical (ssp126,ssp245...)
+python3 p00_make_url.py pr historical (ssp126,ssp245...)
+python3 p00_make_url.py --vars pr,tas,tasmax --periods historical,ssp126,ssp585 --jobs 16
 '''
 ROOT_XML = "https://ds.nccs.nasa.gov/thredds/catalog/AMES/NEX/GDDP-CMIP6/catalog.xml"
+FETCH_ERRORS = (urllib.error.URLError, DescargaError, OSError)
 
 def fetch(url, timeout=30):
     with urllib.request.urlopen(url, timeout=timeout) as r:
         return r.read()
 
-def catalog_refs(catalog_xml_url):
+def catalog_refs(catalog_xml_url, fetch_fn=fetch):
     """Devolvió lista de (name, abs_url) de <catalogRef> en un catálogo XML."""
-    data = fetch(catalog_xml_url)
+    data = fetch_fn(catalog_xml_url)
     # Manejo de namespaces sin hardcodear prefijos
     root = ET.fromstring(data)
     out=[]
@@ -44,74 +51,127 @@ def filter_refs_by_depth(urls, depth_end):
             res.append((name,u))
     return res
 
-def main():
-    if len(sys.argv)!=3:
-        print("Uso: python3 make_urls_by_var_period_fast.py <variable> <periodo>", file=sys.stderr)
-        print("Ej.:  python3 make_urls_by_var_period_fast.py pr historical", file=sys.stderr)
-        sys.exit(2)
-    var, period = sys.argv[1], sys.argv[2]
-    outname = f"urls_{var}_{period}.txt"
+def fetch_level(parents, fetch_fn, jobs):
+    """Leyó en paralelo los catálogos de un nivel; devolvió [(padre, refs)] omitiendo los que fallaron."""
+    def one(parent):
+        try:
+            return parent, catalog_refs(parent[-1], fetch_fn)
+        except FETCH_ERRORS as e:
+            print(f"# Aviso: no se leyó {parent[-1]} ({e})", file=sys.stderr)
+            return parent, None
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+        return [(p, refs) for p, refs in ex.map(one, parents) if refs is not None]
+
+def crawl(variables, periods, fetch_fn=fetch, jobs=16, root_xml=ROOT_XML):
+    """Recorrió una sola vez raíz → modelo → periodo → miembro → variable.
 
+    Devolvió {(variable, periodo): [url catalog.html]} para todas las combinaciones pedidas.
+    """
+    variables, periods = list(variables), list(periods)
     # Nivel modelos: .../GDDP-CMIP6/<MODELO>/catalog.xml
     model_refs = []
-    for name,u in catalog_refs(ROOT_XML):
+    for name,u in catalog_refs(root_xml, fetch_fn):
         # Filtró catálogos que terminaban en .../<MODEL>/catalog.xml
         if urlparse(u).path.endswith("/catalog.xml"):
             parts = urlparse(u).path.split("/")
             if len(parts)>=2 and parts[-2] != "GDDP-CMIP6":
-                model_refs.append((name,u))
+                model_refs.append((u,))
 
-    urls_out = []
+    # Nivel periodo: .../<MODELO>/<PERIODO>/catalog.xml
+    period_xmls = []
+    for (mxml,), refs in fetch_level(model_refs, fetch_fn, jobs):
+        for pname, purl in refs:
+            for period in periods:
+                if f"/{period}/catalog.xml" in urlparse(purl).path:
+                    period_xmls.append((period, purl))
 
-    for mname, mxml in model_refs:
-        # Nivel periodo: .../<MODELO>/<PERIODO>/catalog.xml
-        try:
-            period_refs = catalog_refs(mxml)
-        except urllib.error.URLError:
-            continue
-        period_xmls = []
-        for pname, purl in period_refs:
-            if f"/{period}/catalog.xml" in urlparse(purl).path:
-                period_xmls.append((pname,purl))
-        if not period_xmls:
-            continue
+    # Nivel miembro: .../<MODELO>/<PERIODO>/<MIEMBRO>/catalog.xml
+    member_xmls = []
+    for (period, pxml), refs in fetch_level(period_xmls, fetch_fn, jobs):
+        for tname, turl in refs:
+            # aceptó cualquier miembro (r*i*p*f*)
+            if urlparse(turl).path.endswith("/catalog.xml") and f"/{period}/" in urlparse(turl).path:
+                # aseguró que fuese un nivel más profundo
+                if urlparse(turl).path.count("/") == urlparse(pxml).path.count("/") + 1:
+                    member_xmls.append((period, turl))
 
-        for pname, pxml in period_xmls:
-            # Nivel miembro: .../<MODELO>/<PERIODO>/<MIEMBRO>/catalog.xml
-            try:
-                member_refs = catalog_refs(pxml)
-            except urllib.error.URLError:
-                continue
-            member_xmls = []
-            for tname, turl in member_refs:
-                # aceptó cualquier miembro (r*i*p*f*)
-                if urlparse(turl).path.endswith("/catalog.xml") and f"/{period}/" in urlparse(turl).path:
-                    # aseguró que fuese un nivel más profundo
-                    if urlparse(turl).path.count("/") == urlparse(pxml).path.count("/") + 1:
-                        member_xmls.append((tname,turl))
-            if not member_xmls:
-                continue
+    # Nivel variable: .../<MODELO>/<PERIODO>/<MIEMBRO>/<VAR>/catalog.xml
+    urls_out = {(v, p): set() for v in variables for p in periods}
+    for (period, memxml), refs in fetch_level(member_xmls, fetch_fn, jobs):
+        for vname, vxml in refs:
+            for var in variables:
+                if f"/{var}/catalog.xml" in urlparse(vxml).path:
+                    urls_out[(var, period)].add(vxml.replace("/catalog.xml","/catalog.html"))
+    return {k: sorted(v) for k, v in urls_out.items()}
 
-            for memname, memxml in member_xmls:
-                # Nivel variable: .../<MODELO>/<PERIODO>/<MIEMBRO>/<VAR>/catalog.xml
-                try:
-                    var_refs = catalog_refs(memxml)
-                except urllib.error.URLError:
-                    continue
-                for vname, vxml in var_refs:
-                    if f"/{var}/catalog.xml" in urlparse(vxml).path:
-                        vhtml = vxml.replace("/catalog.xml","/catalog.html")
-                        urls_out.append(vhtml)
+def split_list(s):
+    return [x.strip() for x in s.split(",") if x.strip()] if s else []
 
-    urls_out = sorted(set(urls_out))
-    if not urls_out:
+def main():
+    ap = argparse.ArgumentParser(
+        description="Generó urls_<variable>_<periodo>.txt recorriendo el catálogo THREDDS una sola vez"
+    )
+    ap.add_argument("variable", nargs="?", help="Variable (forma clásica: p00_make_url.py pr historical)")
+    ap.add_argument("periodo", nargs="?", help="Periodo (historical, ssp126, ...)")
+    ap.add_argument("--vars", default="", help="Variables separadas por coma (p.ej. pr,tas,tasmax)")
+    ap.add_argument("--periods", default="", help="Periodos separados por coma (p.ej. historical,ssp585)")
+    ap.add_argument("--jobs", type=int, default=16, help="Catálogos leídos en paralelo por nivel (default: 16)")
+    ap.add_argument("--cache-dir", default=DEFAULT_DIR, help=f"Caché de catálogos (default: {DEFAULT_DIR})")
+    ap.add_argument("--ttl", type=float, default=DEFAULT_TTL,
+                    help="Segundos durante los que no se revalidó un catálogo (default: 86400)")
+    ap.add_argument("--no-cache", action="store_true", help="No usar la caché en disco.")
+    ap.add_argument("--root", default=ROOT_XML, help="catalog.xml raíz de GDDP-CMIP6")
+    ap.add_argument("--state", default=None, help="Base de estado SQLite donde registrar los catálogos leídos.")
+    regulador.add_regulador_args(ap, max_per_host=False)
+    metricas.add_metricas_args(ap)
+    args = ap.parse_args()
+
+    variables = split_list(args.vars) + ([args.variable] if args.variable else [])
+    periods = split_list(args.periods) + ([args.periodo] if args.periodo else [])
+    if not variables or not periods:
+        print("Uso: python3 p00_make_url.py <variable> <periodo>", file=sys.stderr)
+        print("     python3 p00_make_url.py --vars pr,tas --periods historical,ssp126", file=sys.stderr)
+        sys.exit(2)
+
+    reg = regulador.from_args(args, max_per_host=args.jobs)
+    metr = metricas.from_args(args, "p00", unit_name="catalogos")
+    cache = CacheCatalogo(args.cache_dir, ttl=args.ttl, enabled=not args.no_cache, timeout=30, regulador=reg,
+                          metricas=metr)
+    fetch_fn = cache.fetch
+    if args.state:
+        state = Estado(args.state)
+        def fetch_fn(url):
+            body = cache.fetch(url)
+            state.record_catalog(url, body)
+            return body
+    if metr is not None:
+        read = fetch_fn
+        def fetch_fn(url):
+            body = read(url)
+            metr.unit("ok")
+            return body
+    try:
+        result = crawl(variables, periods, fetch_fn=fetch_fn, jobs=args.jobs, root_xml=args.root)
+    finally:
+        if metr is not None:
+            metr.close()
+    print(cache.summary(), file=sys.stderr)
+    if reg.hosts:
+        print(reg.summary(), file=sys.stderr)
+
+    written = 0
+    for (var, period), urls_out in sorted(result.items()):
+        outname = f"urls_{var}_{period}.txt"
+        if not urls_out:
+            print(f"# Aviso: no se hallaron URLs para {var} {period}.", file=sys.stderr)
+            continue
+        with open(outname,"w") as f:
+            f.write("\n".join(urls_out) + "\n")
+        written += 1
+        print(f"Se escribió {len(urls_out)} URL(s) en {outname}")
+    if not written:
         print("No se hallaron URLs para esa variable y periodo.", file=sys.stderr)
         sys.exit(1)
 
-    with open(outname,"w") as f:
-        f.write("\n".join(urls_out) + "\n")
-    print(f"Se escribió {len(urls_out)} URL(s) en {outname}")
-
 if __name__=="__main__":
     main()
-
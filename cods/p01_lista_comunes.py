@@ -1,55 +1,236 @@
-import os
-
-# Lista de todos los archivos
-archivos = [
-    "urls_pr_historical.txt", "urls_pr_ssp126.txt", "urls_pr_ssp245.txt", "urls_pr_ssp585.txt",
-    "urls_tas_historical.txt", "urls_tas_ssp126.txt", "urls_tas_ssp245.txt", "urls_tas_ssp585.txt"
-]
-
-# Paso 1: Extraer modelos de cada archivo
-modelos_por_archivo = {}
-modelos_totales = set()
-
-for archivo in archivos:
-    modelos = set()
-    with open(archivo, 'r') as f:
-        for linea in f:
-            partes = linea.strip().split('/')
-            # El modelo siempre está en la posición 8 (index 8)
-            modelo = partes[8]
-            modelos.add(modelo)
-            modelos_totales.add(modelo)
-    modelos_por_archivo[archivo] = modelos
-
-# Paso 2: Encontrar modelos comunes (presentes en todos los archivos)
-modelos_comunes = set(modelos_por_archivo[archivos[0]])
-for archivo in archivos[1:]:
-    modelos_comunes &= modelos_por_archivo[archivo]
-print('COMPLETOS\n%s'%list(modelos_comunes))
-# Paso 3: Encontrar modelos incompletos (faltan en al menos un archivo)
-modelos_incompletos = modelos_totales - modelos_comunes
-print('*********\nINCOMPLETOS\n%s'%list(modelos_incompletos))
-''' #comentar o descomentar aqui
-# Paso 4: Imprimir resultados
-print("Modelos presentes en TODOS los archivos:")
-for modelo in sorted(modelos_comunes):
-    print(f"- {modelo}")
-
-print("\nModelos FALTANTES en al menos un archivo:")
-for modelo in sorted(modelos_incompletos):
-    print(f"- {modelo}")
-
-# Paso 5: Identificar exactamente dónde faltan los modelos incompletos
-print("\nDetalle de ausencias:")
-for modelo in sorted(modelos_incompletos):
-    ausencias = []
-    for archivo in archivos:
-        if modelo not in modelos_por_archivo[archivo]:
-            # Extraer variable y escenario del nombre del archivo
-            partes_nombre = os.path.splitext(archivo)[0].split('_')
-            variable = partes_nombre[1]
-            escenario = partes_nombre[2]
-            ausencias.append(f"{variable} ({escenario})")
-    
-    print(f"{modelo} falta en: {', '.join(ausencias)}")
-#'''
+#!/usr/bin/env python3
+# p01_lista_comunes.py  (cubo de disponibilidad modelo × variable × escenario × miembro × año, sin red)
+import argparse, csv, glob, json, os, sys
+from collections import defaultdict
+from cmip6dl.records import parse_dataset_url, parse_catalog_url
+'''
+ejemplo:
+python3 p01_lista_comunes.py                                   # enlaces/: todas las variables y periodos presentes
+python3 p01_lista_comunes.py --vars pr,tas,tasmax --periods historical,ssp245,ssp585 --years 1980-2100
+python3 p01_lista_comunes.py --state estado.sqlite --vars pr,tas --periods ssp585 --csv disponibilidad.csv
+python3 p01_lista_comunes.py --cache-dir .cache_catalogos --vars pr --periods historical --detalle
+'''
+YEAR0 = 1850                 # bit 0 de cada máscara; GDDP-CMIP6 empezó en 1950
+PERIOD_YEARS = {"historical": (1980, 2014)}
+SSP_YEARS = (2015, 2100)
+
+def period_range(period):
+    """Años esperados del periodo (mismos rangos que p02)."""
+    return PERIOD_YEARS.get(period, SSP_YEARS if period.startswith("ssp") else (YEAR0, 2100))
+
+def year_mask(y0, y1):
+    return ((1 << (y1 - y0 + 1)) - 1) << (y0 - YEAR0) if y1 >= y0 else 0
+
+def mask_years(mask):
+    out, y = [], YEAR0
+    while mask:
+        if mask & 1:
+            out.append(y)
+        mask >>= 1; y += 1
+    return out
+
+def compact_years(years):
+    """[1980, 1981, 1982, 1990] -> '1980-1982,1990'."""
+    out, start, prev = [], None, None
+    for y in years:
+        if start is None:
+            start = prev = y
+        elif y == prev + 1:
+            prev = y
+        else:
+            out.append(f"{start}-{prev}" if prev > start else str(start)); start = prev = y
+    if start is not None:
+        out.append(f"{start}-{prev}" if prev > start else str(start))
+    return ",".join(out)
+
+class Disponibilidad:
+    """Cubo de disponibilidad: {(modelo, variable, periodo, miembro): máscara de años (int)}.
+
+    Cada año fue un bit; cruzar variables/escenarios/años se redujo a AND/OR de enteros.
+    """
+    def __init__(self):
+        self.cube = defaultdict(int)
+
+    def add(self, model, variable, period, member, year):
+        self.cube[(model, variable, period, member)] |= 1 << (year - YEAR0)
+
+    def add_dataset(self, rec):
+        if rec is not None:
+            self.add(rec.model, rec.variable, rec.period, rec.member, rec.year)
+
+    # ------------------------------------------------------------- fuentes
+    @classmethod
+    def from_enlaces(cls, enlaces_dir="enlaces", cube=None):
+        """Leyó enlaces/<var>_<modelo>_<periodo>.txt (salida de p02)."""
+        cube = cube or cls()
+        for path in sorted(glob.glob(os.path.join(enlaces_dir, "*.txt"))):
+            with open(path) as f:
+                for line in f:
+                    if line.strip() and not line.lstrip().startswith("#"):
+                        cube.add_dataset(parse_dataset_url(line.strip()))
+        return cube
+
+    @classmethod
+    def from_state(cls, db_path, cube=None):
+        """Leyó la tabla datasets de estado.sqlite (p02 --state, sync.py, cmip6dl --state)."""
+        import sqlite3
+        cube = cube or cls()
+        with sqlite3.connect(db_path) as db:
+            for model, variable, period, member, year in db.execute(
+                    "SELECT modelo, variable, periodo, miembro, year FROM datasets WHERE year IS NOT NULL"):
+                if model and variable and period and member:
+                    cube.add(model, variable, period, member, int(year))
+        return cube
+
+    @classmethod
+    def from_cache(cls, cache_dir, cube=None):
+        """Leyó los catalog.xml de variable guardados por CacheCatalogo (sin red; lo no guardado se omitió)."""
+        import p02_catalogo_thredds as p02
+        cube = cube or cls()
+        bodies = {}
+        for meta_p in glob.glob(os.path.join(cache_dir, "*", "*.json")):
+            try:
+                with open(meta_p) as f:
+                    bodies[json.load(f)["url"]] = meta_p[:-len(".json")] + ".body"
+            except (OSError, ValueError, KeyError):
+                continue
+
+        def cached(url):
+            if url not in bodies:
+                raise OSError(f"no está en la caché: {url}")
+            with open(bodies[url], "rb") as f:
+                return f.read()
+
+        for url in sorted(bodies):
+            cat = parse_catalog_url(url)
+            if cat is None or not url.endswith("/catalog.xml"):
+                continue
+            for _, ds_url in p02.crawl_catalog_xml(url, recursive=True, fetch_fn=cached):
+                cube.add_dataset(parse_dataset_url(ds_url))
+        return cube
+
+    # ------------------------------------------------------------ consultas
+    def models(self):
+        return sorted({k[0] for k in self.cube})
+
+    def variables(self):
+        return sorted({k[1] for k in self.cube})
+
+    def periods(self):
+        return sorted({k[2] for k in self.cube})
+
+    def required(self, period, years=None):
+        """Máscara de años exigidos para un periodo (intersección con --years).
+
+        Lanzó ValueError si la intersección quedó vacía: ningún modelo pudo cumplir ese periodo.
+        """
+        p0, p1 = y0, y1 = period_range(period)
+        if years:
+            y0, y1 = max(y0, years[0]), min(y1, years[1])
+        if y1 < y0:
+            raise ValueError(f"--years {years[0]}-{years[1]} no se solapó con {period} ({p0}-{p1})")
+        return year_mask(y0, y1)
+
+    def members(self, model):
+        return sorted({k[3] for k in self.cube if k[0] == model})
+
+    def missing(self, model, member, variables, periods, years=None):
+        """{(variable, periodo): máscara de años faltantes} de un modelo y miembro."""
+        out = {}
+        for v in variables:
+            for p in periods:
+                need = self.required(p, years)
+                key = (model, v, p, member)
+                # sin la clave en el cubo faltó todo el periodo, aunque la exigencia fuera mínima
+                lack = need & ~self.cube[key] if key in self.cube else need
+                if lack:
+                    out[(v, p)] = lack
+        return out
+
+    def complete_models(self, variables, periods, years=None, member=None):
+        """{modelo: miembro} de los modelos con todas las variables × periodos × años en un mismo miembro."""
+        out = {}
+        for model in self.models():
+            for mem in ([member] if member else self.members(model)):
+                if not self.missing(model, mem, variables, periods, years):
+                    out[model] = mem
+                    break
+        return out
+
+    def rows(self, variables=None, periods=None, years=None):
+        """Filas del cubo para CSV: modelo, variable, periodo, miembro, años, primero, último, faltantes, completo."""
+        for (model, v, p, mem), mask in sorted(self.cube.items()):
+            if (variables and v not in variables) or (periods and p not in periods):
+                continue
+            need = self.required(p, years)
+            have = mask_years(mask & need)
+            lack = mask_years(need & ~mask)
+            yield (model, v, p, mem, len(have), have[0] if have else "", have[-1] if have else "",
+                   compact_years(lack), int(not lack))
+
+def parse_years(s):
+    if not s:
+        return None
+    a, _, b = s.partition("-")
+    return int(a), int(b or a)
+
+def split_list(s):
+    return [x.strip() for x in s.split(",") if x.strip()] if s else []
+
+def main():
+    ap = argparse.ArgumentParser(description="Modelos completos por variable/escenario/años desde enlaces/, estado o caché (sin red)")
+    ap.add_argument("--enlaces", default="enlaces", help="Carpeta de p02 (default: enlaces)")
+    ap.add_argument("--state", default=None, help="estado.sqlite (tabla datasets) en lugar de enlaces/")
+    ap.add_argument("--cache-dir", default=None, help="Caché de catálogos (.cache_catalogos) en lugar de enlaces/")
+    ap.add_argument("--vars", default="", help="Variables separadas por coma (default: todas las presentes)")
+    ap.add_argument("--periods", default="", help="Periodos separados por coma (default: todos los presentes)")
+    ap.add_argument("--years", default="", help="Rango de años, p.ej. 1980-2100 (default: rango completo de cada periodo)")
+    ap.add_argument("--member", default=None, help="Miembro fijo (default: cualquiera, pero el mismo en todo)")
+    ap.add_argument("--csv", default=None, help="Exportó el cubo filtrado a CSV")
+    ap.add_argument("--detalle", action="store_true", help="Imprimió qué faltó a cada modelo incompleto")
+    args = ap.parse_args()
+
+    cube = Disponibilidad()
+    if args.state:
+        Disponibilidad.from_state(args.state, cube)
+    if args.cache_dir:
+        Disponibilidad.from_cache(args.cache_dir, cube)
+    if not args.state and not args.cache_dir:
+        Disponibilidad.from_enlaces(args.enlaces, cube)
+    if not cube.cube:
+        raise SystemExit("No hubo datasets en la fuente indicada.")
+
+    variables = split_list(args.vars) or cube.variables()
+    periods = split_list(args.periods) or cube.periods()
+    years = parse_years(args.years)
+    try:
+        for p in periods:
+            cube.required(p, years)
+    except ValueError as e:
+        raise SystemExit(f"Periodo imposible de cumplir: {e}")
+    completos = cube.complete_models(variables, periods, years, args.member)
+    incompletos = [m for m in cube.models() if m not in completos]
+    print(f"# {', '.join(variables)} × {', '.join(periods)}"
+          + (f" × {years[0]}-{years[1]}" if years else ""), file=sys.stderr)
+    print('COMPLETOS\n%s' % sorted(completos))
+    print('*********\nINCOMPLETOS\n%s' % incompletos)
+
+    if args.detalle:
+        print("\nDetalle de ausencias:")
+        for model in incompletos:
+            # se informó el miembro al que le faltó menos
+            best = min(((mem, cube.missing(model, mem, variables, periods, years))
+                        for mem in ([args.member] if args.member else cube.members(model))),
+                       key=lambda x: sum(bin(m).count("1") for m in x[1].values()))
+            faltas = [f"{v} ({p}: {compact_years(mask_years(mask))})" for (v, p), mask in sorted(best[1].items())]
+            print(f"{model} [{best[0]}] falta en: {'; '.join(faltas)}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["modelo", "variable", "periodo", "miembro", "anios", "primero", "ultimo", "faltantes", "completo"])
+            w.writerows(cube.rows(variables, periods, years))
+        print(f"Se escribió {args.csv}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
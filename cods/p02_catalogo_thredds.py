@@ -1,13 +1,25 @@
 #!/usr/bin/env python3
 # test_p02.py  (actualizado)
 import argparse, sys, os, urllib.request, urllib.error, re
+from io import BytesIO
 from urllib.parse import urlparse, parse_qs, unquote, urljoin
 from html.parser import HTMLParser
-from collections import defaultdict, deque
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import xml.etree.ElementTree as ET
+from cache_catalogo import CacheCatalogo, DEFAULT_DIR, DEFAULT_TTL
+from cliente_http import DescargaError
+from estado import Estado
+import metricas, regulador
+from cmip6dl.records import parse_catalog_url
 '''#
 ejemplo:
 python3 p02_catalogo_thredds.py urls_tas_ssp126.txt
+python3 p02_catalogo_thredds.py urls_tas_ssp126.txt --jobs 8
 #'''
+FETCH_ERRORS = (urllib.error.URLError, DescargaError, OSError)
+# ..._YYYY.nc   o ..._YYYY_vM.m.nc
+DS_RE = re.compile(r'^(?P<base>.*_)(?P<year>\d{4})(?:_v(?P<maj>\d+)\.(?P<min>\d+))?\.nc$')
 class LinkGrab(HTMLParser):
     def __init__(self):
         super().__init__()
@@ -46,7 +58,8 @@ def extract_year_and_version(url):
     version = (int(m.group(2) or 0), int(m.group(3) or 0))
     return year, version
 
-def crawl_catalog(start_url, recursive=True, timeout=60):
+def crawl_catalog(start_url, recursive=True, timeout=60, fetch_fn=None):
+    """Crawler HTML (respaldo): BFS sobre catalog.html y sus subcatálogos."""
     start_p = urlparse(start_url)
     q = deque([start_url])
     seen = set([start_url])
@@ -54,8 +67,8 @@ def crawl_catalog(start_url, recursive=True, timeout=60):
     while q:
         cur = q.popleft()
         try:
-            html = fetch(cur, timeout=timeout)
-        except urllib.error.URLError as e:
+            html = fetch_fn(cur) if fetch_fn else fetch(cur, timeout=timeout)
+        except FETCH_ERRORS as e:
             print(f"# Aviso: no se leyó {cur} ({e})", file=sys.stderr)
             continue
         p = LinkGrab(); p.feed(html)
@@ -69,17 +82,137 @@ def crawl_catalog(start_url, recursive=True, timeout=60):
                 seen.add(absu); q.append(absu)
     return sorted(out)
 
+def catalog_xml_url(catalog_url):
+    """Pasó de .../catalog.html a .../catalog.xml (sin query)."""
+    p = urlparse(catalog_url)
+    path = re.sub(r'catalog\.html$', 'catalog.xml', p.path)
+    return p._replace(path=path, query="", fragment="").geturl()
+
+def crawl_catalog_xml(start_url, recursive=True, fetch_fn=None):
+    """Ruta rápida: leyó los <dataset> de catalog.xml con iterparse (sin HTML).
+
+    Devolvió [(ruta_dataset, url_catalogo_html?dataset=...)] con el mismo formato que
+    el crawler HTML. Lanzó la excepción de red si el catálogo raíz no se pudo leer.
+    """
+    fetch_fn = fetch_fn or (lambda u: fetch(u).encode("utf-8"))
+    start_p = urlparse(start_url)
+    q = deque([catalog_xml_url(start_url)])
+    seen = set(q)
+    out = {}
+    first = True
+    while q:
+        cur = q.popleft()
+        try:
+            data = fetch_fn(cur)
+        except FETCH_ERRORS as e:
+            if first:
+                raise
+            print(f"# Aviso: no se leyó {cur} ({e})", file=sys.stderr)
+            continue
+        first = False
+        html_url = cur[:-len("catalog.xml")] + "catalog.html"
+        for _, elem in ET.iterparse(BytesIO(data), events=("end",)):
+            tag = elem.tag.rsplit("}", 1)[-1]
+            if tag == "dataset":
+                ds = elem.attrib.get("urlPath") or elem.attrib.get("ID")
+                if ds and ds.endswith(".nc") and ds not in out:
+                    out[ds] = f"{html_url}?dataset={ds}"
+                elem.clear()
+            elif tag == "catalogRef" and recursive:
+                href = next((v for k, v in elem.attrib.items() if k.endswith("href")), None)
+                if href:
+                    sub = urljoin(cur, href)
+                    if urlparse(sub).netloc == start_p.netloc and sub not in seen:
+                        seen.add(sub); q.append(sub)
+                elem.clear()
+    return sorted(out.items())
+
+def dataset_name(url):
+    qs = parse_qs(urlparse(url).query)
+    return unquote(qs.get("dataset", [""])[0])
+
+def select_latest(datasets, y_min, y_max):
+    """Filtró años y eligió la última versión por (año, nombre base) en una sola pasada.
+
+    datasets: iterable de (ruta_dataset, url). Devolvió las URLs elegidas ordenadas.
+    """
+    best = {}
+    for ds_name, url in datasets:
+        m = DS_RE.match(os.path.basename(ds_name))
+        if not m:
+            continue
+        year = int(m.group("year"))
+        if not (y_min <= year <= y_max):
+            continue
+        version = (int(m.group("maj") or 0), int(m.group("min") or 0))
+        key = (year, os.path.dirname(ds_name), m.group("base"))
+        cur = best.get(key)
+        if cur is None or version > cur[0]:
+            best[key] = (version, url)
+    return sorted(u for _, u in best.values())
+
 def extract_metadata_from_url(url):
-    """Extrajo variable, modelo y periodo desde la ruta estándar GDDP-CMIP6."""
-    parts = url.strip().split('/')
-    try:
-        modelo  = parts[8]
-        periodo = parts[9]
-        variable = parts[11]
-        return variable, modelo, periodo
-    except IndexError:
+    """Extrajo variable, modelo y periodo desde la ruta estándar GDDP-CMIP6 (anclada en el segmento GDDP-CMIP6)."""
+    cat = parse_catalog_url(url)
+    if cat is None:
         print(f"Error: URL con formato inesperado - {url}", file=sys.stderr)
         return None, None, None
+    return cat.variable, cat.model, cat.period
+
+def period_years(periodo, args):
+    per_low = periodo.lower()
+    # Reglas pedidas:
+    if per_low.startswith("ssp"):
+        return 2015, 2100
+    if per_low == "historical":
+        return 1980, 2014
+    return args.year_min, args.year_max  # respaldo
+
+def process_catalog(url, args, fetch_fn, output_dir, state=None):
+    """Listó, filtró y escribió enlaces/<var>_<modelo>_<periodo>.txt de un catálogo.
+
+    Devolvió (mensaje, enlaces); enlaces vacío si no hubo datasets en el rango.
+    Con state, registró los datasets (año y versión) elegidos y, después, el sha1 del
+    catalog.xml leído (no en la ruta HTML: sin catalog.xml el catálogo se reprocesó la próxima vez).
+    """
+    variable, modelo, periodo = extract_metadata_from_url(url)
+    if not all([variable, modelo, periodo]):
+        return None, []
+    y_min, y_max = period_years(periodo, args)
+    output_file = os.path.join(output_dir, f"{variable}_{modelo}_{periodo}.txt")
+
+    xml_url = catalog_xml_url(url)
+    xml_body = []
+
+    def fetch_xml(u):
+        data = fetch_fn(u)
+        if u == xml_url:
+            xml_body.append(data)
+        return data
+
+    datasets = None
+    if not args.html:
+        try:
+            datasets = crawl_catalog_xml(url, recursive=not args.no_recursive, fetch_fn=fetch_xml)
+        except (FETCH_ERRORS + (ET.ParseError,)) as e:
+            print(f"# Aviso: catalog.xml no disponible para {url} ({e}); se usó HTML.", file=sys.stderr)
+            xml_body.clear()
+    if datasets is None:
+        nc_urls = crawl_catalog(url, recursive=not args.no_recursive, timeout=args.timeout,
+                                fetch_fn=lambda u: fetch_fn(u).decode("utf-8", "replace"))
+        datasets = ((dataset_name(u), u) for u in nc_urls)
+
+    filtered_urls = select_latest(datasets, y_min, y_max)
+    if state is not None:
+        state.record_datasets(url, [(u,) + extract_year_and_version(u) for u in filtered_urls])
+        if xml_body:
+            state.record_catalog(xml_url, xml_body[0])
+    if not filtered_urls:
+        return f"# Aviso: sin datasets {y_min}-{y_max} para {modelo}/{periodo}/{variable}", []
+
+    with open(output_file, 'w') as f_out:
+        f_out.write("\n".join(filtered_urls) + "\n")
+    return f"Se escribió {len(filtered_urls)} enlaces en {output_file}", filtered_urls
 
 def main():
     ap = argparse.ArgumentParser(
@@ -91,6 +224,14 @@ def main():
     # Rango “fallback” si no es historical ni ssp*
     ap.add_argument("--year-min", type=int, default=1980)
     ap.add_argument("--year-max", type=int, default=2014)
+    ap.add_argument("--jobs", type=int, default=8, help="Catálogos procesados en paralelo (default: 8)")
+    ap.add_argument("--html", action="store_true", help="Forzó el crawler HTML (sin catalog.xml).")
+    ap.add_argument("--cache-dir", default=DEFAULT_DIR, help=f"Caché de catálogos (default: {DEFAULT_DIR})")
+    ap.add_argument("--ttl", type=float, default=DEFAULT_TTL, help="TTL de la caché en segundos (default: 86400)")
+    ap.add_argument("--no-cache", action="store_true", help="No usar la caché en disco.")
+    ap.add_argument("--state", default=None, help="Base de estado SQLite donde registrar catálogos y datasets.")
+    regulador.add_regulador_args(ap, max_per_host=False)
+    metricas.add_metricas_args(ap)
     args = ap.parse_args()
 
     output_dir = "enlaces"
@@ -99,60 +240,40 @@ def main():
     with open(args.input_file, 'r') as f:
         urls = [line.strip() for line in f if line.strip()]
 
+    reg = regulador.from_args(args, max_per_host=args.jobs)
+    metr = metricas.from_args(args, "p02", unit_name="catalogos")
+    if metr is not None:
+        metr.plan(len(urls))
+    cache = CacheCatalogo(args.cache_dir, ttl=args.ttl, enabled=not args.no_cache, timeout=args.timeout,
+                          regulador=reg, metricas=metr)
+    state = Estado(args.state) if args.state else None
     total_urls = 0
 
-    for url in urls:
-        variable, modelo, periodo = extract_metadata_from_url(url)
-        if not all([variable, modelo, periodo]):
-            continue
-
-        per_low = periodo.lower()
-        # Reglas pedidas:
-        if per_low.startswith("ssp"):
-            y_min, y_max = 2015, 2100
-        elif per_low == "historical":
-            y_min, y_max = 1980, 2014
-        else:
-            y_min, y_max = args.year_min, args.year_max  # respaldo
-
-        output_file = os.path.join(output_dir, f"{variable}_{modelo}_{periodo}.txt")
-
+    def work(url):
         try:
-            nc_urls = crawl_catalog(url, recursive=not args.no_recursive, timeout=args.timeout)
-
-            grouped_files = defaultdict(list)
-            for u in nc_urls:
-                year, version = extract_year_and_version(u)
-                if year is None:
-                    continue
-                if y_min <= year <= y_max:
-                    parsed = urlparse(u)
-                    qs = parse_qs(parsed.query)
-                    ds_name = unquote(qs.get("dataset", [""])[0])
-                    base_name = re.sub(r'_v\d+\.\d+\.nc$', '.nc', ds_name)
-                    grouped_files[(year, base_name)].append((version, u))
-
-            filtered_urls = []
-            for (year, base_name), versions in grouped_files.items():
-                versions.sort(key=lambda x: x[0], reverse=True)
-                filtered_urls.append(versions[0][1])
-
-            if not filtered_urls:
-                print(f"# Aviso: sin datasets {y_min}-{y_max} para {modelo}/{periodo}/{variable}")
-                continue
-
-            with open(output_file, 'w') as f_out:
-                f_out.write("\n".join(sorted(filtered_urls)) + "\n")
-
-            total_urls += len(filtered_urls)
-            print(f"Se escribió {len(filtered_urls)} enlaces en {output_file}")
-
+            return process_catalog(url, args, cache.fetch, output_dir, state)
         except Exception as e:
             print(f"Error procesando {url}: {e}", file=sys.stderr)
+            return None, []
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as ex:
+            for msg, links in ex.map(work, urls):
+                if msg:
+                    print(msg, flush=True)
+                total_urls += len(links)
+                if metr is not None:
+                    # catálogo sin mensaje: error de formato o de red
+                    metr.unit("ok" if msg else "fallido")
+    finally:
+        if metr is not None:
+            metr.close()
 
+    print(cache.summary(), file=sys.stderr)
+    if reg.hosts:
+        print(reg.summary(), file=sys.stderr)
     print(f"\nProceso completado. Total de enlaces guardados: {total_urls}")
     print(f"Carpeta de salida: {output_dir}")
 
 if __name__ == "__main__":
     main()
-
@@ -1,6 +1,21 @@
 #!/usr/bin/env python3
 # p03_thredds_ncss.py  (mensual + calendario + reintento 400)
-import argparse, os, re, shlex, subprocess, calendar as calmod
+import argparse, glob, os, re, shlex, subprocess, sys, threading, time, calendar as calmod
+from collections import namedtuple
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cliente_http import ClienteHTTP, DescargaError, RETRY_STATUS
+from estado import Estado, file_sha256
+import particion_ncss as part
+import extraccion_ncss as extr
+import calendario
+from ncss_local import LocalMirror
+import verifica
+import regulador
+import metricas
+import cola
+import recomprime
+from cmip6dl.records import Dataset
 from urllib.parse import urlparse, parse_qs, unquote
 
 def infer_var(dataset_path, forced_var=None):
@@ -40,8 +55,23 @@ def build_ncss_base_and_fname(catalog_url, var=None):
     dataset_path = unquote(qs["dataset"][0]).lstrip("/")
     fname = os.path.basename(dataset_path) or "out.nc"
     var = infer_var(dataset_path, forced_var=var)
-    base = f"https://{u.netloc}/thredds/ncss/grid/{dataset_path}"
-    return base, var, fname
+    return ncss_base(u, dataset_path), var, fname
+
+def ncss_base(u, dataset_path):
+    # conservó el esquema del catálogo (http en servidores locales de prueba); https por defecto
+    return f"{u.scheme or 'https'}://{u.netloc}/thredds/ncss/grid/{dataset_path}"
+
+def dataset_fields(item, args):
+    """(url, base, var, fname, año, modelo) de una URL de enlaces/ o de un records.Dataset de cmip6dl.
+
+    Un Dataset ya traía la ruta interpretada: no se volvió a partir la URL.
+    """
+    if isinstance(item, Dataset):
+        base = ncss_base(urlparse(item.url), item.path)
+        return item.url, base, args.var or item.variable, os.path.basename(item.path), item.year, item.model
+    base, var, fname = build_ncss_base_and_fname(item, var=args.var)
+    year, _ = parse_fname_year_version(fname)
+    return item, base, var, fname, year, extract_model_from_catalog_url(item)
 
 def month_last_day(year: int, month: int, cal: str) -> int:
     cal = cal.lower()
@@ -55,12 +85,23 @@ def month_last_day(year: int, month: int, cal: str) -> int:
     # gregoriano
     return calmod.monthrange(year, month)[1]
 
+def time_stamp(year, month, day, hour):
+    return f"{year:04d}-{month:02d}-{day:02d}T{hour:02d}:00:00Z"
+
 def monthly_bounds(year: int, month: int, hour: int, calname: str):
     last = month_last_day(year, month, calname)
     start = f"{year:04d}-{month:02d}-01T{hour:02d}:00:00Z"
     end   = f"{year:04d}-{month:02d}-{last:02d}T{hour:02d}:00:00Z"
     return start, end, last
 
+WGET_HTTP_ERROR = re.compile(r"ERROR (\d{3})")
+
+class WgetError(subprocess.CalledProcessError):
+    """wget salió con error; status fue el último código HTTP que informó (None: red caída o timeout)."""
+    def __init__(self, returncode, cmd, status=None):
+        super().__init__(returncode, cmd)
+        self.status = status
+
 def run_wget(out_path: str, url: str, tries=5, timeout=60, waitretry=10):
     cmd = [
         "wget","--continue", f"--tries={tries}",
@@ -68,106 +109,663 @@ def run_wget(out_path: str, url: str, tries=5, timeout=60, waitretry=10):
         "--retry-connrefused", "-O", out_path, url
     ]
     print(" ".join(shlex.quote(c) for c in cmd), flush=True)
-    subprocess.run(cmd, check=True)
+    # la salida de wget pasó tal cual a stderr; de ella se tomó el código HTTP del error (LC_ALL=C: sin traducir)
+    status = None
+    with subprocess.Popen(cmd, stderr=subprocess.PIPE, text=True, errors="replace",
+                          env=dict(os.environ, LC_ALL="C")) as proc:
+        for line in proc.stderr:
+            sys.stderr.write(line)
+            m = WGET_HTTP_ERROR.search(line)
+            if m:
+                status = int(m.group(1))
+    if proc.returncode:
+        raise WgetError(proc.returncode, cmd, status)
 
-def main():
-    ap = argparse.ArgumentParser(description="Descarga mensual vía NCSS; respeta calendario; guarda en ../data/<MODELO>/")
-    ap.add_argument("txt", help="Archivo .txt con URLs de catálogo (una por línea).")
+def build_ncss_url(base, var, t0, t1, args, bbox=None):
+    """Armó la URL NCSS de una ventana temporal con bbox/stride/accept de los argumentos."""
+    q = [f"var={var}"]
+    bbox = bbox or args.bbox
+    if bbox:
+        west, east, south, north = bbox
+        q += [f"north={north}", f"west={west}", f"east={east}", f"south={south}", f"horizStride={args.stride}"]
+    q += [f"time_start={t0}", f"time_end={t1}"]
+    q.append(f"accept={'netcdf4' if args.netcdf4 else 'netcdf3'}")
+    if not args.no_add_latlon:
+        q.append("addLatLon=true")
+    return f"{base}?{'&'.join(q)}"
+
+def expand_inputs(patterns):
+    """Expandió archivos y globs de enlaces (p.ej. 'enlaces/pr_*_ssp245.txt') sin duplicados."""
+    out, seen = [], set()
+    for pat in patterns:
+        matches = sorted(glob.glob(pat)) if glob.has_magic(pat) else [pat]
+        if not matches:
+            print(f"# Aviso: el patrón {pat} no coincidió con ningún archivo.", file=sys.stderr)
+        for p in matches:
+            if p not in seen:
+                seen.add(p); out.append(p)
+    return out
+
+def read_links(path):
+    with open(path) as f:
+        return [ln.strip() for ln in f if ln.strip() and not ln.lstrip().startswith("#")]
+
+def iter_month_tasks(urls, args):
+    """Generó una tarea (url, base, var, fname, year, month, out_path) por mes de cada dataset (URL o Dataset)."""
+    for item in urls:
+        url, base, var, fname, year, model = dataset_fields(item, args)
+        if year is None:
+            print(f"# Aviso: no se pudo inferir año desde {fname}; se saltó.", flush=True)
+            continue
+        out_dir = os.path.join(args.base_dir, model)
+        os.makedirs(out_dir, exist_ok=True)
+        for m in range(1, 13):
+            out_path = os.path.join(out_dir, make_monthly_fname(fname, year, m))
+            yield url, base, var, fname, year, m, out_path
+
+# Tarea de varias ventanas/teselas que se unieron y partieron en archivos mensuales
+WindowTask = namedtuple("WindowTask", "url base var fname year spans months")
+# Tarea de un año de serie en una celda (lat, lon): points = [(Punto, fragmento csv)] de esa celda
+PointTask = namedtuple("PointTask", "url base var fname year lat lon points")
+
+def iter_point_tasks(urls, args):
+    """Una tarea por dataset anual y celda de grilla con puntos sin fragmento escrito."""
+    cells = extr.group_by_cell(args.point_list)
+    for item in urls:
+        url, base, var, fname, year, model = dataset_fields(item, args)
+        if year is None:
+            print(f"# Aviso: no se pudo inferir año desde {fname}; se saltó.", flush=True)
+            continue
+        nc_path = os.path.join(args.base_dir, model, fname)
+        for (lat, lon), pts in cells.items():
+            todo = [(p, extr.fragment_path(nc_path, p.name)) for p in pts]
+            todo = [(p, o) for p, o in todo if not os.path.exists(o)]
+            if todo:
+                yield PointTask(url, base, var, fname, year, lat, lon, todo)
+
+def series_mode(args):
+    return bool(getattr(args, "point_list", None) or getattr(args, "polygon_shape", None))
+
+def prepare_download_args(args):
+    """Resolvió --chunk/--tile-deg y --source antes de generar tareas (p03 y sync)."""
+    args.local_mirror = None
+    if args.source.startswith("local:"):
+        root = args.source[len("local:"):]
+        if not os.path.isdir(root):
+            raise ValueError(f"--source: no existió el directorio {root}")
+        args.local_mirror = LocalMirror(root)
+    elif args.source != "remote":
+        raise ValueError(f"--source inválido: {args.source} (remote o local:<ruta>)")
+    args.planner = None
+    if args.calendar == "auto" and not args.no_plan:
+        # calendario real de cada modelo (cabecera local o dataset.xml, una vez por modelo): ventanas exactas sin 400
+        client = ClienteHTTP(tries=args.tries, timeout=args.timeout, waitretry=args.waitretry)
+        args.planner = calendario.Planificador(args.calendar_cache, calendario.client_fetch(client),
+                                               local_root=args.local_mirror.root if args.local_mirror else None)
+    args.point_list = [extr.parse_point(s, i) for i, s in enumerate(args.points or [])]
+    if args.points_file:
+        args.point_list += extr.read_points_file(args.points_file)
+    args.polygon_shape = extr.read_polygon(args.polygon) if args.polygon else None
+    if args.point_list and args.polygon_shape:
+        raise ValueError("--points/--points-file y --polygon fueron excluyentes.")
+    if args.polygon_shape:
+        # se bajó solo la caja mínima del polígono; la grilla se descartó tras promediar
+        if args.bbox:
+            print("# Aviso: --polygon reemplazó a --bbox por la caja que lo cubrió.", file=sys.stderr)
+        args.bbox = list(extr.polygon_bbox(args.polygon_shape[1]))
+    args.recompress_profile = None
+    if getattr(args, "recompress", False):
+        if series_mode(args):
+            print("# Aviso: --recompress no aplicó a --points/--polygon (la grilla no se guardó).", file=sys.stderr)
+        else:
+            args.recompress_profile = recomprime.profile_from_args(args)
+    resolve_chunking(args)
+
+def resolve_chunking(args):
+    """Fijó args.chunk_mode ('month'|'season'|'year'|N días) y args.tile_deg según --chunk/--tile-deg."""
+    chunk = part.parse_chunk(args.chunk)
+    target = args.chunk_target_mb * 1e6
+    if chunk == "auto":
+        chunk = part.choose_chunk(args.bbox, args.stride, target)
+        if args.tile_deg is None:
+            args.tile_deg = part.choose_tile_deg(args.bbox, args.stride, target)
+    args.chunk_mode = chunk
+
+def chunked(args):
+    return getattr(args, "chunk_mode", "month") != "month" or bool(getattr(args, "tile_deg", None))
+
+def units_per_dataset(args):
+    """Meses (unidades de progreso) de un dataset anual: 12, por cada celda con --points."""
+    return 12 * (len(extr.group_by_cell(args.point_list)) if getattr(args, "point_list", None) else 1)
+
+def plan_units(args, n):
+    """Sumó n meses previstos al progreso y la ETA, para fuentes que conocieron el total sobre la marcha.
+
+    Con --queue no se hizo nada: cada trabajador planificó solo lo que arrendó (task_units al reclamar), así
+    los meses que tomaron otros nodos no dejaron restantes que nunca llegaban a 0.
+    """
+    if getattr(args, "metricas", None) is not None and n and not getattr(args, "queue", None):
+        args.metricas.plan(n)
+
+def task_units(task):
+    """Meses que una tarea sumó al progreso (un año de celda contó 12, como en stats.add)."""
+    return 12 if isinstance(task, PointTask) else len(task_months(task))
+
+def iter_tasks(urls, args, done=None):
+    """Tareas de descarga: una por mes, o por ventana (trimestre/año/N días) si hubo --chunk/--tile-deg.
+
+    urls: URLs de catálogo (enlaces/) o records.Dataset (cmip6dl).
+    done(out_path) -> True excluyó ese mes (p.ej. ya registrado como 'ok' en estado.sqlite).
+    Con --points se generaron PointTask; con --polygon se excluyeron los meses ya promediados.
+    """
+    if getattr(args, "point_list", None):
+        yield from iter_point_tasks(urls, args)
+        return
+    shape = getattr(args, "polygon_shape", None)
+    month_tasks = (t for t in iter_month_tasks(urls, args)
+                   if (done is None or not done(t[-1]))
+                   and not (shape and os.path.exists(extr.fragment_path(t[-1], shape[0]))))
+    if not chunked(args):
+        yield from month_tasks
+        return
+    # iter_month_tasks emitió los 12 meses de cada dataset seguidos: se agruparon sin materializar todo
+    for (url, base, var, fname, year), group in groupby(month_tasks, key=lambda t: t[:5]):
+        todo = {t[5]: t[6] for t in group}
+        cal = dataset_calendar(args, base).calendar
+        last_day = lambda m: month_last_day(year, m, cal)
+        for months, spans in part.group_windows(part.windows(year, args.chunk_mode, last_day)):
+            pending = [(m, todo[m]) for m in months if m in todo]
+            if pending:
+                yield WindowTask(url, base, var, fname, year, spans, pending)
+
+def task_months(task):
+    """[(mes, out_path)] que cubrió una tarea (mensual o de ventana)."""
+    if isinstance(task, WindowTask):
+        return task.months
+    return [(task[5], task[6])]
+
+def task_key(task, args):
+    """Clave de la tarea en la cola, igual en todos los nodos (ruta relativa a --base-dir)."""
+    if isinstance(task, PointTask):
+        path = task.points[0][1]
+    elif isinstance(task, WindowTask):
+        # por ventana y no por el primer mes pendiente: un nodo que ya tenía parte del año dio la misma clave
+        m0, d0 = task.spans[0][:2]
+        path = os.path.join(os.path.dirname(task.months[0][1]), f"{task.fname}.{task.year}.{m0:02d}{d0:02d}")
+    else:
+        path = task[-1]
+    return os.path.relpath(path, args.base_dir)
+
+def task_done(task, args):
+    """True si todo lo que produce la tarea ya estaba en disco (meses, fragmentos de punto o de polígono)."""
+    if isinstance(task, PointTask):
+        return all(os.path.exists(p) for _, p in task.points)
+    shape = getattr(args, "polygon_shape", None)
+    return all(os.path.exists(extr.fragment_path(p, shape[0]) if shape else p) for _, p in task_months(task))
+
+def open_queue(args):
+    """Cola de --queue; al reclamar el arriendo de un nodo caído se borraron sus temporales propios (los parciales
+    estables <mes>.part quedaron: el reclamante los continuó)."""
+    def on_reclaim(key, info):
+        d = os.path.join(args.base_dir, os.path.dirname(key))
+        for pattern in (f"*.{info['worker']}.part", f".*.{info['worker']}.part"):
+            for p in glob.glob(os.path.join(d, pattern)):
+                discard_partial(p)
+    return cola.Cola(args.queue, args.lease_ttl, on_reclaim=on_reclaim)
+
+class Throughput:
+    """Contadores compartidos entre hilos para el resumen final (archivos/s, MB/s).
+
+    Con metricas, cada archivo también contó como unidades (meses) para el progreso y la ETA.
+    """
+    def __init__(self, metricas=None):
+        self.lock = threading.Lock()
+        self.t0 = time.monotonic()
+        self.files = self.bytes = self.skipped = self.failed = 0
+        self.metricas = metricas
+    def add(self, nbytes, units=1):
+        with self.lock:
+            self.files += 1; self.bytes += nbytes
+        if self.metricas is not None:
+            self.metricas.unit("ok", nbytes, units)
+    def skip(self):
+        with self.lock:
+            self.skipped += 1
+        if self.metricas is not None:
+            self.metricas.unit("omitido")
+    def fail(self, units=1):
+        with self.lock:
+            self.failed += 1
+        if self.metricas is not None and units:
+            self.metricas.unit("fallido", n=units)
+    def summary(self):
+        dt = max(time.monotonic() - self.t0, 1e-9)
+        mb = self.bytes / 1e6
+        return (f"# Resumen: {self.files} archivos, {mb:.1f} MB en {dt:.1f} s "
+                f"({self.files/dt:.2f} archivos/s, {mb/dt:.2f} MB/s); "
+                f"omitidos {self.skipped}, fallidos {self.failed}")
+
+# Errores de descarga que activaron el reintento de fin de mes (wget o cliente nativo)
+FETCH_ERRORS = (subprocess.CalledProcessError, DescargaError)
+
+def window_rejected(e):
+    """True si el servidor rechazó la petición (4xx), no un corte de red ni una saturación."""
+    status = getattr(e, "status", None)
+    if status is None and isinstance(e, subprocess.CalledProcessError):
+        return e.returncode == 8           # wget sin código legible: "el servidor respondió con error"
+    return status is not None and status not in RETRY_STATUS
+
+def fetch_month(out_path, url, args, limiter, client=None):
+    # --source local:<ruta>: primero el espejo local; a la red solo lo que no cubrió
+    mirror = getattr(args, "local_mirror", None)
+    if mirror is not None and mirror.fetch(url, out_path):
+        return
+    if client is not None:
+        # el cliente nativo pidió turno al regulador en cada intento (Retry-After, backoff exponencial)
+        client.download(out_path, url)
+        return
+    metr = getattr(args, "metricas", None)
+    # un circuito abierto se esperó: con wget el mes no falló sin haber pedido nada
+    with limiter.slot(url, wait_open=True) as ticket:
+        t0 = time.perf_counter()
+        try:
+            run_wget(out_path, url, tries=args.tries, timeout=args.timeout, waitretry=args.waitretry)
+        except subprocess.CalledProcessError as e:
+            if metr is not None:
+                # wget reintentó por su cuenta: se vio un solo intento, con el último código HTTP que informó
+                metr.request(url, getattr(e, "status", None), time.perf_counter() - t0, 0,
+                             error=f"wget salió con {e.returncode}")
+            raise
+        nbytes = os.path.getsize(out_path)
+        ticket.consume(nbytes)
+        if metr is not None:
+            metr.request(url, 200, time.perf_counter() - t0, nbytes)
+
+def discard_partial(out_path):
+    if os.path.exists(out_path):
+        os.remove(out_path)
+
+def dataset_calendar(args, base):
+    """Calendario del dataset: el del planificador (exacto) o el de --calendar (supuesto, con reintento)."""
+    planner = getattr(args, "planner", None)
+    if planner is not None:
+        return planner.lookup(base)
+    return calendario.Calendario(args.calendar, False)
+
+def fetch_window(out_path, make_url, year, span, cal, args, limiter, client=None):
+    """Descargó la ventana span = (m0, d0, m1, d1) de year con la URL make_url(t0, t1).
+
+    Con calendario exacto hubo un solo intento; con uno supuesto, un rechazo del servidor reintentó con el fin
+    alternativo (28 de febrero en noleap, día 30 en 360_day), como el antiguo reintento de fin de mes.
+    Un corte de red se propagó sin cambiar de ventana: lo ya escrito en out_path siguió sirviendo para continuar.
+    """
+    m0, d0, m1, d1 = span
+    t0 = time_stamp(year, m0, d0, args.hour)
+    alt = None if cal.exact else part.fallback_end(m1, d1, cal.calendar)
+    ends = [d1] if alt is None else [d1, alt]
+    for i, end in enumerate(ends):
+        try:
+            fetch_month(out_path, make_url(t0, time_stamp(year, m1, end, args.hour)), args, limiter, client)
+            return
+        except FETCH_ERRORS as e:
+            if i == len(ends) - 1 or not window_rejected(e):
+                raise
+            # lo escrito pertenecía a otra ventana temporal: no se debía continuar
+            discard_partial(out_path)
+
+def download_month(task, args, limiter, client=None):
+    """Descargó un mes (con reintento de fin de mes si el calendario fue supuesto); devolvió bytes escritos (None si se omitió)."""
+    url, base, var, fname, year, m, out_path = task
+    if os.path.exists(out_path):
+        #adicional para descarga faltantes
+        return None
+    cal = dataset_calendar(args, base)
+    span = (m, 1, m, month_last_day(year, m, cal.calendar))
+    # parcial <mes>.part bloqueado + rename: out_path existió solo completo, aunque otro proceso bajara el mismo
+    # mes, y un corte dejó el parcial para que el siguiente intento o corrida lo continuara (Range/--continue)
+    with cola.resumable(out_path) as (tmp, resume):
+        if os.path.exists(out_path):
+            # otro proceso lo terminó entre la comprobación y el candado: el parcial recién creado sobró
+            if resume:
+                discard_partial(tmp)
+            return None
+        try:
+            fetch_window(tmp, lambda t0, t1: build_ncss_url(base, var, t0, t1, args), year, span, cal,
+                         args, limiter, client)
+            os.replace(tmp, out_path)
+        except BaseException as e:
+            # un rechazo (4xx) o un temporal propio no sirvieron para continuar: se borraron
+            if not resume or window_rejected(e):
+                discard_partial(tmp)
+            raise
+    return os.path.getsize(out_path)
+
+def year_span(year, cal):
+    return (1, 1, 12, month_last_day(year, 12, cal.calendar))
+
+def download_points(task, args, limiter, client=None):
+    """Bajó el año de serie de una celda (NCSS grid-as-point, CSV) y escribió un fragmento por punto; devolvió bytes."""
+    cal = dataset_calendar(args, task.base)
+    raw = cola.partial_path(task.points[0][1] + ".ncss")
+    os.makedirs(os.path.dirname(raw), exist_ok=True)
+    try:
+        fetch_window(raw, lambda t0, t1: extr.point_url(task.base, task.var, task.lat, task.lon, t0, t1),
+                     task.year, year_span(task.year, cal), cal, args, limiter, client)
+        with open(raw, encoding="utf-8", errors="replace") as f:
+            rows = extr.parse_point_csv(f.read(), task.var)
+    finally:
+        discard_partial(raw)
+    if not rows:
+        raise ValueError("la respuesta CSV no trajo pasos de tiempo")
+    return sum(extr.write_series(out_path, task.var, rows) for _, out_path in task.points)
+
+def reduce_polygon(months, var, args):
+    """Promedió en el polígono cada mes en disco, escribió su fragmento y borró la grilla; devolvió los fragmentos."""
+    name, rings = args.polygon_shape
+    frags = []
+    for _, out_path in months:
+        if os.path.exists(out_path):
+            frag = extr.fragment_path(out_path, name)
+            extr.write_series(frag, var, extr.area_mean(out_path, var, rings))
+            discard_partial(out_path)
+            frags.append(frag)
+    return frags
+
+def add_download_args(ap):
+    """Opciones de descarga compartidas por p03 y sync.py."""
     ap.add_argument("--bbox", nargs=4, type=float, metavar=("WEST","EAST","SOUTH","NORTH"),
                     help="Caja lon/lat (-180..180). Si se omite, sin recorte.")
     ap.add_argument("--stride", type=int, default=1, help="horizStride (default: 1)")
     ap.add_argument("--var", default=None, help="Variable (si no, se infiere).")
     ap.add_argument("--hour", type=int, default=12, help="Hora UTC para time_start/time_end (default: 12)")
     ap.add_argument("--calendar", choices=["auto","noleap","gregorian","360_day"], default="auto",
-                    help="Calendario temporal (default: auto=noleap en feb).")
+                    help="Calendario temporal (default: auto = el de cada modelo según dataset.xml; si no se pudo leer, noleap en feb con reintento).")
+    ap.add_argument("--calendar-cache", default=calendario.DEFAULT_PATH,
+                    help=f"Caché JSON de calendarios por modelo (default: {calendario.DEFAULT_PATH})")
+    ap.add_argument("--no-plan", action="store_true",
+                    help="No pidió dataset.xml: auto supuso el calendario y reintentó ante error (comportamiento anterior).")
     ap.add_argument("--netcdf4", action="store_true", help="accept=netcdf4 (si no, netcdf3)")
     ap.add_argument("--dry-run", action="store_true", help="Solo imprime comandos.")
     ap.add_argument("--no-add-latlon", action="store_true", help="No incluye addLatLon=true.")
+    ap.add_argument("--client", choices=["wget","native"], default="wget",
+                    help="wget (subproceso por mes) o native (conexiones HTTPS persistentes, sin wget)")
     ap.add_argument("--tries", type=int, default=5)
     ap.add_argument("--timeout", type=int, default=60)
     ap.add_argument("--waitretry", type=int, default=10)
     ap.add_argument("--base-dir", default="../data", help="Directorio base (default: ../data)")
-    args = ap.parse_args()
+    ap.add_argument("--jobs", type=int, default=1, help="Descargas simultáneas (default: 1)")
+    regulador.add_regulador_args(ap)
+    metricas.add_metricas_args(ap)
+    recomprime.add_recompress_args(ap)
+    ap.add_argument("--state", default=None,
+                    help="Base de estado SQLite (p.ej. estado.sqlite) donde registrar cada mes.")
+    ap.add_argument("--queue", default=None,
+                    help="Directorio de arriendos compartido: varios procesos/nodos con la misma lista y --base-dir se repartieron las tareas (ver cola.py)")
+    ap.add_argument("--lease-ttl", type=float, default=cola.DEFAULT_TTL,
+                    help=f"Segundos sin latido tras los que otro nodo reclamó una tarea (default: {cola.DEFAULT_TTL:g})")
+    ap.add_argument("--chunk", default="month",
+                    help="Ventana por petición: auto|month|season|year|<N>d (default: month). "
+                         "Con N < 31 cada mes se partió en trozos; con N >= 31 las ventanas cruzaron meses.")
+    ap.add_argument("--chunk-target-mb", type=float, default=150,
+                    help="Tamaño objetivo por petición en modo auto (MB sin comprimir; default: 150)")
+    ap.add_argument("--source", default="remote",
+                    help="remote (NCSS) o local:<ruta> (espejo local de ../data o ../consolidado; lo no cubierto fue a la red)")
+    ap.add_argument("--verify", action="store_true",
+                    help="Verificó cada mes recién escrito (firma, cabecera, pasos de tiempo y caja); los malos contaron como fallidos.")
+    ap.add_argument("--tile-deg", type=float, default=None,
+                    help="Dividir la caja en teselas de a lo más N grados (auto: solo si un día excede el objetivo)")
+    ap.add_argument("--points", action="append", metavar="LAT,LON[,NOMBRE]",
+                    help="Serie en un punto vía NCSS grid-as-point (repetible); guardó CSV por modelo en vez de la grilla")
+    ap.add_argument("--points-file", default=None,
+                    help="Archivo con un punto por línea (lat,lon[,nombre]; se admitió encabezado)")
+    ap.add_argument("--polygon", default=None,
+                    help="GeoJSON, texto 'lon lat' por línea o 'lon,lat;lon,lat;...': bajó la caja mínima y guardó la media ponderada por cos(lat)")
 
-    if not os.path.isfile(args.txt):
-        raise SystemExit(f"No existió {args.txt}")
+def span_days(year, span, cal):
+    """Días de la ventana (m0, d0, m1, d1) según el calendario."""
+    m0, d0, m1, d1 = span
+    return sum((d1 if m == m1 else month_last_day(year, m, cal)) - (d0 if m == m0 else 1) + 1
+               for m in range(m0, m1 + 1))
 
-    with open(args.txt) as f:
-        lines = [ln.strip() for ln in f if ln.strip() and not ln.lstrip().startswith("#")]
-    if not lines:
-        raise SystemExit("No hubo URLs en el archivo.")
+def print_dry_run(tasks, args):
+    """Imprimió el plan exacto (ventanas según el calendario de cada modelo) y los bytes estimados."""
+    n = total = 0
+    calendars = {}
 
-    for url in lines:
-        base, var, fname = build_ncss_base_and_fname(url, var=args.var)
-        year, _ = parse_fname_year_version(fname)
-        if year is None:
-            print(f"# Aviso: no se pudo inferir año desde {fname}; se saltó.", flush=True)
+    def emit(url, nbytes):
+        nonlocal n, total
+        n += 1; total += nbytes
+        print(url)
+
+    for task in tasks:
+        base, year = task[1], task[4]
+        cal = dataset_calendar(args, base)
+        calendars[calendario.model_of(base)] = cal
+        if isinstance(task, PointTask):
+            span = year_span(year, cal)
+            t0, t1 = time_stamp(year, 1, 1, args.hour), time_stamp(year, 12, span[3], args.hour)
+            print(f"# DRY: {', '.join(p for _, p in task.points)}")
+            # CSV grid-as-point: ~60 bytes por día
+            emit(extr.point_url(task.base, task.var, task.lat, task.lon, t0, t1), 60 * span_days(year, span, cal.calendar))
             continue
+        if isinstance(task, WindowTask):
+            tiles = part.split_bbox(args.bbox, args.tile_deg) if args.tile_deg else [args.bbox]
+            print(f"# DRY: {', '.join(p for _, p in task.months)}")
+            for span in task.spans:
+                t0 = time_stamp(year, span[0], span[1], args.hour)
+                t1 = time_stamp(year, span[2], span[3], args.hour)
+                for bbox in tiles:
+                    emit(build_ncss_url(task.base, task.var, t0, t1, args, bbox),
+                         part.estimate_bytes(bbox, args.stride, span_days(year, span, cal.calendar)))
+            continue
+        url, base, var, fname, year, m, out_path = task
+        if os.path.exists(out_path):
+            continue
+        last = month_last_day(year, m, cal.calendar)
+        print(f"# DRY: {out_path}")
+        emit(build_ncss_url(base, var, time_stamp(year, m, 1, args.hour), time_stamp(year, m, last, args.hour), args),
+             part.estimate_bytes(args.bbox, args.stride, last))
+    guessed = sorted(m for m, c in calendars.items() if not c.exact)
+    print(f"# Plan: {n} peticiones, ~{total / 1e6:.1f} MB sin comprimir; calendarios: "
+          + ", ".join(f"{m}={c.calendar}" for m, c in sorted(calendars.items()))
+          + (f" (supuestos, con reintento: {', '.join(guessed)})" if guessed else ""))
 
-        model = extract_model_from_catalog_url(url)
-        out_dir = os.path.join(args.base_dir, model)
-        os.makedirs(out_dir, exist_ok=True)
+def run_tasks(tasks, args, state=None, planned=None):
+    """Ejecutó las tareas mensuales (en serie o con --jobs hilos). Devolvió (stats, fallidos).
 
-        for m in range(1, 13):
-            t0, t1, last = monthly_bounds(year, m, args.hour, args.calendar)
-            q = [f"var={var}"]
-            if args.bbox:
-                west, east, south, north = args.bbox
-                q += [f"north={north}", f"west={west}", f"east={east}", f"south={south}", f"horizStride={args.stride}"]
-            q += [f"time_start={t0}", f"time_end={t1}"]
-            q.append(f"accept={'netcdf4' if args.netcdf4 else 'netcdf3'}")
-            if not args.no_add_latlon:
-                q.append("addLatLon=true")
-            ncss_url = f"{base}?{'&'.join(q)}"
-
-            out_name = make_monthly_fname(fname, year, m)
-            out_path = os.path.join(out_dir, out_name)
-            if os.path.exists(out_path): 
-                #adicional para descarga faltantes
-                continue 
-            if args.dry_run:
-                print(f"# DRY: {out_path}")
-                print(ncss_url)
-                continue
+    planned: meses previstos (si se conoció) para el progreso y la ETA de --progress/--stats-file/--metrics-port;
+    con --queue se ignoró y se planificó cada tarea al arrendarla.
+    """
+    args.metricas = metricas.from_args(args, "p03")
+    plan_units(args, planned)
+    try:
+        return _run_tasks(tasks, args, state)
+    finally:
+        if args.metricas is not None:
+            args.metricas.close()
+
+def _run_tasks(tasks, args, state):
+    stats = Throughput(args.metricas)
+    limiter = regulador.from_args(args)
+    client = None
+    if args.client == "native":
+        client = ClienteHTTP(tries=args.tries, timeout=args.timeout, waitretry=args.waitretry, regulador=limiter,
+                             metricas=args.metricas)
+    failed = []
+    series = set()      # fragmentos escritos en esta corrida: solo esas series se volvieron a unir
+    known = state.month_status() if state is not None else {}
+    profile = getattr(args, "recompress_profile", None)
+    # procesos aparte: la CPU de zlib/zstd se solapó con la espera de red de los hilos
+    recomp = recomprime.Recompresor(profile, args.recompress_jobs) if profile is not None else None
+
+    def recompress(out_path, url, year, m):
+        def done(path, before, after):
+            if state is not None and after != before:
+                # el tamaño y el sha256 registrados fueron los del archivo que quedó en disco
+                state.record_month(path, url, year, m, "ok", after, file_sha256(path))
+        recomp.submit(out_path, done)
 
+    def worker(task):
+        url, year = task[0], task[4]
+        if isinstance(task, PointTask):
             try:
-                run_wget(out_path, ncss_url, tries=args.tries, timeout=args.timeout, waitretry=args.waitretry)
-            except subprocess.CalledProcessError as e:
-                # Reintento inteligente para 400 por día fuera de rango (p.ej., feb en noleap)
-                if m == 2:
-                    # forzar 28 días
-                    t0 = f"{year:04d}-02-01T{args.hour:02d}:00:00Z"
-                    t1 = f"{year:04d}-02-28T{args.hour:02d}:00:00Z"
-                    q2 = [f"var={var}"]
-                    if args.bbox:
-                        west, east, south, north = args.bbox
-                        q2 += [f"north={north}", f"west={west}", f"east={east}", f"south={south}", f"horizStride={args.stride}"]
-                    q2 += [f"time_start={t0}", f"time_end={t1}"]
-                    q2.append(f"accept={'netcdf4' if args.netcdf4 else 'netcdf3'}")
-                    if not args.no_add_latlon:
-                        q2.append("addLatLon=true")
-                    ncss_url2 = f"{base}?{'&'.join(q2)}"
-                    try:
-                        run_wget(out_path, ncss_url2, tries=args.tries, timeout=args.timeout, waitretry=args.waitretry)
-                        continue
-                    except subprocess.CalledProcessError:
-                        raise
-                # Opcional: si cal=360_day y falla un mes de 31 días, intentar 30 días
-                if args.calendar in ("auto","360_day") and last == 31:
-                    t1_alt = f"{year:04d}-{m:02d}-30T{args.hour:02d}:00:00Z"
-                    q3 = [f"var={var}"]
-                    if args.bbox:
-                        west, east, south, north = args.bbox
-                        q3 += [f"north={north}", f"west={west}", f"east={east}", f"south={south}", f"horizStride={args.stride}"]
-                    q3 += [f"time_start={t0}", f"time_end={t1_alt}"]
-                    q3.append(f"accept={'netcdf4' if args.netcdf4 else 'netcdf3'}")
-                    if not args.no_add_latlon:
-                        q3.append("addLatLon=true")
-                    ncss_url3 = f"{base}?{'&'.join(q3)}"
-                    run_wget(out_path, ncss_url3, tries=args.tries, timeout=args.timeout, waitretry=args.waitretry)
-                else:
-                    raise
+                stats.add(download_points(task, args, limiter, client), units=12)
+                series.update(p for _, p in task.points)
+            except FETCH_ERRORS + (OSError, ValueError) as e:
+                # en las métricas el año de la celda contó una sola vez (12 meses)
+                for i, (_, out_path) in enumerate(task.points):
+                    stats.fail(units=0 if i else 12); failed.append(out_path)
+                print(f"# Error: {task.points[0][1]} ({e})", file=sys.stderr, flush=True)
+            return
+        months = task_months(task)
+        try:
+            if isinstance(task, WindowTask):
+                written = download_window(task, args, limiter, client) or {}
+            else:
+                n = download_month(task, args, limiter, client)
+                written = {} if n is None else {task[-1]: n}
+        except FETCH_ERRORS + (OSError, ValueError) as e:
+            for m, out_path in months:
+                stats.fail(); failed.append(out_path)
+                if state is not None:
+                    state.record_month(out_path, url, year, m, "fallido")
+            print(f"# Error: {months[0][1]} ({e})", file=sys.stderr, flush=True)
+            return
+        if args.verify:
+            for out_path in list(written):
+                status, detail = verifica.check_file(out_path, args.bbox, args.stride)
+                if status != "ok":
+                    # página de error o respuesta truncada: no debió quedar como mes completo
+                    print(f"# Error: {out_path} ({status}: {detail})", file=sys.stderr, flush=True)
+                    discard_partial(out_path)
+                    del written[out_path]
+        for m, out_path in months:
+            if out_path in written:
+                stats.add(written[out_path])
+                if state is not None:
+                    state.record_month(out_path, url, year, m, "ok", written[out_path], file_sha256(out_path))
+                if recomp is not None:
+                    recompress(out_path, url, year, m)
+            elif os.path.exists(out_path):
+                stats.skip()
+                if state is not None and known.get(out_path) != "ok":
+                    state.record_month(out_path, url, year, m, "ok", os.path.getsize(out_path))
+            else:
+                # la ventana no trajo pasos de tiempo para ese mes
+                stats.fail(); failed.append(out_path)
+                if state is not None:
+                    state.record_month(out_path, url, year, m, "fallido")
+        if getattr(args, "polygon_shape", None):
+            try:
+                series.update(reduce_polygon(months, task[2], args))
+            except (OSError, ValueError, KeyError) as e:
+                # el mes ya contó como descargado en las métricas
+                stats.fail(units=0); failed.append(months[0][1])
+                print(f"# Error: media en el polígono de {months[0][1]} ({e})", file=sys.stderr, flush=True)
+
+    def claimed(task):
+        # con --queue: el arriendo se liberó si quedó todo en disco; si no, quedó fallido para otro nodo
+        if args.metricas is not None:
+            args.metricas.plan(task_units(task))
+        try:
+            worker(task)
+        finally:
+            queue.release(task_key(task, args), ok=task_done(task, args))
+
+    queue = open_queue(args) if getattr(args, "queue", None) else None
+    try:
+        if queue is None:
+            _dispatch(worker, tasks, args.jobs)
+        else:
+            _dispatch(claimed, cola.iter_claimed(queue, tasks, lambda t: task_key(t, args),
+                                                 lambda t: task_done(t, args)), args.jobs)
+    finally:
+        if queue is not None:
+            queue.close()
+            print(queue.summary(), file=sys.stderr, flush=True)
+        if recomp is not None:
+            recomp.close()
+            print(recomp.summary(), file=sys.stderr, flush=True)
+    if limiter.hosts:
+        print(limiter.summary(), file=sys.stderr, flush=True)
+    if getattr(args, "planner", None) is not None:
+        print(args.planner.summary(), file=sys.stderr, flush=True)
+    if series_mode(args):
+        # los fragmentos anuales/mensuales se unieron en una serie por modelo/variable/escenario/punto
+        print(extr.summary(extr.merge_series(args.base_dir, series)), flush=True)
+    return stats, failed
+
+def _dispatch(worker, tasks, jobs):
+    if jobs <= 1:
+        for task in tasks:
+            worker(task)
+        return
+    # Cola acotada: no se materializaron las ~240k tareas de una vez
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        pending = set()
+        for task in tasks:
+            pending.add(ex.submit(worker, task))
+            if len(pending) >= jobs * 4:
+                done = next(as_completed(pending))
+                pending.discard(done); done.result()
+        for fut in as_completed(pending):
+            fut.result()
+
+def fetch_span(piece, task, span, bbox, args, limiter, client):
+    """Descargó una ventana (m0, d0, m1, d1) de una tesela (reintento de fin de ventana solo con calendario supuesto)."""
+    fetch_window(piece, lambda t0, t1: build_ncss_url(task.base, task.var, t0, t1, args, bbox), task.year, span,
+                 dataset_calendar(args, task.base), args, limiter, client)
+
+def download_window(task, args, limiter, client=None):
+    """Descargó las ventanas/teselas de una WindowTask y las partió en los archivos mensuales.
+
+    Devolvió {out_path: bytes} de los meses escritos (None si todos existían).
+    """
+    months = [(m, p) for m, p in task.months if not os.path.exists(p)]
+    if not months:
+        return None
+    out_dir = os.path.dirname(months[0][1])
+    tiles = part.split_bbox(args.bbox, args.tile_deg) if args.tile_deg else [args.bbox]
+    pieces = []
+    try:
+        for i, span in enumerate(task.spans):
+            for j, bbox in enumerate(tiles):
+                piece = cola.partial_path(os.path.join(out_dir, f".{task.fname}.{span[0]:02d}{span[1]:02d}.t{j}"))
+                pieces.append(piece)
+                fetch_span(piece, task, span, bbox, args, limiter, client)
+        return part.write_months(pieces, [m for m, _ in months], [p for _, p in months], args.netcdf4)
+    finally:
+        for p in pieces:
+            discard_partial(p)
+
+def main():
+    ap = argparse.ArgumentParser(description="Descarga mensual vía NCSS; respeta calendario; guarda en ../data/<MODELO>/")
+    ap.add_argument("txt", nargs="+", help="Archivo(s) .txt o globs con URLs de catálogo (una por línea).")
+    add_download_args(ap)
+    args = ap.parse_args()
+
+    txts = expand_inputs(args.txt)
+    for txt in txts:
+        if not os.path.isfile(txt):
+            raise SystemExit(f"No existió {txt}")
+
+    lines = [ln for txt in txts for ln in read_links(txt)]
+    if not lines:
+        raise SystemExit("No hubo URLs en el archivo.")
+
+    try:
+        prepare_download_args(args)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if args.dry_run:
+        print_dry_run(iter_tasks(lines, args), args)
+        return
+
+    state = Estado(args.state) if args.state else None
+    stats, failed = run_tasks(iter_tasks(lines, args), args, state, planned=units_per_dataset(args) * len(lines))
+    print(stats.summary(), flush=True)
+    if failed:
+        raise SystemExit(f"Fallaron {len(failed)} mes(es); se reintentarán en la próxima ejecución.")
 
 if __name__ == "__main__":
     main()
-
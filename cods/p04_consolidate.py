@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# p04_consolidate.py  (une los NetCDF mensuales de ../data/<MODELO>/ en un almacén comprimido por escenario)
+import argparse, glob, json, os, re, shutil, sys
+from collections import defaultdict
+import xarray as xr
+'''
+ejemplo:
+python3 p04_consolidate.py --base-dir ../data --out-dir ../consolidado --layout series
+python3 p04_consolidate.py --models TaiESM1 --vars tas --format nc --layout mapas
+'''
+# <var>_day_<MODELO>_<escenario>_<miembro>_<grilla>_<YYYYMM>[_vM.m].nc  (make_monthly_fname de p03)
+MONTHLY_RE = re.compile(
+    r'^(?P<var>[^_]+)_day_(?P<model>.+?)_(?P<scen>historical|ssp\d+)_(?P<member>r\d+i\d+p\d+f\d+)_'
+    r'(?P<grid>[^_]+)_(?P<ym>\d{6})(?P<ver>_v\d+(?:\.\d+)?)?\.nc$')
+
+# Chunks (time, lat, lon): series = pocas celdas y mucho tiempo; mapas = un día y toda la grilla
+LAYOUTS = {
+    "series": {"time": 1461, "lat": 32, "lon": 32},
+    "mapas":  {"time": 1, "lat": None, "lon": None},
+}
+
+def parse_monthly_name(fname):
+    """Devolvió (clave_grupo, 'YYYYMM') o (None, None) si el nombre no siguió make_monthly_fname."""
+    m = MONTHLY_RE.match(fname)
+    if not m:
+        return None, None
+    key = (m.group("var"), m.group("model"), m.group("scen"), m.group("member"), m.group("grid"))
+    return key, m.group("ym")
+
+def scan_groups(base_dir, models=None, variables=None, scenarios=None):
+    """Agrupó los archivos mensuales por (var, modelo, escenario, miembro, grilla) → {YYYYMM: ruta}."""
+    groups = defaultdict(dict)
+    for path in glob.glob(os.path.join(base_dir, "*", "*.nc")):
+        key, ym = parse_monthly_name(os.path.basename(path))
+        if key is None:
+            continue
+        var, model, scen = key[:3]
+        if (models and model not in models) or (variables and var not in variables) \
+                or (scenarios and scen not in scenarios):
+            continue
+        # si hubo dos versiones del mismo mes, se quedó la de nombre mayor (versión más nueva)
+        if ym not in groups[key] or path > groups[key][ym]:
+            groups[key][ym] = path
+    return groups
+
+def store_path(out_dir, key, fmt):
+    var, model, scen, member, grid = key
+    ext = "zarr" if fmt == "zarr" else "nc"
+    return os.path.join(out_dir, model, f"{var}_day_{model}_{scen}_{member}_{grid}.{ext}")
+
+def load_manifest(path):
+    try:
+        with open(path + ".meses.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(path, manifest):
+    tmp = path + ".meses.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=0, sort_keys=True)
+    os.replace(tmp, path + ".meses.json")
+
+def chunk_sizes(ds, var, layout):
+    """Tamaños de chunk para var según el layout (None = dimensión completa)."""
+    spec = LAYOUTS[layout]
+    out = []
+    for dim in ds[var].dims:
+        n = spec.get(dim)
+        if n is None:
+            n = ds.sizes[dim]
+        elif dim != "time":
+            # time pudo crecer (append); lat/lon no
+            n = min(n, ds.sizes[dim])
+        out.append(n)
+    return tuple(out)
+
+def data_vars_encoding(ds, layout, fmt, level):
+    enc = {}
+    for var in ds.data_vars:
+        if "time" not in ds[var].dims:
+            continue
+        chunks = chunk_sizes(ds, var, layout)
+        if fmt == "zarr":
+            enc[var] = {"chunks": chunks}
+        else:
+            enc[var] = {"zlib": True, "complevel": level, "shuffle": True, "chunksizes": chunks}
+    return enc
+
+def append_zarr(store, ds, first, layout, level):
+    if first:
+        enc = data_vars_encoding(ds, layout, "zarr", level)
+        ds.to_zarr(store, mode="w", encoding=enc, consolidated=True)
+    else:
+        ds.to_zarr(store, append_dim="time", consolidated=True)
+
+def append_netcdf(store, ds, first, layout, level):
+    """NetCDF4 con dimensión time ilimitada; los meses siguientes se escribieron al final con netCDF4."""
+    if first:
+        enc = data_vars_encoding(ds, layout, "nc", level)
+        ds.to_netcdf(store, format="NETCDF4", unlimited_dims=["time"], encoding=enc)
+        return
+    import netCDF4
+    from xarray.coding.times import encode_cf_datetime
+    with netCDF4.Dataset(store, "a") as nc:
+        tvar = nc.variables["time"]
+        n0 = len(tvar)
+        cal = getattr(tvar, "calendar", "standard")
+        tvar[n0:] = encode_cf_datetime(ds["time"].values, tvar.units, calendar=cal)[0]
+        for var in ds.data_vars:
+            if "time" in ds[var].dims and var in nc.variables:
+                nc.variables[var][n0:] = ds[var].values
+
+def consolidate_group(key, months, out_dir, fmt="zarr", layout="series", level=4, rebuild=False):
+    """Agregó al almacén los meses nuevos de un grupo, de a un mes en memoria.
+
+    Si apareció un mes anterior al último ya consolidado (hueco rellenado), se reconstruyó el almacén.
+    Devolvió el número de meses agregados.
+    """
+    store = store_path(out_dir, key, fmt)
+    os.makedirs(os.path.dirname(store), exist_ok=True)
+    manifest = {} if rebuild else load_manifest(store)
+    if manifest and not os.path.exists(store):
+        manifest = {}
+    done = set(manifest)
+    new = sorted(ym for ym, p in months.items()
+                 if ym not in done or manifest[ym] != os.path.getsize(p))
+    if not new:
+        return 0
+    if done and (min(new) <= max(done) or any(ym in done for ym in new)):
+        # append solo admitió meses posteriores: se rehízo con todos los meses en orden
+        print(f"# Aviso: meses fuera de orden en {os.path.basename(store)}; se reconstruyó.", file=sys.stderr)
+        manifest, done, new = {}, set(), sorted(months)
+    if not done and os.path.exists(store):
+        shutil.rmtree(store) if os.path.isdir(store) else os.remove(store)
+
+    writer = append_zarr if fmt == "zarr" else append_netcdf
+    for i, ym in enumerate(new):
+        with xr.open_dataset(months[ym]) as ds:
+            ds = ds.load()
+        writer(store, ds, first=(i == 0 and not done), layout=layout, level=level)
+        manifest[ym] = os.path.getsize(months[ym])
+        # el manifiesto se guardó tras cada mes: una interrupción no duplicó meses al reanudar
+        save_manifest(store, manifest)
+    return len(new)
+
+def split_list(s):
+    return [x.strip() for x in s.split(",") if x.strip()] if s else []
+
+def main():
+    ap = argparse.ArgumentParser(description="Consolidó los NetCDF mensuales en un almacén por modelo/variable/escenario")
+    ap.add_argument("--base-dir", default="../data", help="Directorio de p03 (default: ../data)")
+    ap.add_argument("--out-dir", default="../consolidado", help="Salida (default: ../consolidado)")
+    ap.add_argument("--format", choices=["zarr", "nc"], default="zarr", help="zarr (default) o NetCDF4")
+    ap.add_argument("--layout", choices=sorted(LAYOUTS), default="series",
+                    help="series: lectura rápida de series en un punto; mapas: lectura rápida de campos diarios")
+    ap.add_argument("--level", type=int, default=4, help="Nivel de compresión zlib para NetCDF4 (default: 4)")
+    ap.add_argument("--models", default="", help="Modelos separados por coma (default: todos)")
+    ap.add_argument("--vars", default="", help="Variables separadas por coma (default: todas)")
+    ap.add_argument("--scenarios", default="", help="Escenarios separados por coma (default: todos)")
+    ap.add_argument("--rebuild", action="store_true", help="Rehízo los almacenes desde cero.")
+    args = ap.parse_args()
+
+    if args.format == "zarr":
+        try:
+            import zarr  # noqa: F401
+        except ImportError:
+            raise SystemExit("Falta el paquete zarr (pip install zarr) o use --format nc.")
+
+    groups = scan_groups(args.base_dir, split_list(args.models), split_list(args.vars), split_list(args.scenarios))
+    if not groups:
+        raise SystemExit(f"No hubo archivos mensuales en {args.base_dir}/<MODELO>/")
+    total = 0
+    for key in sorted(groups):
+        n = consolidate_group(key, groups[key], args.out_dir, args.format, args.layout, args.level, args.rebuild)
+        if n:
+            print(f"Se agregaron {n} mes(es) a {store_path(args.out_dir, key, args.format)}", flush=True)
+        total += n
+    print(f"\nProceso completado. Meses agregados: {total}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# p05_indices.py  (índices climáticos desde los mensuales de p03 o los almacenes de p04, por bandas de latitud)
+import argparse, glob, os, re, warnings
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import groupby
+import numpy as np
+import xarray as xr
+from p04_consolidate import scan_groups, load_manifest, save_manifest, split_list
+'''
+ejemplo:
+python3 p05_indices.py --base-dir ../data --out-dir ../indices --jobs 4
+python3 p05_indices.py --indices rx1day,cdd --models ACCESS-CM2 --scenarios historical,ssp245
+python3 p05_indices.py --source store:../consolidado --indices txp90 --max-mb 256
+python3 p05_indices.py --list
+'''
+SECONDS_PER_DAY = 86400.0        # pr en kg m-2 s-1 -> mm/día
+K0 = 273.15
+DAYS_PER_YEAR = 366
+# <var>_day_<MODELO>_<escenario>_<miembro>_<grilla>.zarr|.nc  (store_path de p04)
+STORE_RE = re.compile(
+    r'^(?P<var>[^_]+)_day_(?P<model>.+?)_(?P<scen>historical|ssp\d+)_(?P<member>r\d+i\d+p\d+f\d+)_'
+    r'(?P<grid>[^_]+)\.(?:zarr|nc)$')
+
+# ------------------------------------------------------------------ índices
+# Cada índice fue un reductor sobre arreglos (tiempo, lat, lon) de un mes:
+#   init(shape) -> estado; update(estado, x) -> estado; finish(estado) -> (lat, lon)
+# freq='month' cerró un valor por mes; freq='year' acumuló los meses del año (en orden) y cerró al final.
+Indice = namedtuple("Indice", "var freq units long_name init update finish")
+
+def _zeros(shape):
+    return np.zeros(shape)
+
+def _same(state):
+    return state
+
+def _pr_total(state, x):
+    return state + np.nansum(x, axis=0) * SECONDS_PER_DAY
+
+def _neg_inf(shape):
+    return np.full(shape, -np.inf)
+
+def _rx1day(state, x):
+    return np.fmax(state, np.nanmax(x, axis=0) * SECONDS_PER_DAY)
+
+def _finite(state):
+    return np.where(np.isfinite(state), state, np.nan)
+
+def _runs(shape):
+    return np.zeros(shape, "i4"), np.zeros(shape, "i4")
+
+def _cdd(state, x):
+    # la racha siguió de un mes al siguiente: por eso los meses de un año se leyeron en orden
+    run, best = state
+    for day in x:
+        run = np.where(day * SECONDS_PER_DAY < 1.0, run + 1, 0)
+        best = np.maximum(best, run)
+    return run, best
+
+def _best(state):
+    return state[1].astype("f4")
+
+def _gdd10(state, x):
+    return state + np.nansum(np.maximum(x - K0 - 10.0, 0.0), axis=0)
+
+def _hdd18(state, x):
+    return state + np.nansum(np.maximum(18.0 - (x - K0), 0.0), axis=0)
+
+def _days(shape):
+    return []
+
+def _append(state, x):
+    state.append(x)
+    return state
+
+def _p90(state):
+    return np.nanpercentile(np.concatenate(state), 90, axis=0)
+
+INDICES = {
+    "pr_total": Indice("pr", "month", "mm", "Precipitación total mensual", _zeros, _pr_total, _same),
+    "rx1day":   Indice("pr", "month", "mm", "Precipitación máxima en 1 día", _neg_inf, _rx1day, _finite),
+    "cdd":      Indice("pr", "year", "días", "Máximo de días secos consecutivos (pr < 1 mm)", _runs, _cdd, _best),
+    "gdd10":    Indice("tas", "month", "°C día", "Grados-día de crecimiento (base 10 °C)", _zeros, _gdd10, _same),
+    "hdd18":    Indice("tas", "month", "°C día", "Grados-día de calefacción (base 18 °C)", _zeros, _hdd18, _same),
+    "txp90":    Indice("tasmax", "year", "K", "Percentil 90 anual de tasmax", _days, _append, _p90),
+}
+
+def period_of(name, ym):
+    """Periodo de salida de un mes 'YYYYMM': YYYYMM (mensual) o YYYY (anual)."""
+    return int(ym) if INDICES[name].freq == "month" else int(ym[:4])
+
+# ------------------------------------------------------------------ fuentes
+class MesesArchivos:
+    """Meses de un grupo en archivos mensuales de p03: ficha = tamaño (como el manifiesto de p04)."""
+    def __init__(self, months, var):
+        self.months, self.var = months, var
+        self.tokens = {ym: os.path.getsize(p) for ym, p in months.items()}
+
+    def coords(self):
+        with xr.open_dataset(self.months[min(self.months)]) as ds:
+            return ds["lat"].values, ds["lon"].values
+
+    def read(self, ym, r0, r1):
+        # solo la banda de latitudes: xarray leyó del disco ese recorte
+        with xr.open_dataset(self.months[ym]) as ds:
+            da = ds[self.var].isel(lat=slice(r0, r1)).transpose("time", "lat", "lon")
+            return da.values.astype("f4")
+
+    def close(self):
+        pass
+
+class MesesAlmacen:
+    """Meses de un almacén de p04 (zarr o NetCDF4): fichas del sidecar .meses.json de p04."""
+    def __init__(self, store, var):
+        self.var = var
+        self.ds = xr.open_zarr(store) if store.endswith(".zarr") else xr.open_dataset(store)
+        self.tokens = load_manifest(store)
+        t = self.ds["time"].dt
+        self.ym = (t.year * 100 + t.month).values
+
+    def coords(self):
+        return self.ds["lat"].values, self.ds["lon"].values
+
+    def read(self, ym, r0, r1):
+        idx = np.nonzero(self.ym == int(ym))[0]
+        da = self.ds[self.var].isel(time=slice(idx[0], idx[-1] + 1), lat=slice(r0, r1))
+        return da.transpose("time", "lat", "lon").values.astype("f4")
+
+    def close(self):
+        self.ds.close()
+
+def scan_stores(store_dir, models=None, variables=None, scenarios=None):
+    """{(var, modelo, escenario, miembro, grilla): almacén} de los almacenes de p04."""
+    out = {}
+    for path in sorted(glob.glob(os.path.join(store_dir, "*", "*_day_*"))):
+        m = STORE_RE.match(os.path.basename(path))
+        if not m:
+            continue
+        key = (m.group("var"), m.group("model"), m.group("scen"), m.group("member"), m.group("grid"))
+        if (models and key[1] not in models) or (variables and key[0] not in variables) \
+                or (scenarios and key[2] not in scenarios):
+            continue
+        out[key] = path
+    return out
+
+# ------------------------------------------------------------------- salida
+def index_path(out_dir, key, name):
+    var, model, scen, member, grid = key
+    return os.path.join(out_dir, model, f"{name}_{model}_{scen}_{member}_{grid}.nc")
+
+def band_rows(nlon, max_mb):
+    """Filas de latitud por banda: un año de valores diarios de la banda (txp90) cupo en max_mb."""
+    return max(1, int(max_mb * 1e6 // (DAYS_PER_YEAR * nlon * 4 * 2)))
+
+def open_output(out, name, periods, lat, lon, old_periods):
+    """NetCDF4 temporal con todos los periodos; copió del anterior (de a un mapa) los que no se recalcularon."""
+    import netCDF4
+    ind = INDICES[name]
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    nc = netCDF4.Dataset(out + ".part", "w", format="NETCDF4")
+    nc.createDimension("periodo", len(periods))
+    nc.createDimension("lat", len(lat))
+    nc.createDimension("lon", len(lon))
+    v = nc.createVariable("periodo", "i4", ("periodo",))
+    v.long_name = "YYYYMM" if ind.freq == "month" else "YYYY"
+    v[:] = periods
+    nc.createVariable("lat", "f8", ("lat",))[:] = lat
+    nc.createVariable("lon", "f8", ("lon",))[:] = lon
+    nc["lat"].units, nc["lon"].units = "degrees_north", "degrees_east"
+    var = nc.createVariable(name, "f4", ("periodo", "lat", "lon"), zlib=True, complevel=4, shuffle=True,
+                            fill_value=np.float32(np.nan), chunksizes=(1, len(lat), len(lon)))
+    var.units, var.long_name = ind.units, ind.long_name
+    nc.createVariable("meses", "i2", ("periodo",), fill_value=np.int16(0)).long_name = "Meses de entrada usados"
+    pos = {p: i for i, p in enumerate(periods)}
+    if old_periods:
+        with netCDF4.Dataset(out) as old:
+            for i, p in enumerate(old["periodo"][:].tolist()):
+                if p in old_periods:
+                    var[pos[p]] = old[name][i]
+                    nc["meses"][pos[p]] = old["meses"][i]
+    return nc, pos
+
+def process_group(key, where, names, out_dir, max_mb=512, rebuild=False):
+    """Calculó los índices names de un grupo, solo en los periodos con meses nuevos o cambiados.
+
+    where: {YYYYMM: ruta} (mensuales de p03) o ruta de un almacén de p04. Devolvió {índice: periodos escritos}.
+    """
+    import netCDF4
+    warnings.simplefilter("ignore", RuntimeWarning)      # celdas todo NaN en nanmax/nanpercentile
+    src = MesesArchivos(where, key[0]) if isinstance(where, dict) else MesesAlmacen(where, key[0])
+    try:
+        todo = {}
+        for name in names:
+            out = index_path(out_dir, key, name)
+            manifest = {} if rebuild or not os.path.exists(out) else load_manifest(out)
+            dirty = {period_of(name, ym) for ym, tok in src.tokens.items() if manifest.get(ym) != tok}
+            if dirty:
+                todo[name] = (out, manifest, dirty)
+        if not todo:
+            return {}
+        needed = sorted(ym for ym in src.tokens if any(period_of(n, ym) in t[2] for n, t in todo.items()))
+        lat, lon = src.coords()
+        outputs = {}
+        for name, (out, manifest, dirty) in todo.items():
+            old = set()
+            if manifest:
+                with netCDF4.Dataset(out) as nc:
+                    old = set(nc["periodo"][:].tolist()) - dirty
+            periods = sorted(old | dirty)
+            outputs[name] = open_output(out, name, periods, lat, lon, old)
+        rows = band_rows(len(lon), max_mb)
+        try:
+            for r0 in range(0, len(lat), rows):
+                r1 = min(len(lat), r0 + rows)
+                shape = (r1 - r0, len(lon))
+                for year, yms in groupby(needed, key=lambda ym: ym[:4]):
+                    states, counts = {}, {}
+                    for ym in yms:
+                        x = None
+                        for name in todo:
+                            period = period_of(name, ym)
+                            if period not in todo[name][2]:
+                                continue
+                            if x is None:
+                                x = src.read(ym, r0, r1)
+                            ind = INDICES[name]
+                            st = states[name] if name in states else ind.init(shape)
+                            states[name] = ind.update(st, x)
+                            counts[name] = counts.get(name, 0) + 1
+                            if ind.freq == "month":
+                                write_period(outputs[name], name, period, r0, r1, ind.finish(states.pop(name)), 1)
+                                counts.pop(name)
+                    for name, st in states.items():
+                        # índices anuales: el año se cerró con los meses disponibles (contados en 'meses')
+                        write_period(outputs[name], name, int(year), r0, r1, INDICES[name].finish(st), counts[name])
+        except BaseException:
+            for name, (nc, _) in outputs.items():
+                nc.close(); discard(todo[name][0] + ".part")
+            raise
+        written = {}
+        for name, (nc, pos) in outputs.items():
+            out, manifest, dirty = todo[name]
+            nc.close()
+            os.replace(out + ".part", out)
+            manifest.update({ym: src.tokens[ym] for ym in needed if period_of(name, ym) in dirty})
+            save_manifest(out, manifest)
+            written[name] = len(dirty)
+        return written
+    finally:
+        src.close()
+
+def discard(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+def write_period(output, name, period, r0, r1, values, n_months):
+    nc, pos = output
+    nc[name][pos[period], r0:r1, :] = values.astype("f4")
+    nc["meses"][pos[period]] = n_months
+
+def main():
+    ap = argparse.ArgumentParser(description="Índices climáticos por modelo/escenario con memoria acotada e incrementales")
+    ap.add_argument("--base-dir", default="../data", help="Mensuales de p03 (default: ../data)")
+    ap.add_argument("--source", default="files",
+                    help="files (mensuales de --base-dir, default) o store:<ruta> (almacenes de p04)")
+    ap.add_argument("--out-dir", default="../indices", help="Salida (default: ../indices)")
+    ap.add_argument("--indices", default="", help=f"Índices separados por coma (default: todos: {','.join(INDICES)})")
+    ap.add_argument("--models", default="", help="Modelos separados por coma (default: todos)")
+    ap.add_argument("--scenarios", default="", help="Escenarios separados por coma (default: todos)")
+    ap.add_argument("--jobs", type=int, default=1, help="Procesos en paralelo, uno por grupo modelo/escenario (default: 1)")
+    ap.add_argument("--max-mb", type=float, default=512,
+                    help="Memoria objetivo por proceso; fijó las filas de latitud por banda (default: 512)")
+    ap.add_argument("--rebuild", action="store_true", help="Recalculó todos los periodos.")
+    ap.add_argument("--list", action="store_true", help="Listó los índices disponibles.")
+    args = ap.parse_args()
+
+    if args.list:
+        for name, ind in INDICES.items():
+            print(f"{name:9s} {ind.var:7s} {'mensual' if ind.freq == 'month' else 'anual':8s} [{ind.units}] {ind.long_name}")
+        return
+    names = split_list(args.indices) or list(INDICES)
+    unknown = [n for n in names if n not in INDICES]
+    if unknown:
+        raise SystemExit(f"Índices desconocidos: {', '.join(unknown)} (ver --list)")
+    variables = sorted({INDICES[n].var for n in names})
+    models, scenarios = split_list(args.models), split_list(args.scenarios)
+    if args.source.startswith("store:"):
+        groups = scan_stores(args.source[len("store:"):], models, variables, scenarios)
+    elif args.source == "files":
+        groups = scan_groups(args.base_dir, models, variables, scenarios)
+    else:
+        raise SystemExit(f"--source inválido: {args.source} (files o store:<ruta>)")
+    if not groups:
+        raise SystemExit("No hubo datos de entrada para las variables de los índices pedidos.")
+
+    jobs = [(key, groups[key], [n for n in names if INDICES[n].var == key[0]]) for key in sorted(groups)]
+    total = 0
+
+    def report(key, written):
+        for name, n in sorted(written.items()):
+            print(f"{name}: {n} periodo(s) en {index_path(args.out_dir, key, name)}", flush=True)
+        return sum(written.values())
+
+    if args.jobs <= 1:
+        for key, where, group_names in jobs:
+            total += report(key, process_group(key, where, group_names, args.out_dir, args.max_mb, args.rebuild))
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as ex:
+            futs = {ex.submit(process_group, key, where, group_names, args.out_dir, args.max_mb, args.rebuild): key
+                    for key, where, group_names in jobs}
+            for fut in as_completed(futs):
+                total += report(futs[fut], fut.result())
+    print(f"\nProceso completado. Periodos calculados: {total}")
+
+if __name__ == "__main__":
+    main()
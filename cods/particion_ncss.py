@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# particion_ncss.py  (tamaño de petición NCSS: mes / trimestre / año / N días y teselas espaciales)
+import math, os, threading
+from cola import partial_path
+'''
+Usado por p03 con --chunk auto|month|season|year|<N>d y --tile-deg:
+    chunk = choose_chunk(bbox, stride, target_bytes)   # 'year', 'season', 'month' o N (días)
+    for m0, d0, m1, d1, months in windows(year, chunk, calendar): ...
+Los archivos mensuales finales (make_monthly_fname) no cambiaron.
+'''
+GRID_RES = 0.25                          # resolución de NEX-GDDP-CMIP6 (grados)
+GLOBAL_BBOX = (-180.0, 180.0, -60.0, 90.0)
+BYTES_PER_VALUE = 4                      # float32
+DAYS = {"year": 366, "season": 92, "month": 31}
+SEASONS = ((1, 2, 3), (4, 5, 6), (7, 8, 9), (10, 11, 12))
+# netCDF4/HDF5 no fue seguro entre hilos: la unión/partición se serializó (la red siguió en paralelo)
+NC_LOCK = threading.Lock()
+
+def grid_cells(bbox, stride=1, res=GRID_RES):
+    west, east, south, north = bbox or GLOBAL_BBOX
+    nx = max(1, math.ceil((east - west) / (res * stride)))
+    ny = max(1, math.ceil((north - south) / (res * stride)))
+    return nx * ny
+
+def estimate_bytes(bbox, stride, days, res=GRID_RES):
+    """Estimó el tamaño (sin compresión) de una respuesta NCSS de days días."""
+    return grid_cells(bbox, stride, res) * days * BYTES_PER_VALUE
+
+def parse_chunk(value):
+    """Validó --chunk: auto, month, season, year o N días ('10d' o '10')."""
+    v = value.lower()
+    if v in ("auto", "month", "season", "year"):
+        return v
+    n = v[:-1] if v.endswith("d") else v
+    if n.isdigit() and int(n) > 0:
+        return int(n)
+    raise ValueError(f"--chunk inválido: {value}")
+
+def choose_chunk(bbox, stride, target_bytes):
+    """Modo auto: la ventana más larga cuya respuesta estimada no superó target_bytes."""
+    for name in ("year", "season", "month"):
+        if estimate_bytes(bbox, stride, DAYS[name]) <= target_bytes:
+            return name
+    return max(1, int(target_bytes // max(1, estimate_bytes(bbox, stride, 1))))
+
+def choose_tile_deg(bbox, stride, target_bytes, res=GRID_RES):
+    """Lado de tesela (grados) para que un día de una tesela cupiera en target_bytes; None si no hizo falta."""
+    if estimate_bytes(bbox, stride, 1, res) <= target_bytes:
+        return None
+    side_cells = math.sqrt(target_bytes / BYTES_PER_VALUE)
+    return max(res, math.floor(side_cells * res * stride / res) * res)
+
+def split_bbox(bbox, max_deg, res=GRID_RES):
+    """Dividió la caja en teselas de a lo más max_deg grados.
+
+    Los bordes internos se alinearon a múltiplos de res (entre centros de celda x.125 de GDDP),
+    así ninguna celda quedó repetida en dos teselas y combine_by_coords las unió sin solapes.
+    """
+    west, east, south, north = bbox or GLOBAL_BBOX
+    step = max(res, math.floor(max_deg / res) * res)
+
+    def edges(a, b):
+        out = [a]
+        x = math.floor(a / res) * res + step
+        while x < b:
+            out.append(x); x += step
+        return out + [b]
+
+    xs, ys = edges(west, east), edges(south, north)
+    return [(xs[i], xs[i + 1], ys[j], ys[j + 1])
+            for j in range(len(ys) - 1) for i in range(len(xs) - 1)]
+
+def windows(year, chunk, last_day):
+    """Ventanas (m0, d0, m1, d1, meses) de un año.
+
+    chunk: 'month' | 'season' | 'year' | N (días). last_day(month) dio el último día según el calendario.
+    Con N menor que un mes (31), cada mes se partió en trozos de N días (el último con al menos 2 días) que
+    luego se unieron. Con N >= 31 las ventanas de N días cruzaron los límites de mes dentro del año y
+    write_months las volvió a cortar en los mensuales.
+    """
+    if chunk == "year":
+        return [(1, 1, 12, last_day(12), list(range(1, 13)))]
+    if chunk == "season":
+        return [(s[0], 1, s[-1], last_day(s[-1]), list(s)) for s in SEASONS]
+    if chunk == "month":
+        return [(m, 1, m, last_day(m), [m]) for m in range(1, 13)]
+    if chunk >= DAYS["month"]:
+        days = [(m, d) for m in range(1, 13) for d in range(1, last_day(m) + 1)]
+        starts = list(range(0, len(days), chunk))
+        if len(starts) > 1 and len(days) - starts[-1] < 2:
+            starts.pop()
+        out = []
+        for i, k in enumerate(starts):
+            (m0, d0), (m1, d1) = days[k], days[starts[i + 1] - 1 if i + 1 < len(starts) else -1]
+            out.append((m0, d0, m1, d1, list(range(m0, m1 + 1))))
+        return out
+    out = []
+    for m in range(1, 13):
+        last = last_day(m)
+        starts = list(range(1, last + 1, chunk))
+        if len(starts) > 1 and last - starts[-1] < 1:
+            starts.pop()
+        for i, d0 in enumerate(starts):
+            d1 = starts[i + 1] - 1 if i + 1 < len(starts) else last
+            out.append((m, d0, m, d1, [m]))
+    return out
+
+def group_windows(spans):
+    """Agrupó ventanas consecutivas que compartieron algún mes: [(meses, [(m0, d0, m1, d1)])].
+
+    Cada grupo fue una tarea: sus piezas juntas cubrieron completos los meses que tocaron.
+    """
+    groups = []
+    for m0, d0, m1, d1, months in spans:
+        if groups and months[0] in groups[-1][0]:
+            groups[-1][0].extend(m for m in months if m not in groups[-1][0])
+            groups[-1][1].append((m0, d0, m1, d1))
+        else:
+            groups.append((list(months), [(m0, d0, m1, d1)]))
+    return groups
+
+def fallback_end(month, day, calendar):
+    """Último día alternativo cuando el servidor rechazó el fin de ventana (400); None si no hubo."""
+    if month == 2 and day > 28:
+        return 28
+    if calendar in ("auto", "360_day") and day == 31:
+        return 30
+    return None
+
+def write_months(pieces, months, out_paths, netcdf4=False):
+    """Unió las piezas descargadas (ventanas/teselas) y escribió un NetCDF por mes.
+
+    pieces: rutas temporales; months/out_paths: meses a escribir y su destino. Devolvió {out_path: bytes}.
+    Cada mes se escribió en un temporal y se renombró, de modo que nunca quedó un mes a medias.
+    """
+    import xarray as xr
+    with NC_LOCK:
+        return _write_months(xr, pieces, months, out_paths, netcdf4)
+
+def _write_months(xr, pieces, months, out_paths, netcdf4):
+    dsets = [xr.open_dataset(p) for p in pieces]
+    try:
+        ds = dsets[0] if len(dsets) == 1 else xr.combine_by_coords(dsets, combine_attrs="override")
+        fmt = "NETCDF4" if netcdf4 else "NETCDF3_64BIT"
+        written = {}
+        for m, out_path in zip(months, out_paths):
+            if os.path.exists(out_path):
+                continue
+            sub = ds.isel(time=(ds["time"].dt.month == m).values)
+            if sub.sizes.get("time", 0) == 0:
+                continue
+            tmp = partial_path(out_path)
+            sub.to_netcdf(tmp, format=fmt)
+            os.replace(tmp, out_path)
+            written[out_path] = os.path.getsize(out_path)
+        return written
+    finally:
+        for d in dsets:
+            d.close()
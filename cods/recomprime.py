@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# recomprime.py  (reescritura de los NetCDF mensuales: zlib/zstd, shuffle, chunks por variable y empaquetado int16)
+import argparse, glob, multiprocessing, os, sys, threading, time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from cola import partial_path
+'''
+NCSS entregó float32 sin comprimir (netcdf3) o con la compresión por defecto del servidor; aquí cada mes se
+reescribió como NetCDF4 con el códec y los chunks elegidos y, con --pack, las variables de PACKING como int16
+con scale_factor/add_offset (CF; xarray y netCDF4 lo desempaquetaron solos). p03 --recompress lo hizo en un
+pool de procesos mientras seguían las descargas.
+ejemplo:
+python3 recomprime.py --base-dir ../data --codec zstd --level 3 --pack --jobs 4
+python3 recomprime.py --base-dir ../data --models TaiESM1 --vars tas --codec zlib --level 4 --layout series
+python3 p03_thredds_ncss.py 'enlaces/tas_*.txt' --jobs 8 --client native --recompress --codec zstd --pack
+'''
+# Variables de GDDP-CMIP6 empaquetables en int16: (scale_factor, add_offset). Error máximo = scale/2;
+# el rango representable fue add_offset ± 32766 * scale. pr no se empaquetó: la llovizna (1e-6 kg m-2 s-1)
+# y los extremos no cupieron juntos en una escala lineal de 16 bits.
+PACKING = {
+    "tas":     (0.01, 273.15),    # K, ±0.005 K; -54..600 K
+    "tasmax":  (0.01, 273.15),
+    "tasmin":  (0.01, 273.15),
+    "hurs":    (0.01, 0.0),       # %, ±0.005 %
+    "huss":    (2e-6, 0.0),       # kg kg-1, ±1e-6; hasta 0.065
+    "rsds":    (0.02, 0.0),       # W m-2, ±0.01; hasta 655
+    "rlds":    (0.02, 0.0),
+    "sfcWind": (0.002, 0.0),      # m s-1, ±0.001; hasta 65
+}
+PACK_FILL = np.int16(-32767)
+# Chunks (time, lat, lon) como en p04: series = pocas celdas y todo el mes; mapas = un día y toda la caja
+LAYOUTS = {
+    "series": (None, 32, 32),
+    "mapas":  (1, None, None),
+}
+CODECS = ("zlib", "zstd", "none")
+MARK = "dolo_recompresion"
+
+Perfil = namedtuple("Perfil", "codec level shuffle pack layout")
+
+def profile_from_args(args):
+    """Perfil de los argumentos; ValueError si el códec no estuvo disponible en esta instalación de netCDF4."""
+    if args.codec == "zstd":
+        import netCDF4
+        if not getattr(netCDF4, "__has_zstandard_support__", False):
+            raise ValueError("--codec zstd: netCDF4/HDF5 sin soporte zstd en esta instalación (usar --codec zlib)")
+    return Perfil(args.codec, args.level, not args.no_shuffle, args.pack, args.layout)
+
+def describe(perfil):
+    """Texto guardado en el atributo global MARK: un archivo con el mismo perfil no se volvió a reescribir."""
+    parts = [perfil.codec if perfil.codec == "none" else f"{perfil.codec}{perfil.level}"]
+    if perfil.shuffle and perfil.codec == "zlib":
+        parts.append("shuffle")
+    if perfil.pack:
+        parts.append("int16")
+    return " ".join(parts + [perfil.layout])
+
+def chunk_shape(dims, shape, layout):
+    """Chunks de una variable (time, lat, lon); None en LAYOUTS = la dimensión completa."""
+    wanted = dict(zip(("time", "lat", "lon"), LAYOUTS[layout]))
+    return [min(wanted.get(d) or n, n) or 1 for d, n in zip(dims, shape)]
+
+def packing_for(name, var, data, perfil):
+    """(scale, offset) si la variable se empaquetó; None si no estuvo en PACKING o sus valores no cupieron."""
+    # data ya desempaquetado: un archivo empaquetado por otro perfil se volvió a empaquetar
+    if not perfil.pack or name not in PACKING or data.dtype.kind != "f" or var.ndim < 3:
+        return None
+    scale, offset = PACKING[name]
+    valid = np.ma.compressed(data)
+    if valid.size and np.abs(valid - offset).max() / scale > 32766:
+        print(f"# Aviso: {name} fuera del rango int16 de PACKING; quedó en {data.dtype}", file=sys.stderr)
+        return None
+    return scale, offset
+
+def _compression(perfil):
+    if perfil.codec == "none":
+        return {}
+    # netCDF4-python solo aplicó shuffle junto con zlib (nc_def_var_deflate); con zstd se ignoró
+    return {"compression": perfil.codec, "complevel": perfil.level, "shuffle": perfil.shuffle and perfil.codec == "zlib"}
+
+def recompress_file(path, perfil):
+    """Reescribió path con el perfil (temporal propio + rename). Devolvió (bytes_antes, bytes_después, empaquetadas).
+
+    Un archivo que ya tenía el mismo perfil no se tocó (antes == después). Solo se leyó y escribió con netCDF4:
+    los atributos (calendar, units, ...) y los valores de time/lat/lon pasaron sin cambios.
+    """
+    import netCDF4
+    before = os.path.getsize(path)
+    mark = describe(perfil)
+    tmp = partial_path(path)
+    packed = []
+    try:
+        with netCDF4.Dataset(path) as src:
+            if getattr(src, MARK, None) == mark:
+                return before, before, []
+            with netCDF4.Dataset(tmp, "w", format="NETCDF4") as dst:
+                dst.setncatts({k: src.getncattr(k) for k in src.ncattrs()})
+                dst.setncattr(MARK, mark)
+                for name, dim in src.dimensions.items():
+                    dst.createDimension(name, None if dim.isunlimited() else len(dim))
+                for name, var in src.variables.items():
+                    if _copy_variable(dst, name, var, perfil):
+                        packed.append(name)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return before, os.path.getsize(path), packed
+
+def _copy_variable(dst, name, var, perfil):
+    attrs = {k: var.getncattr(k) for k in var.ncattrs()}
+    data = var[...]                                 # enmascarado y ya desempaquetado si venía empaquetado
+    if data.dtype.kind == "f":
+        data = np.ma.masked_invalid(data)           # NaN como faltante, igual que _FillValue
+    pack = packing_for(name, var, data, perfil)
+    kwargs = {}
+    if var.ndim >= 2 and all(var.shape):
+        kwargs = dict(_compression(perfil), chunksizes=chunk_shape(var.dimensions, var.shape, perfil.layout))
+    if pack is None:
+        fill = attrs.pop("_FillValue", None)
+        dtype = var.dtype
+        if "scale_factor" in attrs or "add_offset" in attrs:
+            # venía empaquetada con otra escala: quedó desempaquetada (el relleno del entero ya no sirvió)
+            attrs.pop("scale_factor", None); attrs.pop("add_offset", None); attrs.pop("missing_value", None)
+            dtype, fill = data.dtype, None
+        out = dst.createVariable(name, dtype, var.dimensions, fill_value=fill, **kwargs)
+    else:
+        attrs.pop("_FillValue", None); attrs.pop("missing_value", None)
+        scale, offset = pack
+        attrs["scale_factor"], attrs["add_offset"] = np.float32(scale), np.float32(offset)
+        out = dst.createVariable(name, "i2", var.dimensions, fill_value=PACK_FILL, **kwargs)
+    out.setncatts(attrs)
+    # con scale_factor/add_offset ya puestos, netCDF4 empaquetó (redondeando) al asignar
+    if var.ndim == 0:
+        out.assignValue(data)
+    else:
+        out[:] = data
+    return pack is not None
+
+class Recompresor:
+    """Pool de procesos que recomprimió archivos recién escritos mientras los hilos de p03 seguían bajando.
+
+    submit(path, done) encoló un archivo; done(path, antes, después) se llamó al terminar (hilo del pool).
+    Se usó 'spawn': un fork con hilos de descarga a mitad de una llamada a HDF5 pudo dejar candados tomados.
+    """
+    def __init__(self, perfil, jobs=1):
+        self.perfil = perfil
+        self.ex = ProcessPoolExecutor(max_workers=max(1, jobs), mp_context=multiprocessing.get_context("spawn"))
+        self.lock = threading.Lock()
+        self.files = self.before = self.after = self.failed = 0
+        self.packed = set()
+        self.t0 = time.monotonic()
+
+    def submit(self, path, done=None):
+        fut = self.ex.submit(recompress_file, path, self.perfil)
+        fut.add_done_callback(lambda f: self._done(f, path, done))
+
+    def _done(self, fut, path, done):
+        try:
+            before, after, packed = fut.result()
+        except Exception as e:
+            with self.lock:
+                self.failed += 1
+            print(f"# Aviso: no se recomprimió {path} ({e}); quedó como se descargó", file=sys.stderr, flush=True)
+            return
+        with self.lock:
+            self.files += 1; self.before += before; self.after += after
+            self.packed.update(packed)
+        if done is not None:
+            done(path, before, after)
+
+    def close(self):
+        self.ex.shutdown(wait=True)
+
+    def summary(self):
+        ratio = self.after / self.before if self.before else 1.0
+        return (f"# Recompresión ({describe(self.perfil)}): {self.files} archivos, "
+                f"{self.before / 1e6:.1f} → {self.after / 1e6:.1f} MB ({ratio:.0%}) en {time.monotonic() - self.t0:.1f} s"
+                + (f"; int16: {', '.join(sorted(self.packed))}" if self.packed else "")
+                + (f"; fallidos {self.failed}" if self.failed else ""))
+
+def add_recompress_args(ap, flag=True):
+    """Opciones del perfil; con flag, también --recompress (p03) para activarlo."""
+    if flag:
+        ap.add_argument("--recompress", action="store_true",
+                        help="Recomprimió cada mes recién escrito en un pool de procesos (perfil: --codec/--level/--pack/--layout)")
+        ap.add_argument("--recompress-jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Procesos de recompresión (default: la mitad de las CPU)")
+    ap.add_argument("--codec", choices=CODECS, default="zlib", help="Compresión HDF5 (default: zlib; zstd si netCDF4 lo trajo)")
+    ap.add_argument("--level", type=int, default=4, help="Nivel de compresión (default: 4)")
+    ap.add_argument("--no-shuffle", action="store_true", help="Sin filtro shuffle (netCDF4 solo lo aplicó con zlib)")
+    ap.add_argument("--pack", action="store_true",
+                    help=f"Empaquetó en int16 con scale_factor/add_offset las variables con precisión conocida ({', '.join(PACKING)})")
+    ap.add_argument("--layout", choices=sorted(LAYOUTS), default="series",
+                    help="Chunks: series (todo el mes × 32×32 celdas) o mapas (un día × toda la caja) (default: series)")
+
+def main():
+    ap = argparse.ArgumentParser(description="Recomprimió los NetCDF mensuales de ../data/<MODELO>/ (zlib/zstd, chunks, int16)")
+    ap.add_argument("--base-dir", default="../data", help="Directorio base (default: ../data)")
+    ap.add_argument("--models", default=None, help="Modelos separados por coma (default: todos)")
+    ap.add_argument("--vars", default=None, help="Variables separadas por coma (default: todas)")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Procesos (default: todas las CPU)")
+    add_recompress_args(ap, flag=False)
+    args = ap.parse_args()
+    models = set(args.models.split(",")) if args.models else None
+    variables = set(args.vars.split(",")) if args.vars else None
+    paths = [p for p in sorted(glob.glob(os.path.join(args.base_dir, "*", "*.nc")))
+             if (models is None or os.path.basename(os.path.dirname(p)) in models)
+             and (variables is None or os.path.basename(p).split("_", 1)[0] in variables)]
+    if not paths:
+        raise SystemExit(f"No hubo archivos .nc en {args.base_dir}/<MODELO>/")
+    rec = Recompresor(profile_from_args(args), args.jobs)
+    try:
+        for path in paths:
+            rec.submit(path)
+    finally:
+        rec.close()
+    print(rec.summary())
+    if rec.failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
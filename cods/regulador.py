@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# regulador.py  (regulación de peticiones por host: token bucket, concurrencia AIMD, Retry-After y circuit breaker)
+import contextlib, email.utils, random, threading, time
+from urllib.parse import urlparse
+from cliente_http import DescargaError
+'''
+Uso desde p00/p02/p03:
+    reg = Regulador(max_per_host=4, rps=5, bps=20e6)
+    client = ClienteHTTP(tries=5, regulador=reg)     # cada intento pasó por reg.slot(url)
+    with reg.slot(url) as t:                         # wget u otro cliente
+        ...; t.consume(nbytes)
+'''
+# Estados que indicaron saturación del servidor (bajaron la concurrencia y contaron para el breaker)
+OVERLOAD_STATUS = {408, 429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 600.0
+
+class CircuitoAbierto(DescargaError):
+    """El host acumuló fallos seguidos: no se le envió tráfico hasta retry_after."""
+    def __init__(self, host, retry_after):
+        super().__init__(f"circuito abierto para {host} ({retry_after:.0f} s)")
+        self.retry_after = retry_after
+
+def parse_retry_after(value, now=None):
+    """Segundos de Retry-After (entero o fecha HTTP); None si no vino o no se entendió."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(float(value), MAX_RETRY_AFTER)
+    try:
+        when = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return min(max(0.0, when - (now or time.time())), MAX_RETRY_AFTER)
+
+def backoff(attempt, base=1.0, cap=60.0, retry_after=None):
+    """Espera antes del reintento attempt (1, 2, ...): Retry-After si vino; si no, exponencial con jitter completo."""
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 0.5)
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+class TokenBucket:
+    """Cubeta de fichas: rate fichas/s con ráfaga burst. rate=None/0 no limitó.
+
+    Se permitió deuda: una petición grande consumió sus fichas y esperó lo que faltaba,
+    así el promedio respetó rate sin partir las lecturas.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = rate or 0
+        self.burst = burst if burst is not None else max(1.0, self.rate)
+        self.tokens = self.burst
+        self.t = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, n=1):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.t) * self.rate)
+            self.t = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+class AIMD:
+    """Concurrencia adaptativa: +1/límite por éxito, ×0.5 ante error o pico de latencia (una vez por ventana).
+
+    Arrancó en un cuarto del máximo (como slow start) para no abrir con una ráfaga sobre un servidor ya cargado.
+    """
+    def __init__(self, max_limit, min_limit=1, spike=2.0):
+        self.max = max(1, max_limit)
+        self.min = max(1, min(min_limit, self.max))
+        self.limit = float(max(self.min, self.max // 4))
+        self.spike = spike
+        self.in_flight = 0
+        self.ewma = None
+        self.samples = 0
+        self.last_cut = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, ok, latency=None):
+        with self.cond:
+            self.in_flight -= 1
+            slow = False
+            if ok and latency is not None:
+                slow = self.ewma is not None and self.samples >= 10 and latency > self.spike * self.ewma
+                # la media siguió a la latencia real: un servidor más lento de forma estable dejó de contar como pico
+                self.ewma = latency if self.ewma is None else 0.9 * self.ewma + 0.1 * latency
+                self.samples += 1
+            now = time.monotonic()
+            if not ok or slow:
+                # una reducción por ventana (≈ dos latencias típicas): los fallos de una misma ráfaga no la repitieron
+                if now - self.last_cut >= max(0.05, 2 * (self.ewma or 0)):
+                    self.limit = max(self.min, self.limit * 0.5)
+                    self.last_cut = now
+            else:
+                self.limit = min(self.max, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+class Breaker:
+    """Circuit breaker: threshold fallos seguidos lo abrieron por cooldown s (doblando hasta max_cooldown).
+
+    Vencida la espera dejó pasar una sola petición de prueba (semiabierto); si falló volvió a abrirse.
+    """
+    def __init__(self, threshold=8, cooldown=30.0, max_cooldown=300.0):
+        self.threshold, self.base, self.max_cooldown = threshold, cooldown, max_cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def check(self, host):
+        with self.lock:
+            if self.failures < self.threshold:
+                return
+            left = self.open_until - time.monotonic()
+            if left > 0 or self.probing:
+                raise CircuitoAbierto(host, max(left, 1.0))
+            self.probing = True
+
+    def record(self, ok):
+        with self.lock:
+            self.probing = False
+            if ok:
+                self.failures, self.cooldown = 0, self.base
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.open_until > 0 and self.failures > self.threshold:
+                    self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self.open_until = time.monotonic() + self.cooldown
+                self.opened += 1
+
+class _Host:
+    def __init__(self, reg):
+        self.requests = TokenBucket(reg.rps)
+        self.bytes = TokenBucket(reg.bps, burst=max(reg.bps, 1 << 20) if reg.bps else None)
+        self.aimd = AIMD(reg.max_per_host, spike=reg.spike) if reg.adaptive else None
+        self.sem = None if reg.adaptive else threading.BoundedSemaphore(reg.max_per_host)
+        self.breaker = Breaker(reg.breaker_threshold, reg.breaker_cooldown)
+        self.pause_until = 0.0
+        self.lock = threading.Lock()
+        self.n = self.errors = self.throttled = 0
+
+class Ticket:
+    """Permiso de una petición: consume(n) descontó bytes; first_byte() marcó la latencia al primer byte."""
+    def __init__(self, host):
+        self.host = host
+        self.t0 = time.monotonic()
+        self.latency = None
+
+    def first_byte(self):
+        if self.latency is None:
+            self.latency = time.monotonic() - self.t0
+
+    def consume(self, n):
+        self.host.bytes.consume(n)
+
+class Regulador:
+    """Regulador compartido por host (p.ej. ds.nccs.nasa.gov), seguro entre hilos."""
+    def __init__(self, max_per_host=4, rps=None, bps=None, adaptive=True, spike=2.0,
+                 breaker_threshold=8, breaker_cooldown=30.0):
+        self.max_per_host = max(1, max_per_host)
+        self.rps, self.bps = rps, bps
+        self.adaptive, self.spike = adaptive, spike
+        self.breaker_threshold, self.breaker_cooldown = breaker_threshold, breaker_cooldown
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+    def _host(self, url):
+        netloc = urlparse(url).netloc
+        with self.lock:
+            if netloc not in self.hosts:
+                self.hosts[netloc] = _Host(self)
+            return netloc, self.hosts[netloc]
+
+    def pause(self, url, seconds):
+        """Retry-After: detuvo todas las peticiones nuevas al host durante seconds."""
+        _, h = self._host(url)
+        with h.lock:
+            h.pause_until = max(h.pause_until, time.monotonic() + seconds)
+
+    @contextlib.contextmanager
+    def slot(self, url, wait_open=False):
+        """Turno para una petición: breaker → pausa Retry-After → fichas → concurrencia.
+
+        Una excepción dentro del bloque con estado de saturación (o sin estado: red caída, timeout)
+        contó como fallo; un 4xx definitivo (404, 400) no penalizó al host. El estado se tomó del atributo
+        status de la excepción (DescargaError del cliente nativo, WgetError de p03).
+        Con wait_open, un circuito abierto se esperó en lugar de lanzar CircuitoAbierto: la espera no gastó
+        los intentos del cliente.
+        """
+        netloc, h = self._host(url)
+        while True:
+            try:
+                h.breaker.check(netloc)
+                break
+            except CircuitoAbierto as e:
+                if not wait_open:
+                    raise
+                time.sleep(e.retry_after + random.uniform(0, 0.5))
+        wait = h.pause_until - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        h.requests.consume(1)
+        if h.aimd is not None:
+            h.aimd.acquire()
+        else:
+            h.sem.acquire()
+        ticket = Ticket(h)
+        ok = throttled = False
+        try:
+            yield ticket
+            ok = True
+        except Exception as e:
+            status = getattr(e, "status", None)
+            ok = status is not None and status not in OVERLOAD_STATUS
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after:
+                # control de flujo pedido por el servidor: pausa y AIMD, pero no contó para el breaker
+                self.pause(url, retry_after)
+                throttled = True
+            raise
+        finally:
+            with h.lock:
+                h.n += 1
+                h.errors += not ok
+            if h.aimd is not None:
+                h.aimd.release(ok, ticket.latency if ticket.latency is not None else time.monotonic() - ticket.t0)
+            else:
+                h.sem.release()
+            if not throttled:
+                h.breaker.record(ok)
+
+    def retry_after(self, value):
+        return parse_retry_after(value)
+
+    def wait(self, attempt, retry_after=None, cap=60.0):
+        return backoff(attempt, cap=cap, retry_after=retry_after)
+
+    def __call__(self, url):
+        # misma forma que el antiguo HostLimiter de p03: `with limiter(url): ...`
+        return self.slot(url)
+
+    def throttled(self, url):
+        _, h = self._host(url)
+        with h.lock:
+            h.throttled += 1
+
+    def summary(self):
+        out = []
+        for netloc, h in sorted(self.hosts.items()):
+            lim = f"{h.aimd.limit:.1f}" if h.aimd is not None else str(self.max_per_host)
+            out.append(f"# Regulador {netloc}: {h.n} peticiones, {h.errors} con error, "
+                       f"{h.throttled} con Retry-After, concurrencia final {lim}, breaker abierto {h.breaker.opened} vez/veces")
+        return "\n".join(out)
+
+def add_regulador_args(ap, max_per_host=True):
+    """Opciones comunes a p00/p02/p03."""
+    if max_per_host:
+        ap.add_argument("--max-per-host", type=int, default=4,
+                        help="Máximo de conexiones simultáneas por host (default: 4; techo de la concurrencia adaptativa)")
+    ap.add_argument("--max-rps", type=float, default=0, help="Peticiones/s por host (default: 0 = sin límite)")
+    ap.add_argument("--max-mbps", type=float, default=0, help="MB/s por host (default: 0 = sin límite; con wget se promedió por archivo)")
+    ap.add_argument("--no-adaptive", action="store_true",
+                    help="Concurrencia fija (sin AIMD: no se redujo ante errores 5xx/429 ni picos de latencia)")
+    ap.add_argument("--breaker-threshold", type=int, default=8,
+                    help="Fallos seguidos (5xx, timeouts, red caída) que abrieron el circuito del host (default: 8)")
+    ap.add_argument("--breaker-cooldown", type=float, default=30.0,
+                    help="Segundos sin tráfico al host con el circuito abierto, doblando hasta 300 (default: 30)")
+
+def from_args(args, max_per_host=None):
+    return Regulador(max_per_host=max_per_host or getattr(args, "max_per_host", 4),
+                     rps=args.max_rps or None, bps=args.max_mbps * 1e6 or None,
+                     adaptive=not args.no_adaptive,
+                     breaker_threshold=args.breaker_threshold, breaker_cooldown=args.breaker_cooldown)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# sync.py  (actualización incremental p00 → p02 → p03 guiada por estado.sqlite)
+import argparse, os, sys
+from concurrent.futures import ThreadPoolExecutor
+from cache_catalogo import CacheCatalogo, DEFAULT_DIR
+from estado import Estado, DEFAULT_DB
+import p00_make_url as p00
+import p02_catalogo_thredds as p02
+import p03_thredds_ncss as p03
+import regulador
+'''
+ejemplo:
+python3 sync.py --vars pr,tas --periods historical,ssp245 --bbox -90 -30 -60 15 --netcdf4 --client native --jobs 8
+'''
+
+def sync_catalogs(var_catalogs, args, cache, state):
+    """Reprocesó (p02) solo los catálogos de variable cuyo contenido cambió. Devolvió cuántos."""
+    os.makedirs("enlaces", exist_ok=True)
+
+    def one(url):
+        xml_url = p02.catalog_xml_url(url)
+        try:
+            body = cache.fetch(xml_url)
+        except p02.FETCH_ERRORS as e:
+            print(f"# Aviso: no se leyó {xml_url} ({e})", file=sys.stderr)
+            return 0
+        # El sha1 se guardó dentro de process_catalog, solo tras registrar los datasets.
+        if not state.catalog_changed(xml_url, body) and state.has_datasets(url):
+            return 0
+        try:
+            msg, _ = p02.process_catalog(url, args, cache.fetch, "enlaces", state)
+        except Exception as e:
+            print(f"# Error: no se reprocesó {url} ({type(e).__name__}: {e})", file=sys.stderr)
+            return 0
+        if msg:
+            print(msg, flush=True)
+        return 1
+
+    with ThreadPoolExecutor(max_workers=max(1, args.catalog_jobs)) as ex:
+        return sum(ex.map(one, var_catalogs))
+
+def pending_tasks(dataset_urls, args, state):
+    """Generó solo los meses sin estado 'ok' (sin stat de los ya registrados, salvo --recheck).
+
+    Devolvió (tareas, meses pendientes previstos) para el progreso y la ETA.
+    """
+    known = state.month_status(dataset_urls)
+    def done(out_path):
+        return known.get(out_path) == "ok" and not (args.recheck and not os.path.exists(out_path))
+    planned = max(0, 12 * len(dataset_urls) - sum(1 for v in known.values() if v == "ok"))
+    return p03.iter_tasks(dataset_urls, args, done), planned
+
+def main():
+    ap = argparse.ArgumentParser(description="Sincronización incremental: catálogos cambiados y meses faltantes/fallidos")
+    ap.add_argument("--vars", required=True, help="Variables separadas por coma (p.ej. pr,tas)")
+    ap.add_argument("--periods", required=True, help="Periodos separados por coma (p.ej. historical,ssp245)")
+    ap.add_argument("--models", default="", help="Modelos separados por coma (por defecto todos)")
+    ap.add_argument("--db", default=DEFAULT_DB, help=f"Base de estado SQLite (default: {DEFAULT_DB})")
+    ap.add_argument("--cache-dir", default=DEFAULT_DIR)
+    ap.add_argument("--ttl", type=float, default=3600, help="TTL de la caché de catálogos (default: 3600)")
+    ap.add_argument("--root", default=p00.ROOT_XML)
+    ap.add_argument("--catalog-jobs", type=int, default=16, help="Catálogos leídos en paralelo (default: 16)")
+    ap.add_argument("--no-recursive", action="store_true")
+    ap.add_argument("--html", action="store_true", help="Forzó el crawler HTML de p02.")
+    ap.add_argument("--year-min", type=int, default=1980)
+    ap.add_argument("--year-max", type=int, default=2014)
+    ap.add_argument("--recheck", action="store_true", help="Verificó con stat que los meses 'ok' sigan en disco.")
+    ap.add_argument("--no-download", action="store_true", help="Solo actualizó catálogos y datasets.")
+    p03.add_download_args(ap)
+    args = ap.parse_args()
+
+    try:
+        p03.prepare_download_args(args)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    variables, periods = p00.split_list(args.vars), p00.split_list(args.periods)
+    models = p00.split_list(args.models)
+    state = Estado(args.db)
+    cache = CacheCatalogo(args.cache_dir, ttl=args.ttl, timeout=args.timeout,
+                          regulador=regulador.from_args(args, max_per_host=args.catalog_jobs))
+
+    def fetch_fn(url):
+        body = cache.fetch(url)
+        state.record_catalog(url, body)
+        return body
+
+    # 1) p00: árbol de catálogos (revalidado con la caché)
+    result = p00.crawl(variables, periods, fetch_fn=fetch_fn, jobs=args.catalog_jobs, root_xml=args.root)
+    var_catalogs = sorted({u for urls in result.values() for u in urls
+                           if not models or p02.extract_metadata_from_url(u)[1] in models})
+    # 2) p02: solo catálogos de variable con contenido nuevo
+    n_changed = sync_catalogs(var_catalogs, args, cache, state)
+    print(f"# Catálogos de variable: {len(var_catalogs)}, reprocesados: {n_changed}", flush=True)
+    print(cache.summary(), file=sys.stderr)
+    if args.no_download:
+        return
+
+    # 3) p03: solo meses nuevos, faltantes o fallidos
+    dataset_urls = state.datasets(variables, periods, models or None)
+    tasks, planned = pending_tasks(dataset_urls, args, state)
+    if args.dry_run:
+        p03.print_dry_run(tasks, args)
+        return
+    stats, failed = p03.run_tasks(tasks, args, state, planned=planned)
+    print(stats.summary(), flush=True)
+    if failed:
+        raise SystemExit(f"Fallaron {len(failed)} mes(es); se reintentarán en la próxima sincronización.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# verifica.py  (verificación de integridad de los NetCDF descargados, sin leer los arreglos completos)
+import argparse, glob, os, re, struct, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from estado import Estado, DEFAULT_DB
+import particion_ncss as part
+from calendario import CF_CALENDARS
+'''
+ejemplo:
+python3 verifica.py --base-dir ../data --jobs 16
+python3 verifica.py --base-dir ../data --bbox -90 -30 -60 15 --no-requeue
+'''
+MAGIC_CDF = b"CDF"
+MAGIC_HDF5 = b"\x89HDF\r\n\x1a\n"
+# tipos NetCDF clásicos: (tamaño, formato struct big-endian)
+NC_TYPES = {1: (1, "b"), 2: (1, "c"), 3: (2, "h"), 4: (4, "i"), 5: (4, "f"), 6: (8, "d"),
+            7: (1, "B"), 8: (2, "H"), 9: (4, "I"), 10: (8, "q"), 11: (8, "Q")}
+NC_DIMENSION, NC_VARIABLE, NC_ATTRIBUTE = 10, 11, 12
+YM_RE = re.compile(r'_(\d{4})(\d{2})(?:_v\d+(?:\.\d+)?)?\.nc$')
+HALF_CELL = part.GRID_RES / 2
+
+class HeaderError(Exception):
+    """Cabecera NetCDF ilegible o incompleta."""
+
+class _Reader:
+    def __init__(self, buf, version):
+        self.buf, self.pos = buf, 0
+        self.wide = version == 5          # CDF5: conteos de 8 bytes
+
+    def take(self, n):
+        if self.pos + n > len(self.buf):
+            raise EOFError
+        out = self.buf[self.pos:self.pos + n]
+        self.pos += n
+        return out
+
+    def int32(self):
+        return struct.unpack(">i", self.take(4))[0]
+
+    def count(self):
+        return struct.unpack(">q", self.take(8))[0] if self.wide else struct.unpack(">I", self.take(4))[0]
+
+    def name(self):
+        n = self.count()
+        s = self.take(n).decode("utf-8", "replace")
+        self.take((4 - n % 4) % 4)
+        return s
+
+    def values(self, nc_type, n):
+        size, fmt = NC_TYPES[nc_type]
+        raw = self.take(size * n)
+        self.take((4 - (size * n) % 4) % 4)
+        if nc_type == 2:
+            return raw.decode("utf-8", "replace").rstrip("\x00")
+        return struct.unpack(f">{n}{fmt}", raw)
+
+    def attrs(self):
+        tag, n = self.int32(), self.count()
+        out = {}
+        if tag not in (0, NC_ATTRIBUTE):
+            raise HeaderError("lista de atributos inválida")
+        for _ in range(n):
+            name = self.name()
+            nc_type = self.int32()
+            if nc_type not in NC_TYPES:
+                raise HeaderError(f"tipo {nc_type} desconocido")
+            out[name] = self.values(nc_type, self.count())
+        return out
+
+def parse_classic_header(buf):
+    """Interpretó la cabecera de un NetCDF clásico (CDF1/CDF2/CDF5) desde los bytes iniciales.
+
+    Devolvió {'version', 'numrecs', 'dims': [(nombre, largo)], 'attrs', 'vars': {nombre: {...}}}.
+    Lanzó EOFError si buf no alcanzó a contener toda la cabecera.
+    """
+    if buf[:3] != MAGIC_CDF or buf[3] not in (1, 2, 5):
+        raise HeaderError("no es NetCDF clásico")
+    version = buf[3]
+    r = _Reader(buf, version)
+    r.take(4)
+    numrecs = r.count()
+    tag, n = r.int32(), r.count()
+    if tag not in (0, NC_DIMENSION):
+        raise HeaderError("lista de dimensiones inválida")
+    dims = [(r.name(), r.count()) for _ in range(n)]
+    gattrs = r.attrs()
+    tag, n = r.int32(), r.count()
+    if tag not in (0, NC_VARIABLE):
+        raise HeaderError("lista de variables inválida")
+    variables = {}
+    for _ in range(n):
+        name = r.name()
+        dimids = [r.count() for _ in range(r.count())]
+        vattrs = r.attrs()
+        nc_type = r.int32()
+        vsize = r.count()
+        begin = struct.unpack(">q" if version in (2, 5) else ">I", r.take(8 if version in (2, 5) else 4))[0]
+        if nc_type not in NC_TYPES or any(d >= len(dims) for d in dimids):
+            raise HeaderError(f"variable {name} inválida")
+        variables[name] = {"dims": [dims[d][0] for d in dimids], "attrs": vattrs, "type": nc_type,
+                           "vsize": vsize, "begin": begin,
+                           "record": bool(dimids) and dims[dimids[0]][1] == 0}
+    return {"version": version, "numrecs": numrecs, "dims": dims, "attrs": gattrs, "vars": variables}
+
+def classic_expected_size(h):
+    """Tamaño mínimo que debió tener el archivo según la cabecera (detectó truncados sin leer datos)."""
+    dims = dict(h["dims"])
+    rec_vars = [v for v in h["vars"].values() if v["record"]]
+    recsize = sum(v["vsize"] for v in rec_vars)
+    if len(rec_vars) == 1:
+        # caso especial del formato: con una sola variable de registro, los registros no se rellenaron a 4 bytes
+        v = rec_vars[0]
+        recsize = NC_TYPES[v["type"]][0]
+        for d in v["dims"][1:]:
+            recsize *= dims[d]
+    numrecs = h["numrecs"]
+    if numrecs in (0xFFFFFFFF, -1):
+        numrecs = 0                        # escritura en streaming: numrecs no se fijó
+    end = 0
+    for v in h["vars"].values():
+        if not v["record"]:
+            end = max(end, v["begin"] + v["vsize"])
+        elif numrecs:
+            end = max(end, v["begin"] + (numrecs - 1) * recsize + min(v["vsize"], recsize))
+    return end
+
+def read_classic_1d(f, h, name):
+    """Leyó una variable 1-D no-registro (lat/lon) por desplazamiento, sin tocar el resto."""
+    v = h["vars"][name]
+    size, fmt = NC_TYPES[v["type"]]
+    n = v["vsize"] // size
+    dim_len = dict(h["dims"])[v["dims"][0]]
+    f.seek(v["begin"])
+    return struct.unpack(f">{n}{fmt}", f.read(size * n))[:dim_len]
+
+def read_header(path, max_bytes=16 << 20):
+    """Leyó la cabecera clásica creciendo el búfer hasta que alcanzó (64 KiB, 128 KiB, ...)."""
+    n = 64 << 10
+    with open(path, "rb") as f:
+        while True:
+            f.seek(0)
+            buf = f.read(n)
+            try:
+                return parse_classic_header(buf)
+            except EOFError:
+                if len(buf) < n or n >= max_bytes:
+                    raise HeaderError("cabecera truncada")
+                n *= 2
+            except (struct.error, KeyError, IndexError) as e:
+                raise HeaderError(f"cabecera ilegible ({e})")
+
+def days_in_month(year, month, calendar):
+    """Pasos diarios esperados en el mes según el atributo calendar de time (month_last_day de p03)."""
+    from p03_thredds_ncss import month_last_day
+    cal = (calendar or "standard").lower()
+    if cal in ("all_leap", "366_day"):
+        return 29 if month == 2 else month_last_day(2000, month, "gregorian")
+    return month_last_day(year, month, CF_CALENDARS.get(cal, "gregorian"))
+
+def _coord_name(names, options):
+    return next((n for n in options if n in names), None)
+
+def check_bbox(lat, lon, bbox, stride=1):
+    """Comparó la extensión de lat/lon con la caja pedida (tolerancia de una celda de salida)."""
+    west, east, south, north = bbox
+    tol = 2 * HALF_CELL * max(1, stride)
+    lon = [x - 360 if x > 180 else x for x in lon] if west < 0 else list(lon)
+    if not lat or not lon:
+        return "sin coordenadas lat/lon"
+    if min(lat) > south + tol or max(lat) < north - tol or min(lon) > west + tol or max(lon) < east - tol:
+        return (f"extensión lat[{min(lat):.2f},{max(lat):.2f}] lon[{min(lon):.2f},{max(lon):.2f}] "
+                f"no cubrió la caja pedida")
+    return None
+
+def file_calendar(path):
+    """Atributo calendar de time leído solo de la cabecera (clásica o HDF5); None si faltó o no se pudo leer."""
+    with open(path, "rb") as f:
+        head = f.read(8)
+    if head.startswith(MAGIC_HDF5):
+        import netCDF4
+        try:
+            with part.NC_LOCK, netCDF4.Dataset(path) as nc:
+                return getattr(nc.variables["time"], "calendar", None) if "time" in nc.variables else None
+        except (OSError, RuntimeError):
+            return None
+    try:
+        h = read_header(path)
+    except (HeaderError, OSError):
+        return None
+    return h["vars"]["time"]["attrs"].get("calendar") if "time" in h["vars"] else None
+
+def file_extent(path):
+    """(oeste, este, sur, norte) de los centros de lon/lat leídos solo de la cabecera; None si faltaron o no se pudo leer."""
+    with open(path, "rb") as f:
+        head = f.read(8)
+    lat = lon = None
+    if head.startswith(MAGIC_HDF5):
+        import netCDF4
+        try:
+            with part.NC_LOCK, netCDF4.Dataset(path) as nc:
+                latn = _coord_name(nc.variables, ("lat", "latitude"))
+                lonn = _coord_name(nc.variables, ("lon", "longitude"))
+                if latn and lonn:
+                    lat, lon = nc.variables[latn][:].tolist(), nc.variables[lonn][:].tolist()
+        except (OSError, RuntimeError):
+            return None
+    else:
+        try:
+            h = read_header(path)
+            latn, lonn = _coord_name(h["vars"], ("lat", "latitude")), _coord_name(h["vars"], ("lon", "longitude"))
+            if latn and lonn:
+                with open(path, "rb") as f:
+                    lat, lon = read_classic_1d(f, h, latn), read_classic_1d(f, h, lonn)
+        except (HeaderError, OSError, KeyError, struct.error):
+            return None
+    if not lat or not lon:
+        return None
+    return min(lon), max(lon), min(lat), max(lat)
+
+def check_file(path, bbox=None, stride=1):
+    """Verificó un NetCDF mensual. Devolvió (estado, detalle): ('ok'|'corrupto'|'incompleto', texto)."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(8)
+    if size == 0:
+        return "corrupto", "archivo vacío"
+    if head.lstrip().startswith(b"<") or head.startswith(b"\xef\xbb\xbf<"):
+        return "corrupto", "contenido HTML/XML (página de error guardada como .nc)"
+    if head.startswith(MAGIC_HDF5):
+        return _check_hdf5(path, bbox, stride)
+    if head[:3] != MAGIC_CDF:
+        return "corrupto", f"firma desconocida {head[:4]!r}"
+    try:
+        h = read_header(path)
+    except HeaderError as e:
+        return "corrupto", str(e)
+    expected = classic_expected_size(h)
+    if size < expected:
+        return "corrupto", f"truncado ({size} de {expected} bytes)"
+    names = h["vars"]
+    tname = _coord_name(names, ("time",))
+    nt = None
+    if tname:
+        nt = h["numrecs"] if names[tname]["record"] else dict(h["dims"])[names[tname]["dims"][0]]
+    cal = names[tname]["attrs"].get("calendar") if tname else None
+    latn, lonn = _coord_name(names, ("lat", "latitude")), _coord_name(names, ("lon", "longitude"))
+    lat = lon = None
+    if bbox and latn and lonn:
+        with open(path, "rb") as f:
+            lat, lon = read_classic_1d(f, h, latn), read_classic_1d(f, h, lonn)
+    return _check_common(path, nt, cal, lat, lon, bbox, stride)
+
+def _check_hdf5(path, bbox, stride):
+    try:
+        import netCDF4
+    except ImportError:
+        return "ok", "HDF5: firma válida (netCDF4 no instalado; cabecera sin verificar)"
+    try:
+        # HDF5 no fue seguro entre hilos: mismo candado que la escritura de p03
+        with part.NC_LOCK, netCDF4.Dataset(path) as nc:
+            nt = len(nc.dimensions["time"]) if "time" in nc.dimensions else None
+            cal = getattr(nc.variables["time"], "calendar", None) if "time" in nc.variables else None
+            latn = _coord_name(nc.variables, ("lat", "latitude"))
+            lonn = _coord_name(nc.variables, ("lon", "longitude"))
+            lat = lon = None
+            if bbox and latn and lonn:
+                lat, lon = list(nc.variables[latn][:]), list(nc.variables[lonn][:])
+    except (OSError, RuntimeError) as e:
+        return "corrupto", f"HDF5 ilegible ({e})"
+    return _check_common(path, nt, cal, lat, lon, bbox, stride)
+
+def _check_common(path, nt, cal, lat, lon, bbox, stride):
+    m = YM_RE.search(os.path.basename(path))
+    if nt is not None and m:
+        want = days_in_month(int(m.group(1)), int(m.group(2)), cal)
+        if nt != want:
+            return "incompleto", f"{nt} pasos de tiempo, se esperaban {want} (calendario {cal or 'standard'})"
+    if bbox and lat is not None:
+        msg = check_bbox([float(x) for x in lat], [float(x) for x in lon], bbox, stride)
+        if msg:
+            return "incompleto", msg
+    return "ok", ""
+
+def requeue(path, state=None):
+    """Apartó el archivo malo (.corrupto) para que p03 lo volviera a bajar; lo marcó 'fallido' en el estado."""
+    os.replace(path, path + ".corrupto")
+    if state is not None:
+        state.mark_failed(path)
+
+def changed_files(base_dir, known):
+    """Rutas .nc nuevas, con mtime/tamaño distinto al del manifiesto o ya registradas como malas.
+
+    Devolvió (total, [(ruta, mtime, size)]). Un malo sin cambios se volvió a incluir: si no, quedó en disco
+    para siempre sin reencolarse (mismo mtime y tamaño que en la corrida que lo detectó).
+    """
+    paths = sorted(glob.glob(os.path.join(base_dir, "*", "*.nc")))
+    todo = []
+    for p in paths:
+        st = os.stat(p)
+        prev = known.get(p)
+        if prev is None or prev[0] != st.st_mtime or prev[1] != st.st_size or prev[2] != "ok":
+            todo.append((p, st.st_mtime, st.st_size))
+    return len(paths), todo
+
+def scan(base_dir, state, bbox=None, stride=1, jobs=8, force=False, do_requeue=True, batch=500):
+    """Verificó en paralelo los .nc nuevos, cambiados o ya malos y registró el resultado en el manifiesto.
+
+    Con do_requeue (default) los malos se apartaron y su mes quedó 'fallido'; sin él quedaron en disco y en
+    el manifiesto, y se volvieron a revisar en cada corrida.
+    """
+    total, todo = changed_files(base_dir, {} if force else state.verifications())
+    counts = {"ok": 0, "corrupto": 0, "incompleto": 0}
+    rows, gone = [], []
+
+    def one(item):
+        try:
+            return item, check_file(item[0], bbox, stride)
+        except OSError as e:
+            return item, ("corrupto", f"no se pudo leer ({e})")
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+        for (p, mtime, size), (status, detail) in ex.map(one, todo):
+            counts[status] += 1
+            if status != "ok":
+                print(f"# {status}: {p} ({detail})", flush=True)
+            if status != "ok" and do_requeue:
+                requeue(p, state)
+                gone.append(p)
+            else:
+                rows.append((p, mtime, size, status, detail))
+            if len(rows) >= batch:
+                state.record_verifications(rows); rows = []
+    if rows:
+        state.record_verifications(rows)
+    if gone:
+        state.forget_verifications(gone)
+    return total, len(todo), counts
+
+def main():
+    ap = argparse.ArgumentParser(description="Verificó NetCDF descargados (firma, cabecera, pasos de tiempo y caja)")
+    ap.add_argument("--base-dir", default="../data", help="Directorio base (default: ../data)")
+    ap.add_argument("--db", default=DEFAULT_DB, help=f"Base de estado con el manifiesto (default: {DEFAULT_DB})")
+    ap.add_argument("--bbox", nargs=4, type=float, metavar=("WEST","EAST","SOUTH","NORTH"),
+                    help="Caja esperada (la usada en p03).")
+    ap.add_argument("--stride", type=int, default=1, help="horizStride usado en p03 (default: 1)")
+    ap.add_argument("--jobs", type=int, default=8)
+    ap.add_argument("--force", action="store_true", help="Verificó todo, aunque no hubiera cambiado.")
+    ap.add_argument("--requeue", action=argparse.BooleanOptionalAction, default=True,
+                    help="Renombró los malos a .corrupto y los marcó 'fallido' para que p03/sync los bajaran de nuevo "
+                         "(default; --no-requeue solo los informó y los dejó en su lugar).")
+    args = ap.parse_args()
+
+    state = Estado(args.db)
+    t0 = time.monotonic()
+    total, checked, counts = scan(args.base_dir, state, args.bbox, args.stride, args.jobs, args.force, args.requeue)
+    print(f"# Verificados {checked} de {total} archivos en {time.monotonic()-t0:.1f} s: "
+          f"ok {counts['ok']}, corruptos {counts['corrupto']}, incompletos {counts['incompleto']}")
+    # salida 1 mientras quedaron malos conocidos en disco (--no-requeue) o se acabaron de reencolar
+    bad = sum(1 for p, v in state.verifications().items() if v[2] != "ok" and os.path.exists(p))
+    if bad:
+        print(f"# Quedaron {bad} archivos malos en disco (--no-requeue los dejó; sin esa opción se reencolaron)", file=sys.stderr)
+    if counts["corrupto"] or counts["incompleto"] or bad:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()